@@ -0,0 +1,31 @@
+from typing import Any, Dict
+
+__author__ = "a.lemets"
+
+
+class AioFlowBatchSkipped(RuntimeError):
+    """Service was not called for batch item because its dependency failed for the item"""
+
+
+class BatchItem:
+    """
+    One input of Pipeline.run_batch with its own results and errors by service name
+    """
+    __slots__ = ("input", "results", "errors")
+
+    def __init__(self, input: Dict):
+        self.input = input
+        self.results = {}
+        self.errors = {}
+
+    @property
+    def failed(self) -> bool:
+        return bool(self.errors)
+
+    def result(self, name: str) -> Any:
+        if name in self.errors:
+            raise self.errors[name]
+        return self.results[name]
+
+    def __repr__(self):
+        return f"BatchItem(input={self.input!r}, results={self.results!r}, errors={self.errors!r})"
@@ -0,0 +1,29 @@
+import asyncio
+from collections import defaultdict
+
+from aioflow.brokerabc import BrokerABC
+
+__author__ = "a.lemets"
+
+
+class MemoryBroker(BrokerABC):
+    """Broker for coordinator and workers running in one event loop, mostly for tests"""
+
+    def __init__(self):
+        self._queues = defaultdict(asyncio.Queue)
+        self._blobs = {}
+
+    async def push(self, queue: str, data: bytes) -> None:
+        await self._queues[queue].put(data)
+
+    async def pop(self, queue: str, timeout: float) -> bytes or None:
+        try:
+            return await asyncio.wait_for(self._queues[queue].get(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def put_blob(self, key: str, data: bytes) -> None:
+        self._blobs[key] = data
+
+    async def get_blob(self, key: str) -> bytes:
+        return self._blobs.pop(key)
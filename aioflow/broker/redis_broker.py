@@ -0,0 +1,38 @@
+import math
+
+from aioredis import Redis
+
+from aioflow.brokerabc import BrokerABC
+
+__author__ = "a.lemets"
+
+
+class RedisBroker(BrokerABC):
+    """
+    Queues are redis lists, blobs are plain keys expiring after blob_ttl
+    seconds in case nobody reads them
+    """
+
+    def __init__(self, redis: Redis, *, blob_ttl: int = 3600):
+        self.redis = redis
+        self.blob_ttl = blob_ttl
+
+    async def push(self, queue: str, data: bytes) -> None:
+        await self.redis.rpush(queue, data)
+
+    async def pop(self, queue: str, timeout: float) -> bytes or None:
+        # BLPOP timeout is integer and 0 means forever
+        item = await self.redis.blpop(queue, timeout=max(math.ceil(timeout), 1))
+        if item is None:
+            return None
+        return item[1]
+
+    async def put_blob(self, key: str, data: bytes) -> None:
+        await self.redis.set(key, data, expire=self.blob_ttl)
+
+    async def get_blob(self, key: str) -> bytes:
+        tr = self.redis.multi_exec()
+        future = tr.get(key)
+        tr.delete(key)
+        await tr.execute()
+        return await future
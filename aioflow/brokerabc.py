@@ -0,0 +1,26 @@
+import abc
+
+__author__ = "a.lemets"
+
+
+class BrokerABC(abc.ABC):
+    """
+    Transport between pipeline (coordinator) and workers: FIFO queues of
+    small messages and a blob store for large payloads passed by reference
+    """
+
+    @abc.abstractmethod
+    async def push(self, queue: str, data: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def pop(self, queue: str, timeout: float) -> bytes or None:
+        """Wait up to timeout seconds for a message, None if there is nothing"""
+
+    @abc.abstractmethod
+    async def put_blob(self, key: str, data: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    async def get_blob(self, key: str) -> bytes:
+        """Get blob and forget it, every blob is read once"""
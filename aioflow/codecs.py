@@ -0,0 +1,135 @@
+import importlib
+import json
+import pickle
+import zlib
+from typing import Any, Callable, Dict, Mapping, Tuple
+
+__author__ = "a.lemets"
+
+
+class AioFlowCodecError(RuntimeError):
+    """Codec is unknown or its package is not installed"""
+
+
+class Codec:
+    __slots__ = ("name", "encode", "decode")
+
+    def __init__(self, name: str, encode: Callable[[Any], bytes], decode: Callable[[bytes], Any]):
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+
+# name -> Codec, or a factory importing optional package on first use
+_codecs = {}
+_compressions = {}
+
+
+def register_codec(name: str, codec: Codec or Callable[[], Codec]) -> None:
+    _codecs[name] = codec
+
+
+def register_compression(name: str, compression: Codec or Callable[[], Codec]) -> None:
+    _compressions[name] = compression
+
+
+def _resolve(registry: Dict, kind: str, name: str) -> Codec:
+    codec = registry.get(name)
+    if codec is None:
+        raise AioFlowCodecError(f"Unknown {kind} {name!r}")
+    if not isinstance(codec, Codec):
+        codec = registry[name] = codec()
+    return codec
+
+
+def get_codec(name: str) -> Codec:
+    return _resolve(_codecs, "codec", name)
+
+
+def get_compression(name: str) -> Codec:
+    return _resolve(_compressions, "compression", name)
+
+
+def _optional(module_name: str, factory: Callable) -> Callable[[], Codec]:
+    def load():
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError:
+            raise AioFlowCodecError(f"{module_name} is not installed")
+        return factory(module)
+    return load
+
+
+register_codec("json", Codec("json", lambda obj: json.dumps(obj).encode(), json.loads))
+register_codec("pickle", Codec(
+    "pickle",
+    lambda obj: pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL),
+    pickle.loads,
+))
+register_codec("orjson", _optional("orjson", lambda orjson: Codec("orjson", orjson.dumps, orjson.loads)))
+register_codec("msgpack", _optional("msgpack", lambda msgpack: Codec(
+    "msgpack",
+    lambda obj: msgpack.packb(obj, use_bin_type=True),
+    lambda data: msgpack.unpackb(data, raw=False),
+)))
+
+register_compression("zlib", Codec("zlib", zlib.compress, zlib.decompress))
+register_compression("zstd", _optional("zstandard", lambda zstd: Codec(
+    "zstd",
+    lambda data: zstd.ZstdCompressor().compress(data),
+    lambda data: zstd.ZstdDecompressor().decompress(data),
+)))
+register_compression("lz4", _optional("lz4.frame", lambda lz4: Codec("lz4", lz4.compress, lz4.decompress)))
+
+
+class ResultCodec:
+    """
+    Result encoding from service config, `__global` sets it for the whole pipeline:
+        codec: json, orjson, msgpack or pickle, json by default
+        compression: zlib, zstd or lz4, none by default
+        compression_threshold: encoded results shorter than this are not compressed, 1024 by default
+
+    encode() returns format like "orjson+zstd" which decode() needs to read data back,
+    decode() reads only formats this codec writes, so stored format cannot choose pickle
+    """
+    __slots__ = ("codec", "compression", "threshold")
+
+    def __init__(self, codec: str = "json", *, compression: str = None, threshold: int = 1024):
+        self.codec = get_codec(codec)
+        self.compression = get_compression(compression) if compression else None
+        self.threshold = threshold
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "ResultCodec":
+        return cls(
+            config.get("codec", "json"),
+            compression=config.get("compression"),
+            threshold=config.get("compression_threshold", 1024),
+        )
+
+    def encode(self, obj: Any) -> Tuple[str, bytes]:
+        data = self.codec.encode(obj)
+        if self.compression is None or len(data) < self.threshold:
+            return self.codec.name, data
+        return f"{self.codec.name}+{self.compression.name}", self.compression.encode(data)
+
+    def decode(self, data_format: str, data: bytes) -> Any:
+        codec, _, compression = data_format.partition("+")
+        if codec != self.codec.name or compression not in ("", getattr(self.compression, "name", "")):
+            raise AioFlowCodecError(f"Format {data_format!r} is not allowed by codec {self.codec.name!r}")
+        # pickle is decoded only when it was chosen by config
+        return decode(data_format, data, allow_pickle=True)
+
+
+def decode(data_format: str, data: bytes, *, allow_pickle: bool = False) -> Any:
+    """
+    Decode data of any format, pickle only with allow_pickle as it runs code from data
+
+    Use ResultCodec.decode for stored data, its format may be tampered.
+    """
+    codec, _, compression = data_format.partition("+")
+    if codec == "pickle" and not allow_pickle:
+        raise AioFlowCodecError("Decoding pickle is not allowed")
+    if compression:
+        data = get_compression(compression).decode(data)
+    return get_codec(codec).decode(data)
@@ -0,0 +1,177 @@
+import asyncio
+from collections import deque
+from heapq import heappop, heappush
+from itertools import count
+from typing import Dict, Mapping
+
+__author__ = "a.lemets"
+
+
+class PriorityLimiter:
+    """
+    Semaphore handing free slots to waiters with the highest priority first,
+    FIFO among equal priorities
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.active = 0
+        self._waiters = []
+        self._counter = count()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for *_, future in self._waiters if not future.done())
+
+    async def acquire(self, priority: float = 0) -> None:
+        if self.active < self.size and not self.waiting:
+            self.active += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heappush(self._waiters, (-priority, next(self._counter), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # slot was handed over right before cancellation
+                self.release()
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            *_, future = heappop(self._waiters)
+            if not future.done():
+                # slot goes to the waiter, active stays the same
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def slot(self, priority: float = 0) -> "_Slot":
+        """async with limiter.slot(priority): ..."""
+        return _Slot(self, priority)
+
+
+class _Slot:
+    __slots__ = ("_limiter", "_priority")
+
+    def __init__(self, limiter: PriorityLimiter, priority: float):
+        self._limiter = limiter
+        self._priority = priority
+
+    async def __aenter__(self):
+        await self._limiter.acquire(self._priority)
+
+    async def __aexit__(self, *exc_info):
+        self._limiter.release()
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit shared by every service with the same name
+
+    Every call faster than `tolerance` * baseline latency adds `increase` / limit,
+    so the limit grows by `increase` per limit of calls. Slow calls, errors and
+    timeouts cut the limit by `decrease` times, at most once per observed latency.
+
+    Service config:
+        adaptive_concurrency: true
+        concurrency_initial: 4
+        concurrency_min: 1
+        concurrency_max: 100
+        concurrency_tolerance: 2
+    """
+
+    def __init__(self,
+                 *,
+                 initial: float = 4,
+                 minimum: float = 1,
+                 maximum: float = 100,
+                 increase: float = 1,
+                 decrease: float = 0.5,
+                 tolerance: float = 2):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.tolerance = tolerance
+        self.baseline = None
+        self.active = 0
+        self._waiters = deque()
+        self._decreased = None
+
+    async def acquire(self) -> None:
+        if self.active < int(self.limit) and not self._waiters:
+            self.active += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        self._waiters.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.active -= 1
+                self._wake_up()
+            raise
+
+    def release(self, latency: float, failed: bool, now: float = None) -> None:
+        now = asyncio.get_event_loop().time() if now is None else now
+        if not failed:
+            # baseline follows the fastest calls and slowly forgets them
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            else:
+                self.baseline += (latency - self.baseline) * 0.01
+
+        if failed or latency > self.baseline * self.tolerance:
+            if self._decreased is None or now - self._decreased >= latency:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+                self._decreased = now
+        else:
+            self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+
+        self.active -= 1
+        self._wake_up()
+
+    def abandon(self) -> None:
+        """Return permit of call which was never started, without latency sample"""
+        self.active -= 1
+        self._wake_up()
+
+    def _wake_up(self) -> None:
+        while self._waiters and self.active < int(self.limit):
+            future = self._waiters.popleft()
+            if not future.done():
+                self.active += 1
+                future.set_result(None)
+
+    def summary(self) -> Dict:
+        return dict(limit=self.limit, active=self.active, waiting=len(self._waiters), baseline=self.baseline)
+
+
+_adaptive_limiters = {}
+
+
+def adaptive_limiter(name: str, config: Mapping) -> AdaptiveLimiter or None:
+    """Process wide adaptive limiter of services with `name`, created from the first config seen"""
+    if not config.get("adaptive_concurrency"):
+        return None
+    limiter = _adaptive_limiters.get(name)
+    if limiter is None:
+        limiter = _adaptive_limiters[name] = AdaptiveLimiter(
+            initial=config.get("concurrency_initial", 4),
+            minimum=config.get("concurrency_min", 1),
+            maximum=config.get("concurrency_max", 100),
+            tolerance=config.get("concurrency_tolerance", 2),
+        )
+    return limiter
+
+
+def adaptive_limits() -> Dict[str, Dict]:
+    return {name: limiter.summary() for name, limiter in _adaptive_limiters.items()}
+
+
+def reset_adaptive_limits() -> None:
+    _adaptive_limiters.clear()
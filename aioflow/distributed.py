@@ -0,0 +1,229 @@
+import asyncio
+import logging
+import pickle
+from typing import Any, Dict, Iterable, Type
+from uuid import uuid4
+
+from aioflow import lifecycle
+from aioflow.brokerabc import BrokerABC
+from aioflow.helpers import thaw
+from aioflow.service import Service, ServiceStatus
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE = "aioflow:tasks"
+
+
+class AioFlowRemoteError(RuntimeError):
+    """Service failed on worker with exception which cannot be transferred"""
+
+
+class _BlobRef:
+    __slots__ = ("key",)
+
+    def __init__(self, key: str):
+        self.key = key
+
+    def __getstate__(self):
+        return self.key
+
+    def __setstate__(self, state):
+        self.key = state
+
+
+async def pack(broker: BrokerABC, obj: Any, threshold: int or None) -> bytes:
+    """Pickle obj, payloads larger than threshold go to broker blob store and are passed by reference"""
+    data = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    if threshold is not None and len(data) > threshold:
+        ref = _BlobRef(f"aioflow:blob:{uuid4()}")
+        await broker.put_blob(ref.key, data)
+        data = pickle.dumps(ref, protocol=pickle.HIGHEST_PROTOCOL)
+    return data
+
+
+async def unpack(broker: BrokerABC, data: bytes) -> Any:
+    obj = pickle.loads(data)
+    if isinstance(obj, _BlobRef):
+        obj = pickle.loads(await broker.get_blob(obj.key))
+    return obj
+
+
+class RemoteExecutor:
+    """
+    Coordinator side of distributed execution
+
+    Pipeline(..., executor=RemoteExecutor(broker)) keeps dependency tracking,
+    timeouts, retries and middleware, while payloads run on workers.
+    """
+
+    def __init__(self,
+                 broker: BrokerABC,
+                 *,
+                 queue: str = DEFAULT_QUEUE,
+                 blob_threshold: int or None = 64 * 1024,
+                 poll_timeout: float = 1):
+        self.broker = broker
+        self.queue = queue
+        self.blob_threshold = blob_threshold
+        self.poll_timeout = poll_timeout
+        self.reply_to = f"{queue}:replies:{uuid4()}"
+        self._pending = {}
+        self._listener = None
+
+    async def submit(self, service: Service, kwargs: Dict) -> Any:
+        loop = asyncio.get_event_loop()
+        task_id = str(uuid4())
+        future = loop.create_future()
+        self._pending[task_id] = (future, service)
+        try:
+            task = dict(
+                id=task_id,
+                reply_to=self.reply_to,
+                # workers know services by class, scoped name is for logs
+                service=type(service).__name__.lower(),
+                name=service.name,
+                config=thaw(service.config),
+                number=service.number,
+                attempt=service.attempt,
+                remaining=service.remaining,
+                kwargs=await pack(self.broker, kwargs, self.blob_threshold),
+            )
+            await self.broker.push(self.queue, pickle.dumps(task, protocol=pickle.HIGHEST_PROTOCOL))
+            if self._listener is None or self._listener.done():
+                self._listener = loop.create_task(self._listen())
+            return await future
+        finally:
+            self._pending.pop(task_id, None)
+
+    async def _listen(self) -> None:
+        try:
+            while self._pending:
+                data = await self.broker.pop(self.reply_to, self.poll_timeout)
+                if data is not None:
+                    await self._dispatch(pickle.loads(data))
+        except Exception as exp:
+            logger.exception(f"Reply listener {self.reply_to} failed")
+            for future, _ in self._pending.values():
+                if not future.done():
+                    future.set_exception(exp)
+
+    async def _dispatch(self, reply: Dict) -> None:
+        future, service = self._pending.get(reply["id"], (None, None))
+        if reply["type"] == "message":
+            if service is not None:
+                await service.message(**reply["kwargs"])
+            return
+
+        # unpack even late replies to release their blobs
+        value = await unpack(self.broker, reply["data"])
+        if future is None or future.done():
+            logger.debug(f"Drop reply of finished task {reply['id']}")
+        elif reply["type"] == "error":
+            future.set_exception(value)
+        else:
+            future.set_result(value)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+
+
+class _TaskPipeline:
+    """What service running on worker sees instead of its pipeline"""
+    __slots__ = ("config", "remaining", "_worker", "_task")
+
+    def __init__(self, worker: "Worker", task: Dict):
+        self.config = {task["service"]: task["config"]}
+        self.remaining = task["remaining"]
+        self._worker = worker
+        self._task = task
+
+    async def _call_middleware(self, func: str, service: Service, **kwargs) -> None:
+        if func == "service_message":
+            await self._worker._reply(self._task, "message", kwargs=kwargs)
+
+
+class Worker:
+    """
+    Runs services from broker queue
+
+    worker = Worker(broker, [GetSha1, PrintSha1])
+    await worker.run()
+    """
+
+    def __init__(self,
+                 broker: BrokerABC,
+                 services: Iterable[Type[Service]],
+                 *,
+                 queue: str = DEFAULT_QUEUE,
+                 concurrency: int = 10,
+                 blob_threshold: int or None = 64 * 1024,
+                 poll_timeout: float = 1):
+        self.broker = broker
+        self.queue = queue
+        self.concurrency = concurrency
+        self.blob_threshold = blob_threshold
+        self.poll_timeout = poll_timeout
+        self._services = {service_cls.__name__.lower(): service_cls for service_cls in services}
+        self._running = False
+        self._tasks = set()
+
+    async def run(self) -> None:
+        """
+        Set up services, then take tasks until stop(), then tear services down
+        """
+        loop = asyncio.get_event_loop()
+        semaphore = asyncio.Semaphore(self.concurrency)
+        self._running = True
+        await lifecycle.warm_up(*self._services.values())
+        try:
+            while self._running:
+                await semaphore.acquire()
+                data = await self.broker.pop(self.queue, self.poll_timeout)
+                if data is None:
+                    semaphore.release()
+                    continue
+                task = loop.create_task(self._handle(pickle.loads(data)))
+                self._tasks.add(task)
+                task.add_done_callback(self._tasks.discard)
+                task.add_done_callback(lambda _: semaphore.release())
+        finally:
+            if self._tasks:
+                await asyncio.wait(self._tasks)
+            await lifecycle.shutdown(*self._services.values())
+
+    def stop(self) -> None:
+        """Stop taking tasks, run() returns when running ones are finished"""
+        self._running = False
+
+    async def _reply(self, task: Dict, reply_type: str, **values) -> None:
+        reply = dict(id=task["id"], type=reply_type, **values)
+        await self.broker.push(task["reply_to"], pickle.dumps(reply, protocol=pickle.HIGHEST_PROTOCOL))
+
+    async def _handle(self, task: Dict) -> None:
+        try:
+            kwargs = await unpack(self.broker, task["kwargs"])
+            service_cls = self._services.get(task["service"])
+            if service_cls is None:
+                raise AioFlowRemoteError(f"Service {task['service']} is unknown to worker")
+
+            await lifecycle.setup(service_cls)
+            service = service_cls(_TaskPipeline(self, task))
+            service.number = task["number"]
+            service.attempt = task["attempt"]
+            service.status = ServiceStatus.PROCESSING
+            timeout = service.config.get("attempt_timeout") or service.timeout
+            if task["remaining"] is not None:
+                timeout = task["remaining"] if timeout is None else min(timeout, task["remaining"])
+            result = await asyncio.wait_for(service(**kwargs), timeout=timeout)
+        except Exception as exp:
+            logger.exception(f"Task {task['id']} of [{task['name']}] failed")
+            try:
+                data = await pack(self.broker, exp, self.blob_threshold)
+            except Exception:
+                data = await pack(self.broker, AioFlowRemoteError(repr(exp)), self.blob_threshold)
+            await self._reply(task, "error", data=data)
+        else:
+            await self._reply(task, "result", data=await pack(self.broker, result, self.blob_threshold))
@@ -0,0 +1,118 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Mapping
+
+from aioflow.stats import latency
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+
+class HedgeStats:
+    __slots__ = ("calls", "hedged", "hedge_wins", "primary_wins")
+
+    def __init__(self):
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins = 0
+
+    def summary(self) -> Dict:
+        return dict(calls=self.calls, hedged=self.hedged, hedge_wins=self.hedge_wins, primary_wins=self.primary_wins)
+
+
+_stats = {}
+
+
+def hedge_stats(name: str) -> HedgeStats:
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats[name] = HedgeStats()
+    return stats
+
+
+def reset_hedge_stats() -> None:
+    _stats.clear()
+
+
+class HedgePolicy:
+    """
+    Hedging policy from service config, only for idempotent services:
+        hedge: true
+        hedge_percentile: start second attempt after this percentile of observed latency, 95 by default
+        hedge_min_samples: do not hedge until this number of latencies is observed, 20 by default
+        hedge_max_ratio: limit of hedged calls to all calls, 0.1 by default
+    """
+    __slots__ = ("percentile", "min_samples", "max_ratio")
+
+    def __init__(self, *, percentile: float = 95, min_samples: int = 20, max_ratio: float = 0.1):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "HedgePolicy" or None:
+        if not config.get("hedge"):
+            return None
+        return cls(
+            percentile=config.get("hedge_percentile", 95),
+            min_samples=config.get("hedge_min_samples", 20),
+            max_ratio=config.get("hedge_max_ratio", 0.1),
+        )
+
+
+async def _timed(loop, call: Callable[[], Awaitable]) -> tuple:
+    start = loop.time()
+    result = await call()
+    return result, loop.time() - start
+
+
+async def hedged_call(name: str, policy: HedgePolicy, call: Callable[[], Awaitable]) -> Any:
+    """
+    Await call(), start one more call() if the first one is slower than usual
+
+    The first finished successfully call wins, the other one is cancelled.
+    Latency of the winner is observed by stats.latency(name).
+    """
+    loop = asyncio.get_event_loop()
+    tracker = latency(name)
+    stats = hedge_stats(name)
+    stats.calls += 1
+
+    primary = loop.create_task(_timed(loop, call))
+    tasks = {primary}
+    try:
+        delay = None
+        if len(tracker) >= policy.min_samples:
+            delay = tracker.percentile(policy.percentile)
+        if delay is not None:
+            await asyncio.wait(tasks, timeout=delay)
+
+        hedged = not primary.done() and delay is not None and stats.hedged < policy.max_ratio * stats.calls
+        if hedged:
+            logger.debug(f"Hedge [{name}] after {delay:.3f}s")
+            stats.hedged += 1
+            tasks.add(loop.create_task(_timed(loop, call)))
+
+        while True:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            succeeded = [task for task in done if task.exception() is None]
+            if not succeeded:
+                if tasks:
+                    continue
+                # every call failed, raise the error of the last one
+                return done.pop().result()
+
+            winner = primary if primary in succeeded else succeeded[0]
+            if hedged:
+                if winner is primary:
+                    stats.primary_wins += 1
+                else:
+                    stats.hedge_wins += 1
+            result, duration = winner.result()
+            tracker.observe(duration)
+            return result
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -1,9 +1,9 @@
 import asyncio
 import logging
+import os
+from types import MappingProxyType
 from typing import Mapping, Callable, Dict, Any
 
-import yaml
-
 __author__ = "a.lemets"
 
 logger = logging.getLogger(__name__)
@@ -19,13 +19,75 @@ async def try_call(function: Callable, *args, **kwargs) -> Any:
     return result
 
 
-def load_config(config_path: str) -> Dict:
-    with open(config_path, 'r') as stream:
-        try:
-            return yaml.load(stream)
-        except yaml.YAMLError as exc:
-            logger.exception(f"Cant parse yaml config {config_path}")
-            raise
+# {abspath: ((st_mtime_ns, st_size), config)}
+_config_cache = {}
+
+
+def freeze(value: Any) -> Any:
+    """Read only copy of config: mappings become read only views, lists become tuples"""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Private mutable copy of config, reverse of freeze"""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def _yaml_loader():
+    import yaml
+
+    return getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+def load_config(config_path: str, *, copy: bool = True) -> Dict:
+    """
+    Load yaml config
+
+    Parsed configs are cached per process by path and reparsed only
+    when mtime or size of the file changes, so edits are picked up
+    by the next call (hot reload).
+
+    :param config_path: path to yaml file
+    :param copy: return private deep copy, otherwise shared cached config frozen by freeze()
+    :return: config
+    """
+    try:
+        stat = os.stat(config_path)
+        key, version = os.path.abspath(config_path), (stat.st_mtime_ns, stat.st_size)
+    except OSError:
+        key = version = None  # leave error reporting to open()
+
+    cached = _config_cache.get(key)
+    if key is not None and cached is not None and cached[0] == version:
+        config = cached[1]
+    else:
+        # yaml is imported only by pipelines with config files
+        import yaml
+
+        with open(config_path, 'r') as stream:
+            try:
+                config = yaml.load(stream, Loader=_yaml_loader())
+            except yaml.YAMLError as exc:
+                logger.exception(f"Cant parse yaml config {config_path}")
+                raise
+        # shared by every pipeline of the process, nothing may change it in place
+        config = freeze(config)
+        if key is not None:
+            _config_cache[key] = (version, config)
+
+    return thaw(config) if copy else config
+
+
+def clear_config_cache() -> None:
+    _config_cache.clear()
 
 
 def merge_dict(target_dict: Dict, dct: Dict) -> None:
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+from typing import Any, Type
+
+import aioflow
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+# {service_cls: resources returned by service_cls.setup()}
+_resources = {}
+_setups = {}
+
+
+def resources(service_cls: Type["aioflow.Service"]) -> Any:
+    return _resources.get(service_cls)
+
+
+async def setup(service_cls: Type["aioflow.Service"]) -> Any:
+    """
+    Call service_cls.setup() once per process, concurrent callers wait for the same call
+
+    Failed setup is called again by the next caller.
+    """
+    if service_cls in _resources:
+        return _resources[service_cls]
+
+    task = _setups.get(service_cls)
+    if task is None:
+        logger.debug(f"Setup [{service_cls.__name__}]")
+        task = _setups[service_cls] = asyncio.ensure_future(service_cls.setup())
+    try:
+        result = await asyncio.shield(task)
+    finally:
+        if task.done():
+            _setups.pop(service_cls, None)
+    _resources.setdefault(service_cls, result)
+    return _resources[service_cls]
+
+
+async def warm_up(*service_classes: Type["aioflow.Service"]) -> None:
+    """Set up services before accepting traffic"""
+    await asyncio.gather(*(setup(service_cls) for service_cls in service_classes))
+
+
+async def shutdown(*service_classes: Type["aioflow.Service"]) -> None:
+    """Tear down given services, every set up service if nothing is given"""
+    for service_cls in service_classes or list(_resources):
+        if service_cls not in _resources:
+            continue
+        try:
+            await service_cls.teardown(_resources.pop(service_cls))
+        except Exception:
+            logger.exception(f"Teardown [{service_cls.__name__}] failed")
+
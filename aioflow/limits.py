@@ -0,0 +1,139 @@
+import asyncio
+from enum import Enum
+from typing import Dict, Mapping
+
+__author__ = "a.lemets"
+
+
+class AioFlowCircuitOpen(RuntimeError):
+    """Circuit breaker of service is open"""
+
+
+class TokenBucket:
+    """
+    Token bucket shared by every service with the same name
+
+    Service config:
+        rate_limit: tokens per second
+        rate_burst: bucket size, 1 by default
+    """
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = None
+
+    def reserve(self, now: float) -> float:
+        """
+        Take a token, tokens may go negative to queue callers fairly
+
+        :return: seconds to wait before the token may be used
+        """
+        if self.updated is not None:
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    async def acquire(self) -> float:
+        delay = self.reserve(asyncio.get_event_loop().time())
+        if delay:
+            await asyncio.sleep(delay)
+        return delay
+
+
+class CircuitState(Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker shared by every service with the same name
+
+    After `breaker_failures` consecutive failures calls fail immediately
+    for `breaker_cooldown` seconds, then one trial call decides
+    whether to close the circuit again.
+    """
+    __slots__ = ("failures", "cooldown", "state", "consecutive", "opened", "_trial")
+
+    def __init__(self, failures: int, cooldown: float = 30):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.state = CircuitState.CLOSED
+        self.consecutive = 0
+        self.opened = None
+        self._trial = False
+
+    def allow(self, now: float) -> bool:
+        if self.state is CircuitState.OPEN and now - self.opened >= self.cooldown:
+            self.state = CircuitState.HALF_OPEN
+            self._trial = False
+        if self.state is CircuitState.HALF_OPEN:
+            if self._trial:
+                return False
+            self._trial = True
+            return True
+        return self.state is CircuitState.CLOSED
+
+    def end_trial(self) -> None:
+        """Called after every allowed call, so a trial ended any way lets the next one in"""
+        self._trial = False
+
+    def success(self) -> None:
+        self.consecutive = 0
+        self.state = CircuitState.CLOSED
+
+    def failure(self, now: float) -> None:
+        self.consecutive += 1
+        if self.state is CircuitState.HALF_OPEN or self.consecutive >= self.failures:
+            self.state = CircuitState.OPEN
+            self.opened = now
+
+
+_rate_limiters = {}
+_circuit_breakers = {}
+
+
+def rate_limiter(name: str, config: Mapping) -> TokenBucket or None:
+    """Process wide rate limiter of services with `name`, created from the first config seen"""
+    if not config.get("rate_limit"):
+        return None
+    limiter = _rate_limiters.get(name)
+    if limiter is None:
+        limiter = _rate_limiters[name] = TokenBucket(config["rate_limit"], config.get("rate_burst", 1))
+    return limiter
+
+
+def circuit_breaker(name: str, config: Mapping) -> CircuitBreaker or None:
+    """Process wide circuit breaker of services with `name`, created from the first config seen"""
+    if not config.get("breaker_failures"):
+        return None
+    breaker = _circuit_breakers.get(name)
+    if breaker is None:
+        breaker = _circuit_breakers[name] = CircuitBreaker(
+            config["breaker_failures"],
+            config.get("breaker_cooldown", 30),
+        )
+    return breaker
+
+
+def limits() -> Dict[str, Dict]:
+    names = set(_rate_limiters) | set(_circuit_breakers)
+    return {
+        name: dict(
+            tokens=_rate_limiters[name].tokens if name in _rate_limiters else None,
+            circuit=_circuit_breakers[name].state.value if name in _circuit_breakers else None,
+        )
+        for name in names
+    }
+
+
+def reset_limits() -> None:
+    _rate_limiters.clear()
+    _circuit_breakers.clear()
@@ -0,0 +1,122 @@
+import asyncio
+import os
+from typing import Dict
+
+import aioflow
+from aioflow import MiddlewareABC, ServiceStatus
+from aioflow.codecs import ResultCodec, decode
+from aioflow.helpers import thaw
+
+__author__ = "a.lemets"
+
+RECORDING_SUFFIX = ".aioflow"
+
+
+def dump_recording(path: str, recording: Dict) -> None:
+    data_format, data = ResultCodec("pickle", compression="zlib", threshold=0).encode(recording)
+    with open(path, "wb") as stream:
+        stream.write(data_format.encode() + b"\n" + data)
+
+
+def load_recording(path: str) -> Dict:
+    """Recordings are pickled, load only the ones you trust"""
+    with open(path, "rb") as stream:
+        data_format, _, data = stream.read().partition(b"\n")
+    return decode(data_format.decode(), data, allow_pickle=True)
+
+
+class RecordMiddleware(MiddlewareABC):
+    """
+    Record every pipeline run into `{directory}/{pipeline name}-{pipeline id}.aioflow`:
+    shape of the DAG, config, resolved kwargs, results, durations and messages of services,
+    see aioflow.replay to run it again without real payloads
+
+    Kwargs and results are pickled, so they must be picklable.
+    """
+
+    def __init__(self, directory: str, *, record_kwargs: bool = True):
+        """
+
+        :param directory: where recordings are written
+        :param record_kwargs: keep resolved kwargs of services, they may be large
+        """
+        self.directory = directory
+        self.record_kwargs = record_kwargs
+        self._recordings = {}
+
+    async def pipeline_start(self, pipeline: "aioflow.Pipeline", **kwargs):
+        self._recordings[pipeline.id] = dict(
+            name=pipeline.name,
+            id=pipeline.id,
+            config=thaw(pipeline.config),
+            services=[
+                dict(
+                    name=service.name,
+                    cls=type(service).__name__,
+                    config=thaw(service.config),
+                    depends_on={srv._index: list(keys) for srv, keys in depends_on.items()},
+                    status=ServiceStatus.PENDING.value,
+                    kwargs=None,
+                    result=None,
+                    error=None,
+                    start=None,
+                    duration=None,
+                    messages=[],
+                )
+                for service, depends_on in zip(pipeline.services, pipeline._depends_on)
+            ],
+            start=asyncio.get_event_loop().time(),
+            duration=None,
+            status=None,
+        )
+
+    def _service(self, service: "aioflow.Service") -> Dict or None:
+        recording = self._recordings.get(service._pipeline.id)
+        return recording and recording["services"][service._index]
+
+    async def service_start(self, service: "aioflow.Service", **kwargs):
+        record = self._service(service)
+        if record is not None:
+            record.update(status=ServiceStatus.PROCESSING.value, start=asyncio.get_event_loop().time())
+            if self.record_kwargs:
+                record["kwargs"] = service.kwargs
+
+    async def service_message(self, service: "aioflow.Service", **kwargs):
+        record = self._service(service)
+        if record is not None and record["start"] is not None:
+            record["messages"].append((asyncio.get_event_loop().time() - record["start"], kwargs))
+
+    async def service_done(self, service: "aioflow.Service", **kwargs):
+        record = self._service(service)
+        if record is not None:
+            start = record["start"]
+            record.update(
+                status=ServiceStatus.DONE.value,
+                result=service.result,
+                duration=0 if start is None else asyncio.get_event_loop().time() - start,
+            )
+
+    async def service_failed(self, service: "aioflow.Service", exception: Exception, **kwargs):
+        record = self._service(service)
+        if record is not None:
+            # skipped services were never started
+            start = record["start"]
+            record.update(
+                status=ServiceStatus.FAILED.value,
+                error=repr(exception),
+                duration=0 if start is None else asyncio.get_event_loop().time() - start,
+            )
+
+    async def pipeline_done(self, pipeline: "aioflow.Pipeline", **kwargs):
+        await self._dump(pipeline, "done")
+
+    async def pipeline_failed(self, pipeline: "aioflow.Pipeline", exception: Exception, **kwargs):
+        await self._dump(pipeline, "failed")
+
+    async def _dump(self, pipeline: "aioflow.Pipeline", status: str) -> None:
+        recording = self._recordings.pop(pipeline.id, None)
+        if recording is None:
+            return
+        recording.update(status=status, duration=asyncio.get_event_loop().time() - recording.pop("start"))
+        path = os.path.join(self.directory, f"{pipeline.name}-{pipeline.id}{RECORDING_SUFFIX}")
+        await asyncio.get_event_loop().run_in_executor(None, dump_recording, path, recording)
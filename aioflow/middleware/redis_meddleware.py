@@ -1,18 +1,130 @@
+import asyncio
 import datetime
+import json
+import logging
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Mapping
 from uuid import uuid4
 
-from aioredis import Redis
-
 import aioflow
 from aioflow import MiddlewareABC, ServiceStatus
+from aioflow.codecs import ResultCodec
 from aioflow.pipeline import PipelineStatus
 
+if TYPE_CHECKING:
+    from aioredis import Redis
+
 __author__ = "a.lemets"
 
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAM_PREFIX = "aioflow:events"
+
+# Scripts below build state and index keys from ids read inside them, so they are
+# not Redis Cluster safe: RedisMiddleware needs a single Redis node (or a proxy keeping
+# every aioflow key on one node).
+
+# KEYS[1]: state hash, KEYS[2]: creation index (optional), KEYS[3]: set of pipeline services (optional)
+# ARGV[1]: status index prefix, ARGV[2]: id, ARGV[3]: time, ARGV[4...]: fields and values
+_SET_STATE = """
+local old = redis.call('HGET', KEYS[1], 'status')
+redis.call('HMSET', KEYS[1], unpack(ARGV, 4))
+local new = redis.call('HGET', KEYS[1], 'status')
+if old and old ~= new then
+    redis.call('ZREM', ARGV[1] .. old, ARGV[2])
+end
+redis.call('ZADD', ARGV[1] .. new, ARGV[3], ARGV[2])
+if KEYS[2] then
+    redis.call('ZADD', KEYS[2], ARGV[3], ARGV[2])
+end
+if KEYS[3] then
+    redis.call('SADD', KEYS[3], ARGV[2])
+end
+return new
+"""
+
+# ids swept from indexes by one finished pipeline at most
+_SWEEP_LIMIT = 1000
+
+# KEYS[1]: pipeline hash, KEYS[2]: set of pipeline services, KEYS[3], KEYS[4]: expiry indexes of pipelines
+# and services, KEYS[5...4 + ARGV[6]]: indexes of pipelines, the rest: indexes of services
+# ARGV[1]: ttl, ARGV[2]: service key prefix, ARGV[3]: time, ARGV[4]: pipeline id, ARGV[5]: sweep limit
+_EXPIRE = """
+local expires = ARGV[3] + ARGV[1]
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+redis.call('ZADD', KEYS[3], expires, ARGV[4])
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[2])) do
+    redis.call('EXPIRE', ARGV[2] .. id, ARGV[1])
+    redis.call('ZADD', KEYS[4], expires, id)
+end
+redis.call('EXPIRE', KEYS[2], ARGV[1])
+-- ids of expired states leave every index of their kind
+local bounds = {{5, 4 + ARGV[6]}, {5 + ARGV[6], #KEYS}}
+for kind = 1, 2 do
+    local ids = redis.call('ZRANGEBYSCORE', KEYS[2 + kind], '-inf', ARGV[3], 'LIMIT', 0, ARGV[5])
+    if #ids > 0 then
+        for i = bounds[kind][1], bounds[kind][2] do
+            redis.call('ZREM', KEYS[i], unpack(ids))
+        end
+        redis.call('ZREM', KEYS[2 + kind], unpack(ids))
+    end
+end
+"""
+
+# KEYS[1]: index, sorted set newest first or set; ARGV[1]: state key prefix, ARGV[2]: offset, ARGV[3]: limit
+_QUERY = """
+local is_set = redis.call('TYPE', KEYS[1]).ok == 'set'
+local ids
+if is_set then
+    ids = redis.call('SMEMBERS', KEYS[1])
+else
+    ids = redis.call('ZREVRANGE', KEYS[1], ARGV[2], ARGV[2] + ARGV[3] - 1)
+end
+local states = {}
+for _, id in ipairs(ids) do
+    local state = redis.call('HGETALL', ARGV[1] .. id)
+    if #state == 0 then
+        redis.call(is_set and 'SREM' or 'ZREM', KEYS[1], id)
+    else
+        table.insert(states, id)
+        table.insert(states, state)
+    end
+end
+return states
+"""
+
 
 class RedisMiddleware(MiddlewareABC):
-    def __init__(self, redis: Redis):
+    def __init__(self,
+                 redis: "Redis",
+                 *,
+                 events: bool = True,
+                 stream_prefix: str = DEFAULT_STREAM_PREFIX,
+                 stream_maxlen: int = 10000,
+                 flush_size: int = 100,
+                 flush_interval: float = 0.1,
+                 done_ttl: int = None,
+                 failed_ttl: int = None):
+        """
+
+        :param redis: redis connection
+        :param events: append lifecycle events and messages to stream `{stream_prefix}:{pipeline name}`
+        :param stream_maxlen: approximate length streams are trimmed to
+        :param flush_size: events buffered before they are written at once
+        :param flush_interval: seconds buffered events wait at most
+        :param done_ttl: seconds states of done pipeline and its services are kept
+        :param failed_ttl: seconds states of failed pipeline and its services are kept
+        """
         self.redis = redis
+        self.events = events
+        self.stream_prefix = stream_prefix
+        self.stream_maxlen = stream_maxlen
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.done_ttl = done_ttl
+        self.failed_ttl = failed_ttl
+        self._events = []
+        self._flush_handle = None
+        self._scripts = {}
 
     def _pipeline_key(self, pipeline_id):
         return f"pipeline:{pipeline_id}"
@@ -20,6 +132,21 @@ class RedisMiddleware(MiddlewareABC):
     def _service_key(self, service_id):
         return f"service:{service_id}"
 
+    def _services_key(self, pipeline_id):
+        return f"pipeline:{pipeline_id}:services"
+
+    def _status_index(self, kind, status=""):
+        return f"{kind}:status:{status}"
+
+    def _created_index(self, kind):
+        return f"{kind}:created"
+
+    def _expiry_index(self, kind):
+        return f"{kind}:expiry"
+
+    def _indexes(self, kind, statuses):
+        return [self._created_index(kind)] + [self._status_index(kind, status.value) for status in statuses]
+
     async def gen_id(self, key_function):
         _id = str(uuid4())
         while await self.redis.exists(key_function(_id)):
@@ -32,83 +159,242 @@ class RedisMiddleware(MiddlewareABC):
     async def _service_id(self):
         return await self.gen_id(self._service_key)
 
+    async def _script(self, script: str, keys: List[str], args: List) -> Any:
+        sha = self._scripts.get(script)
+        if sha is None:
+            sha = self._scripts[script] = await self.redis.script_load(script)
+        try:
+            return await self.redis.evalsha(sha, keys=keys, args=args)
+        except Exception as exp:
+            # ReplyError of aioredis, matched by message so the client may be any
+            if "NOSCRIPT" not in str(exp):
+                raise
+            # script cache of server was flushed
+            del self._scripts[script]
+            return await self._script(script, keys, args)
+
+    async def _set_state(self, kind: str, key: str, _id: str, *, created_index: bool = False,
+                         services_key: str = None, **fields) -> None:
+        """Update state hash and move its id between status indexes atomically"""
+        now = datetime.datetime.utcnow().timestamp()
+        keys = [key]
+        if created_index or services_key:
+            keys.append(self._created_index(kind))
+        if services_key:
+            keys.append(services_key)
+        args = [self._status_index(kind), _id, now]
+        for field, value in fields.items():
+            args += [field, value]
+        await self._script(_SET_STATE, keys, args)
+
+    async def _expire(self, pipeline: "aioflow.Pipeline", ttl: int or None) -> None:
+        if ttl is None:
+            return
+        pipeline_indexes = self._indexes("pipelines", PipelineStatus)
+        keys = [
+            self._pipeline_key(pipeline.id),
+            self._services_key(pipeline.id),
+            self._expiry_index("pipelines"),
+            self._expiry_index("services"),
+            *pipeline_indexes,
+            *self._indexes("services", ServiceStatus),
+        ]
+        now = datetime.datetime.utcnow().timestamp()
+        args = [ttl, self._service_key(""), now, pipeline.id, _SWEEP_LIMIT, len(pipeline_indexes)]
+        await self._script(_EXPIRE, keys, args)
+
+    @staticmethod
+    def _parse_states(reply: List) -> List[Dict]:
+        states = []
+        for _id, fields in zip(reply[::2], reply[1::2]):
+            state = {"id": _id.decode()}
+            for field, value in zip(fields[::2], fields[1::2]):
+                field = field.decode()
+                # result is binary, see codecs
+                state[field] = value if field == "result" else value.decode()
+            states.append(state)
+        return states
+
+    async def query_pipelines(self, status: PipelineStatus = None, *, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """
+        States of pipelines in one round trip, newest first
+
+        :param status: only pipelines in this status, ordered by time of the status change
+        """
+        index = self._created_index("pipelines") if status is None else self._status_index("pipelines", status.value)
+        return self._parse_states(await self._script(_QUERY, [index], [self._pipeline_key(""), offset, limit]))
+
+    async def query_services(self, status: ServiceStatus = None, *, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """States of services of every pipeline in one round trip, newest first"""
+        index = self._created_index("services") if status is None else self._status_index("services", status.value)
+        return self._parse_states(await self._script(_QUERY, [index], [self._service_key(""), offset, limit]))
+
+    async def pipeline_services(self, pipeline_id: str) -> List[Dict]:
+        """States of every service of pipeline in one round trip"""
+        reply = await self._script(_QUERY, [self._services_key(pipeline_id)], [self._service_key(""), 0, 0])
+        return self._parse_states(reply)
+
+    async def pipeline_states(self, pipeline_ids: Iterable[str]) -> List[Dict or None]:
+        """States of given pipelines in one round trip, None for unknown or expired ones"""
+        pipeline_ids = list(pipeline_ids)
+        transaction = self.redis.pipeline()
+        futures = [transaction.hgetall(self._pipeline_key(pipeline_id)) for pipeline_id in pipeline_ids]
+        await transaction.execute()
+        states = []
+        for pipeline_id, future in zip(pipeline_ids, futures):
+            fields = future.result()
+            if not fields:
+                states.append(None)
+                continue
+            states.append(dict(id=pipeline_id, **{key.decode(): value.decode() for key, value in fields.items()}))
+        return states
+
+    def _stream_key(self, pipeline_name):
+        return f"{self.stream_prefix}:{pipeline_name}"
+
+    async def _event(self, event: str, pipeline: "aioflow.Pipeline", service: "aioflow.Service" = None, **fields):
+        if not self.events:
+            return
+        fields = dict(event=event, pipeline_id=pipeline.id, time=datetime.datetime.utcnow().timestamp(), **fields)
+        if service is not None:
+            fields.update(service_id=service.id, service=service.name)
+        self._events.append((self._stream_key(pipeline.name), fields))
+
+        if len(self._events) >= self.flush_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self.flush_interval, self._flush_later)
+
+    def _flush_later(self):
+        self._flush_handle = None
+        asyncio.ensure_future(self.flush()).add_done_callback(self._flush_done)
+
+    @staticmethod
+    def _flush_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Flush of events failed: {task.exception()!r}")
+
+    async def flush(self):
+        """Write buffered events to streams with one round trip"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        events, self._events = self._events, []
+        if not events:
+            return
+
+        transaction = self.redis.pipeline()
+        for stream, fields in events:
+            transaction.xadd(stream, fields, max_len=self.stream_maxlen, exact_len=False)
+        await transaction.execute()
+
     async def pipeline_create(self, pipeline: "aioflow.Pipeline", **kwargs):
         pipeline._id = await self._pipeline_id()
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "pipelines",
             self._pipeline_key(pipeline.id),
-            dict(
-                name=pipeline.name,
-                created=datetime.datetime.utcnow().timestamp(),
-                status=PipelineStatus.PENDING.value,
-            )
+            pipeline.id,
+            created_index=True,
+            name=pipeline.name,
+            created=datetime.datetime.utcnow().timestamp(),
+            status=PipelineStatus.PENDING.value,
         )
+        await self._event("pipeline_create", pipeline, status=PipelineStatus.PENDING.value)
 
     async def pipeline_start(self, pipeline: "aioflow.Pipeline", **kwargs):
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "pipelines",
             self._pipeline_key(pipeline.id),
-            dict(
-                start=datetime.datetime.utcnow().timestamp(),
-                status=PipelineStatus.PROCESSING.value,
-            )
+            pipeline.id,
+            start=datetime.datetime.utcnow().timestamp(),
+            status=PipelineStatus.PROCESSING.value,
         )
+        await self._event("pipeline_start", pipeline, status=PipelineStatus.PROCESSING.value)
 
     async def pipeline_done(self, pipeline: "aioflow.Pipeline", **kwargs):
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "pipelines",
             self._pipeline_key(pipeline.id),
-            dict(
-                end=datetime.datetime.utcnow().timestamp(),
-                status=PipelineStatus.DONE.value,
-            )
+            pipeline.id,
+            end=datetime.datetime.utcnow().timestamp(),
+            status=PipelineStatus.DONE.value,
         )
+        await self._expire(pipeline, self.done_ttl)
+        await self._event("pipeline_done", pipeline, status=PipelineStatus.DONE.value)
+        await self.flush()
 
     async def pipeline_failed(self, pipeline: "aioflow.Pipeline", exception: Exception, **kwargs):
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "pipelines",
             self._pipeline_key(pipeline.id),
-            dict(
-                end=datetime.datetime.utcnow().timestamp(),
-                status=PipelineStatus.FAILED.value,
-            )
+            pipeline.id,
+            end=datetime.datetime.utcnow().timestamp(),
+            status=PipelineStatus.FAILED.value,
         )
+        await self._expire(pipeline, self.failed_ttl)
+        await self._event("pipeline_failed", pipeline, status=PipelineStatus.FAILED.value, error=repr(exception))
+        await self.flush()
 
     async def service_create(self, service: "aioflow.Service", **kwargs):
         service._id = await self._service_id()
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "services",
             self._service_key(service.id),
-            dict(
-                name=service.name,
-                created=datetime.datetime.utcnow().timestamp(),
-                status=ServiceStatus.PENDING.value,
-                pipeline_id=service._pipeline.id
-            )
+            service.id,
+            services_key=self._services_key(service._pipeline.id),
+            name=service.name,
+            created=datetime.datetime.utcnow().timestamp(),
+            status=ServiceStatus.PENDING.value,
+            pipeline_id=service._pipeline.id
         )
+        await self._event("service_create", service._pipeline, service, status=ServiceStatus.PENDING.value)
 
     async def service_start(self, service: "aioflow.Service", **kwargs):
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "services",
             self._service_key(service.id),
-            dict(
-                start=datetime.datetime.utcnow().timestamp(),
-                status=ServiceStatus.PROCESSING.value,
-            )
+            service.id,
+            start=datetime.datetime.utcnow().timestamp(),
+            status=ServiceStatus.PROCESSING.value,
         )
+        await self._event("service_start", service._pipeline, service, status=ServiceStatus.PROCESSING.value)
 
     async def service_message(self, service: "aioflow.Service", **kwargs):
-        ...
+        await self._event("service_message", service._pipeline, service, message=json.dumps(kwargs, default=str))
 
     async def service_done(self, service: "aioflow.Service", **kwargs):
-        await self.redis.hmset_dict(
+        result_format, result = service.encoded_result
+        await self._set_state(
+            "services",
             self._service_key(service.id),
-            dict(
-                end=datetime.datetime.utcnow().timestamp(),
-                status=ServiceStatus.DONE.value,
-                result=service.json_result,
-            )
+            service.id,
+            end=datetime.datetime.utcnow().timestamp(),
+            status=ServiceStatus.DONE.value,
+            result=result,
+            result_format=result_format,
         )
+        await self._event("service_done", service._pipeline, service, status=ServiceStatus.DONE.value)
+
+    async def service_result(self, service_id: str, config: Mapping = None) -> Any:
+        """
+        Decoded result stored by service_done, None if there is no result
+
+        :param config: codec config results were written with, only its format is decoded, json by default
+        """
+        result_format, result = await self.redis.hmget(self._service_key(service_id), "result_format", "result")
+        if result is None:
+            return None
+        # results stored before codecs were plain json
+        return ResultCodec.from_config(config or {}).decode(result_format.decode() if result_format else "json", result)
 
     async def service_failed(self, service: "aioflow.Service", exception: Exception, **kwargs):
-        await self.redis.hmset_dict(
+        await self._set_state(
+            "services",
             self._service_key(service.id),
-            dict(
-                end=datetime.datetime.utcnow().timestamp(),
-                status=ServiceStatus.FAILED.value,
-            )
+            service.id,
+            end=datetime.datetime.utcnow().timestamp(),
+            status=ServiceStatus.FAILED.value,
+        )
+        await self._event(
+            "service_failed", service._pipeline, service, status=ServiceStatus.FAILED.value, error=repr(exception)
         )
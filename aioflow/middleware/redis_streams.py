@@ -0,0 +1,136 @@
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterable, List, Tuple
+
+from aioflow.middleware.redis_meddleware import DEFAULT_STREAM_PREFIX
+
+if TYPE_CHECKING:
+    from aioredis import Redis
+
+__author__ = "a.lemets"
+
+
+class EventConsumer:
+    """
+    Tail event streams of RedisMiddleware with a consumer group,
+    one blocking read follows every pipeline name given
+
+    consumer = EventConsumer(redis, ["sha1"], group="dashboard", consumer="web-1")
+    async for stream, event_id, event in consumer:
+        ...
+
+    Events are acknowledged when the next one is requested. On start the consumer
+    claims events idle for `claim_idle` milliseconds at other consumers of the group
+    and delivers events left unacknowledged by itself before new ones.
+    """
+
+    def __init__(self,
+                 redis: "Redis",
+                 pipeline_names: Iterable[str],
+                 *,
+                 group: str,
+                 consumer: str,
+                 stream_prefix: str = DEFAULT_STREAM_PREFIX,
+                 latest_id: str = "$",
+                 count: int = 100,
+                 block: int = 1000,
+                 claim_idle: int = 60000):
+        """
+
+        :param latest_id: where a new group starts, "$" for new events only, "0" for whole streams
+        :param count: events per read
+        :param block: milliseconds one read waits for events
+        :param claim_idle: milliseconds an event stays unacknowledged by other consumer before it is claimed
+        """
+        self.redis = redis
+        self.streams = [f"{stream_prefix}:{name}" for name in pipeline_names]
+        self.group = group
+        self.consumer = consumer
+        self.latest_id = latest_id
+        self.count = count
+        self.block = block
+        self.claim_idle = claim_idle
+        self._running = False
+        # streams with events delivered to this consumer before and not read yet, by id read after
+        self._pending = {stream: "0" for stream in self.streams}
+
+    async def create_groups(self) -> None:
+        for stream in self.streams:
+            try:
+                await self.redis.execute(b"XGROUP", b"CREATE", stream, self.group, self.latest_id, b"MKSTREAM")
+            except Exception as exp:
+                # ReplyError of aioredis, matched by message so the client may be any
+                if "BUSYGROUP" not in str(exp):
+                    raise
+
+    async def claim(self) -> None:
+        """Take over events idle for `claim_idle` milliseconds at other consumers, `read` delivers them"""
+        for stream in self.streams:
+            start = "-"
+            while True:
+                entries = await self.redis.xpending(stream, self.group, start, "+", self.count)
+                event_ids = [
+                    event_id for event_id, consumer, idle, _ in entries
+                    if idle >= self.claim_idle and consumer.decode() != self.consumer
+                ]
+                if event_ids:
+                    await self.redis.xclaim(stream, self.group, self.consumer, self.claim_idle, *event_ids)
+                if len(entries) < self.count:
+                    break
+                # next page starts right after the last entry
+                ms, seq = entries[-1][0].decode().split("-")
+                start = f"{ms}-{int(seq) + 1}"
+            self._pending[stream] = "0"
+
+    async def read(self) -> List[Tuple[str, str, Dict[str, str]]]:
+        """
+        Next events delivered to this consumer, empty list if none came in `block` milliseconds
+
+        Events delivered before and not acknowledged come first.
+        """
+        if self._pending:
+            streams = list(self._pending)
+            messages = await self.redis.xread_group(
+                self.group,
+                self.consumer,
+                streams,
+                timeout=None,
+                count=self.count,
+                latest_ids=list(self._pending.values()),
+            )
+            for stream in streams:
+                self._pending.pop(stream)
+            for stream, event_id, _ in messages:
+                self._pending[stream.decode()] = event_id.decode()
+            if messages:
+                return self._parse(messages)
+        messages = await self.redis.xread_group(
+            self.group,
+            self.consumer,
+            self.streams,
+            timeout=self.block,
+            count=self.count,
+            latest_ids=[">"] * len(self.streams),
+        )
+        return self._parse(messages)
+
+    @staticmethod
+    def _parse(messages: List) -> List[Tuple[str, str, Dict[str, str]]]:
+        return [
+            (stream.decode(), event_id.decode(), {key.decode(): value.decode() for key, value in fields.items()})
+            for stream, event_id, fields in messages
+        ]
+
+    async def ack(self, stream: str, *event_ids: str) -> None:
+        await self.redis.xack(stream, self.group, *event_ids)
+
+    async def __aiter__(self) -> AsyncIterator[Tuple[str, str, Dict[str, str]]]:
+        await self.create_groups()
+        await self.claim()
+        self._running = True
+        while self._running:
+            for stream, event_id, event in await self.read():
+                yield stream, event_id, event
+                await self.ack(stream, event_id)
+
+    def stop(self) -> None:
+        """Stop iteration after current read"""
+        self._running = False
@@ -0,0 +1,249 @@
+import asyncio
+import datetime
+import json
+import logging
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Any, Dict, List, Mapping, Tuple
+from uuid import uuid4
+
+import aioflow
+from aioflow import MiddlewareABC, ServiceStatus
+from aioflow.codecs import ResultCodec
+from aioflow.pipeline import PipelineStatus
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS pipelines (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    start REAL,
+    "end" REAL
+);
+CREATE INDEX IF NOT EXISTS pipelines_status ON pipelines (status, created);
+CREATE TABLE IF NOT EXISTS services (
+    id TEXT PRIMARY KEY,
+    pipeline_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    created REAL NOT NULL,
+    start REAL,
+    "end" REAL,
+    result_format TEXT,
+    result BLOB
+);
+CREATE INDEX IF NOT EXISTS services_pipeline ON services (pipeline_id);
+CREATE TABLE IF NOT EXISTS blobs (
+    service_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    pipeline_id TEXT NOT NULL,
+    service_id TEXT,
+    event TEXT NOT NULL,
+    time REAL NOT NULL,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS events_pipeline ON events (pipeline_id, time);
+"""
+
+_INSERT_PIPELINE = "INSERT INTO pipelines (id, name, status, created) VALUES (?, ?, ?, ?)"
+_START_PIPELINE = "UPDATE pipelines SET status = ?, start = ? WHERE id = ?"
+_END_PIPELINE = 'UPDATE pipelines SET status = ?, "end" = ? WHERE id = ?'
+_INSERT_SERVICE = "INSERT INTO services (id, pipeline_id, name, status, created) VALUES (?, ?, ?, ?, ?)"
+_START_SERVICE = "UPDATE services SET status = ?, start = ? WHERE id = ?"
+_END_SERVICE = 'UPDATE services SET status = ?, "end" = ?, result_format = ?, result = ? WHERE id = ?'
+_INSERT_BLOB = "INSERT OR REPLACE INTO blobs (service_id, data) VALUES (?, ?)"
+_INSERT_EVENT = "INSERT INTO events (pipeline_id, service_id, event, time, data) VALUES (?, ?, ?, ?, ?)"
+
+
+class SqliteMiddleware(MiddlewareABC):
+    """
+    Pipeline and service states in local SQLite database, same as RedisMiddleware keeps in redis
+
+    Writes are buffered and committed by one transaction per flush
+    in a dedicated thread, database runs in WAL mode.
+    """
+
+    def __init__(self,
+                 path: str,
+                 *,
+                 events: bool = True,
+                 flush_size: int = 500,
+                 flush_interval: float = 0.05,
+                 blob_threshold: int = 64 * 1024):
+        """
+
+        :param path: database file
+        :param events: keep lifecycle events and service messages in events table
+        :param flush_size: writes buffered before they are committed at once
+        :param flush_interval: seconds buffered writes wait at most
+        :param blob_threshold: results larger than this go to blobs table, services table keeps small rows
+        """
+        self.path = path
+        self.events = events
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.blob_threshold = blob_threshold
+        self._writes = []
+        self._flush_handle = None
+        # one thread owns the connection and keeps writes in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aioflow-sqlite")
+        self._connection = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._connection = connection
+        return self._connection
+
+    def _commit(self, writes: List[Tuple[str, Tuple]]) -> None:
+        connection = self._connect()
+        with connection:
+            # consecutive writes of the same statement go as one executemany
+            for sql, group in groupby(writes, key=lambda write: write[0]):
+                connection.executemany(sql, [params for _, params in group])
+
+    def _query(self, sql: str, params: Tuple) -> List[sqlite3.Row]:
+        connection = self._connect()
+        connection.row_factory = sqlite3.Row
+        return connection.execute(sql, params).fetchall()
+
+    async def _run(self, func, *args) -> Any:
+        return await asyncio.get_event_loop().run_in_executor(self._executor, func, *args)
+
+    async def _write(self, sql: str, *params) -> None:
+        self._writes.append((sql, params))
+        if len(self._writes) >= self.flush_size:
+            await self.flush()
+        elif self._flush_handle is None:
+            self._flush_handle = asyncio.get_event_loop().call_later(self.flush_interval, self._flush_later)
+
+    async def _event(self, event: str, pipeline_id: str, service_id: str = None, data: str = None) -> None:
+        if self.events:
+            await self._write(_INSERT_EVENT, pipeline_id, service_id, event, datetime.datetime.utcnow().timestamp(), data)
+
+    def _flush_later(self):
+        self._flush_handle = None
+        asyncio.ensure_future(self.flush()).add_done_callback(self._flush_done)
+
+    @staticmethod
+    def _flush_done(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Flush of states failed: {task.exception()!r}")
+
+    async def flush(self) -> None:
+        """Commit buffered writes in one transaction"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        writes, self._writes = self._writes, []
+        if writes:
+            await self._run(self._commit, writes)
+
+    async def close(self) -> None:
+        await self.flush()
+        if self._connection is not None:
+            await self._run(self._connection.close)
+            self._connection = None
+        self._executor.shutdown(wait=True)
+
+    async def pipeline_create(self, pipeline: "aioflow.Pipeline", **kwargs):
+        pipeline._id = str(uuid4())
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_INSERT_PIPELINE, pipeline.id, pipeline.name, PipelineStatus.PENDING.value, now)
+        await self._event("pipeline_create", pipeline.id)
+
+    async def pipeline_start(self, pipeline: "aioflow.Pipeline", **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_START_PIPELINE, PipelineStatus.PROCESSING.value, now, pipeline.id)
+        await self._event("pipeline_start", pipeline.id)
+
+    async def pipeline_done(self, pipeline: "aioflow.Pipeline", **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_END_PIPELINE, PipelineStatus.DONE.value, now, pipeline.id)
+        await self._event("pipeline_done", pipeline.id)
+        await self.flush()
+
+    async def pipeline_failed(self, pipeline: "aioflow.Pipeline", exception: Exception, **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_END_PIPELINE, PipelineStatus.FAILED.value, now, pipeline.id)
+        await self._event("pipeline_failed", pipeline.id, data=repr(exception))
+        await self.flush()
+
+    async def service_create(self, service: "aioflow.Service", **kwargs):
+        service._id = str(uuid4())
+        now = datetime.datetime.utcnow().timestamp()
+        pipeline_id = service._pipeline.id
+        await self._write(_INSERT_SERVICE, service.id, pipeline_id, service.name, ServiceStatus.PENDING.value, now)
+        await self._event("service_create", pipeline_id, service.id)
+
+    async def service_start(self, service: "aioflow.Service", **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_START_SERVICE, ServiceStatus.PROCESSING.value, now, service.id)
+        await self._event("service_start", service._pipeline.id, service.id)
+
+    async def service_message(self, service: "aioflow.Service", **kwargs):
+        await self._event("service_message", service._pipeline.id, service.id, json.dumps(kwargs, default=str))
+
+    async def service_done(self, service: "aioflow.Service", **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        result_format, result = service.encoded_result
+        if len(result) > self.blob_threshold:
+            await self._write(_INSERT_BLOB, service.id, result)
+            result = None
+        await self._write(_END_SERVICE, ServiceStatus.DONE.value, now, result_format, result, service.id)
+        await self._event("service_done", service._pipeline.id, service.id)
+
+    async def service_failed(self, service: "aioflow.Service", exception: Exception, **kwargs):
+        now = datetime.datetime.utcnow().timestamp()
+        await self._write(_END_SERVICE, ServiceStatus.FAILED.value, now, None, None, service.id)
+        await self._event("service_failed", service._pipeline.id, service.id, repr(exception))
+
+    async def _select(self, sql: str, *params) -> List[Dict]:
+        # reads see every write made before them
+        await self.flush()
+        return [dict(row) for row in await self._run(self._query, sql, params)]
+
+    async def query_pipelines(self, status: PipelineStatus = None, *, offset: int = 0, limit: int = 100) -> List[Dict]:
+        """States of pipelines, newest first"""
+        if status is None:
+            return await self._select("SELECT * FROM pipelines ORDER BY created DESC LIMIT ? OFFSET ?", limit, offset)
+        return await self._select(
+            "SELECT * FROM pipelines WHERE status = ? ORDER BY created DESC LIMIT ? OFFSET ?",
+            status.value, limit, offset,
+        )
+
+    async def pipeline_services(self, pipeline_id: str) -> List[Dict]:
+        """States of every service of pipeline, without results"""
+        return await self._select(
+            'SELECT id, pipeline_id, name, status, created, start, "end" FROM services WHERE pipeline_id = ?',
+            pipeline_id,
+        )
+
+    async def service_result(self, service_id: str, config: Mapping = None) -> Any:
+        """
+        Decoded result stored by service_done, None if there is no result
+
+        :param config: codec config results were written with, only its format is decoded, json by default
+        """
+        rows = await self._select(
+            "SELECT result_format, coalesce(result, data) AS result FROM services "
+            "LEFT JOIN blobs ON blobs.service_id = services.id WHERE id = ?",
+            service_id,
+        )
+        if not rows or rows[0]["result"] is None:
+            return None
+        return ResultCodec.from_config(config or {}).decode(rows[0]["result_format"], rows[0]["result"])
+
+    async def pipeline_events(self, pipeline_id: str) -> List[Dict]:
+        return await self._select("SELECT * FROM events WHERE pipeline_id = ? ORDER BY rowid", pipeline_id)
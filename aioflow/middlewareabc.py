@@ -32,8 +32,21 @@ class MiddlewareABC(abc.ABC):
     async def service_message(self, service: "aioflow.Service", **kwargs):
         ...
 
+    async def service_retry(self, service: "aioflow.Service", exception: Exception, **kwargs):
+        ...
+
+    async def service_throttled(self, service: "aioflow.Service", **kwargs):
+        ...
+
+    async def service_circuit_changed(self, service: "aioflow.Service", **kwargs):
+        ...
+
     async def service_done(self, service: "aioflow.Service", **kwargs):
         ...
 
     async def service_failed(self, service: "aioflow.Service", exception: Exception, **kwargs):
         ...
+
+    async def flush(self):
+        """Write out buffered events, called by Pipeline.flush() and Runner shutdown"""
+        ...
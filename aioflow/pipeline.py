@@ -1,13 +1,22 @@
 import asyncio
 import logging
+from collections import deque
 from enum import Enum
 from itertools import count
-from typing import Any, Dict, Iterable, Iterator, List, Type
-from uuid import uuid4
-
-from aioflow.helpers import load_config, merge_dict
+from types import MappingProxyType
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterable, Iterator, List, Mapping, Tuple, Type
+
+import aioflow
+from aioflow import lifecycle
+from aioflow.batch import AioFlowBatchSkipped, BatchItem
+from aioflow.concurrency import PriorityLimiter
+from aioflow.hedging import hedged_call
+from aioflow.helpers import load_config, merge_dict, thaw
+from aioflow.limits import AioFlowCircuitOpen
 from aioflow.middlewareabc import MiddlewareABC
+from aioflow.profiling import profile_call
 from aioflow.service import Service, ServiceStatus
+from aioflow.stats import latency
 
 __author__ = 'a.lemets'
 
@@ -22,6 +31,60 @@ class AioFlowKeyError(KeyError):
     ...
 
 
+class AioFlowDeadlineExceeded(asyncio.TimeoutError):
+    """Pipeline deadline passed before service start"""
+
+
+class AioFlowCancelled(RuntimeError):
+    """Pipeline run was cancelled, e.g. by Runner shutdown"""
+
+
+def _retrieve_exception(task: asyncio.Task) -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+class _EventStream:
+    """Bounded buffer of (service, result) events between pipeline and as_completed() consumer"""
+    __slots__ = ("size", "_events", "_readable", "_writable", "_finished", "_closed")
+
+    def __init__(self, size: int):
+        self.size = size
+        self._events = deque()
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._finished = False
+        self._closed = False
+
+    async def put(self, event: Tuple[Service, Any]) -> None:
+        while len(self._events) >= self.size and not self._closed:
+            self._writable.clear()
+            await self._writable.wait()
+        if not self._closed:
+            self._events.append(event)
+            self._readable.set()
+
+    async def get(self) -> Tuple[Service, Any] or None:
+        """Next event, None when pipeline finished and every event was read"""
+        while not self._events:
+            if self._finished:
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+        self._writable.set()
+        return self._events.popleft()
+
+    def finish(self) -> None:
+        self._finished = True
+        self._readable.set()
+
+    def close(self) -> None:
+        """Consumer is gone, events are dropped and nobody waits for it"""
+        self._closed = True
+        self._events.clear()
+        self._writable.set()
+
+
 class PipelineStatus(Enum):
     PENDING = "pending"
     PROCESSING = "processing"
@@ -30,13 +93,18 @@ class PipelineStatus(Enum):
 
 
 class Pipeline:
+    __slots__ = ("name", "_config", "_config_view", "_config_path", "_config_source", "_id", "_deadline", "_executor", "_limiter",
+                 "_middleware", "_services", "_depends_on", "_accessors", "_streams", "_restored")
+
     @classmethod
     async def create(cls,
                      name: str,
                      *,
                      config: Dict or str = None,
-                     middleware: List[MiddlewareABC] or MiddlewareABC = None) -> "Pipeline":
-        self = cls(name, config=config, middleware=middleware)
+                     middleware: List[MiddlewareABC] or MiddlewareABC = None,
+                     executor: "aioflow.distributed.RemoteExecutor" = None,
+                     limiter: PriorityLimiter = None) -> "Pipeline":
+        self = cls(name, config=config, middleware=middleware, executor=executor, limiter=limiter)
         await self._call_middleware("pipeline_create", self)
         return self
 
@@ -44,50 +112,118 @@ class Pipeline:
                  name: str,
                  *,
                  config: Dict or str = None,
-                 middleware: List[MiddlewareABC] or MiddlewareABC = None):
+                 middleware: List[MiddlewareABC] or MiddlewareABC = None,
+                 executor: "aioflow.distributed.RemoteExecutor" = None,
+                 limiter: PriorityLimiter = None):
         """
 
         :param name: name of pipeline
         :param config: path or config object
         :param middleware: list of middleware
+        :param executor: run payloads on workers, see aioflow.distributed
+        :param limiter: limit of running services shared with other pipelines,
+            `__concurrency` config key creates one for this pipeline only
         """
         self.name = name
         self.config = config
         self._id = None
+        self._deadline = None
+        self._executor = executor
+        self._limiter = limiter
         if isinstance(middleware, MiddlewareABC):
             middleware = [middleware]
         self._middleware = middleware or []
-        self._services = {}
-        self._depends_on = {}
+        # runtime state, indexed by service._index
+        self._services = []
+        self._depends_on = []
+        self._accessors = []
+        self._streams = []
+        # indexes of services done by a previous run, see restore()
+        self._restored = set()
 
     @property
     def id(self) -> str or int:
         if self._id is None:
+            from uuid import uuid4
+
             self._id = str(uuid4())
         return self._id
 
     @property
-    def config(self) -> Dict:
-        return self._config
+    def config(self) -> Mapping:
+        """
+        Read only view of config, config loaded from path is shared with other pipelines,
+        use update_config to change it for this pipeline only
+        """
+        return self._config_view
 
     @config.setter
     def config(self, value: Dict or None):
         """
         Set config file
+
+        Config loaded from path is shared with other pipelines
+        until update_config copies it.
         :param value:
         :return:
         """
+        self._config_path = None
+        self._config_source = None
         if value is None:
             self._config = {}
         elif isinstance(value, Dict):
             self._config = value
         elif isinstance(value, str):
-            self._config = load_config(value)
+            self._config = self._config_source = load_config(value, copy=False)
+            self._config_path = value
         else:
             raise AioFlowRuntimeError("Bad value for config")
+        self._config_view = MappingProxyType(self._config)
 
     def update_config(self, dct: Dict) -> None:
-        merge_dict(self._config, dct)
+        """
+        Merge dct into config of this pipeline
+
+        Changed sections are copied, never changed in place, so services
+        registered before keep the config they were created with.
+        """
+        config = dict(self._config)
+        for key, value in dct.items():
+            section = config.get(key)
+            if isinstance(section, Mapping) and isinstance(value, Mapping):
+                section = thaw(section)
+                merge_dict(section, value)
+                config[key] = section
+            else:
+                config[key] = thaw(value)
+        self._config = config
+        self._config_view = MappingProxyType(config)
+
+    def reload_config(self) -> bool:
+        """
+        Reload config from path if file was changed
+
+        Changes made by update_config are dropped on reload,
+        services registered before reload keep their config.
+        :return: True if config was changed
+        """
+        if self._config_path is None:
+            return False
+        config = load_config(self._config_path, copy=False)
+        if config is self._config_source:
+            return False
+        self._config = self._config_source = config
+        self._config_view = MappingProxyType(self._config)
+        return True
+
+    @property
+    def remaining(self) -> float or None:
+        """
+        Seconds left until the deadline of running pipeline, None if there is no deadline
+        """
+        if self._deadline is None:
+            return None
+        return max(self._deadline - asyncio.get_event_loop().time(), 0)
 
     async def _call_middleware(self, func: str, *args, **kwargs) -> None:
         kwargs.update(self.config.get(f"__{func}_kwargs", {}))
@@ -104,11 +240,11 @@ class Pipeline:
         """
         return await self._call_middleware("pipeline_message", self, **kwargs)
 
-    async def register(self, service_cls: Type[Service], *, depends_on: Dict = None) -> "Pipeline":
+    async def register(self, service_cls: Type[Service] or "Pipeline", *, depends_on: Dict = None) -> "Pipeline":
         """
         Register new service in pipeline
 
-        :param service_cls: cls of service
+        :param service_cls: cls of service, or sub-pipeline, see _register_pipeline
         :param depends_on: dependence from another servic
         Ex.:
         depends_on = {
@@ -124,14 +260,57 @@ class Pipeline:
 
         :return: None
         """
+        if isinstance(service_cls, Pipeline):
+            await self._register_pipeline(service_cls, depends_on)
+            return self
+
         service = service_cls(self)
         await self._call_middleware("service_create", service)
         self._register_service(service, depends_on)
         return self
 
+    async def _register_pipeline(self, pipeline: "Pipeline", depends_on: Dict = None) -> None:
+        """
+        Flatten services of sub-pipeline into this pipeline
+
+        Services keep their config, dependencies and kwargs names from the sub-pipeline,
+        get names prefixed by its name ("sub.parse") and are scheduled with other services,
+        each one as soon as its own dependencies are done. `depends_on` is given to services
+        without dependencies in sub-pipeline, other services may depend on inner services by class.
+        Sub-pipeline is left empty, service_create is called by middleware of this pipeline,
+        so sub-pipeline must be created without middleware, its records would be left orphaned.
+        """
+        if pipeline._middleware:
+            raise AioFlowRuntimeError(f"Sub-pipeline {pipeline.name} must be created without middleware")
+
+        roots_depends_on = self._transform_depends_on(depends_on)
+        roots_accessors = self._compile_accessors(roots_depends_on)
+        services = zip(pipeline._services, pipeline._depends_on, pipeline._accessors)
+        pipeline._services, pipeline._depends_on, pipeline._accessors = [], [], []
+
+        for service, service_depends_on, accessors in services:
+            service._scope = pipeline.name if service._scope is None else f"{pipeline.name}.{service._scope}"
+            # config stays the one of sub-pipeline, it was read in Service.__init__
+            service._pipeline = self
+            if not service_depends_on:
+                service_depends_on, accessors = dict(roots_depends_on), roots_accessors
+            service._index = len(self._services)
+            self._services.append(service)
+            self._depends_on.append(service_depends_on)
+            self._accessors.append(accessors)
+            await self._call_middleware("service_create", service)
+
     def _register_service(self, service: Service, depends_on: Dict = None) -> None:
         logger.debug(f"Try register {service.name}")
+        transformed_depends_on = self._transform_depends_on(depends_on)
+        logger.debug(f"Service {service.name} needs result {depends_on}")
+        accessors = self._compile_accessors(transformed_depends_on)
+        service._index = len(self._services)
+        self._services.append(service)
+        self._depends_on.append(transformed_depends_on)
+        self._accessors.append(accessors)
 
+    def _transform_depends_on(self, depends_on: Dict or None) -> Dict[Service, List[str]]:
         # transform
         # {service_cls: [str, ...]} into {service: [str, ...]}
         # {service_cls: str} into {service: [str]}
@@ -152,100 +331,567 @@ class Pipeline:
                         break
                 else:
                     raise AioFlowRuntimeError(f"Service {srv_cls} not registered")
+        return transformed_depends_on
 
-        logger.debug(f"Service {service.name} needs result {depends_on}")
-        self._services[service.id] = service
-        self._depends_on[service.id] = transformed_depends_on
+    @staticmethod
+    def _compile_accessors(depends_on: Dict) -> List:
+        """
+        Compile {service: ["a.b", ...]} into [(service, [("name.a.b", ("a", "b")), ...]), ...]
+
+        Kwarg names and key paths are built once, at registration time.
+        """
+        accessors = []
+        for srv, keys in depends_on.items():
+            paths = []
+            for key in keys:
+                if not isinstance(key, str) or not all(key.split(".")):
+                    raise AioFlowRuntimeError(f"Bad key {key!r} for {srv.name} in depends_on")
+                paths.append((f"{srv.name}.{key}", tuple(key.split("."))))
+            accessors.append((srv, paths))
+        return accessors
 
     @property
     def services(self) -> Iterable[Service]:
-        return self._services.values()
+        return self._services
 
-    def ready_services(self) -> Iterator[List]:
+    def _waves(self) -> Iterator[List[int]]:
         """
-        Generator for getting services for running
-
-        :yield: List of service
+        Generator of service indexes which dependencies are done by previous waves
         """
-        dependencies = {}
-        for service_id in self._depends_on:
-            dependencies[service_id] = {service.id for service in self._depends_on[service_id]}
+        dependencies = [{service._index for service in depends_on} for depends_on in self._depends_on]
 
-        service_number = count(start=1)
         already_done = set()
         while True:
-            scheduled = set()
-            scheduled_tasks = []
-            for service_id in self._depends_on:
-                if service_id not in already_done and dependencies[service_id] <= already_done:
-                    scheduled.add(service_id)
+            scheduled = [
+                service_index
+                for service_index, service_dependencies in enumerate(dependencies)
+                if service_index not in already_done and service_dependencies <= already_done
+            ]
+            if not scheduled:
+                break
 
-                    task = self.service_wrapper(service_id, next(service_number))
-                    scheduled_tasks.append(task)
+            yield scheduled
+            already_done.update(scheduled)
 
-            if not scheduled_tasks:
-                break
+    def ready_services(self) -> Iterator[List]:
+        """
+        Generator for getting services for running
 
-            yield scheduled_tasks
-            already_done |= scheduled
+        :yield: List of service
+        """
+        service_number = count(start=1)
+        for wave in self._waves():
+            yield [self.service_wrapper(service_index, next(service_number)) for service_index in wave]
 
     def build_service_kwargs(self, service: Service, service_number: int) -> dict:
         logger.debug(f"Building service [{service.name}] kwargs")
         kwargs = {"__service_number": service_number}
-        kwargs.update(service.config.get("__kwargs", {}))  # maybe service.__init__ with kwargs?
-
-        for srv in self._depends_on[service.id]:
-            keys = self._depends_on[service.id][srv]
-            for key in keys:
-                res = srv.result
+        kwargs.update(thaw(service.config.get("__kwargs", {})))  # maybe service.__init__ with kwargs?
 
-                try:
-                    for k in key.split("."):
-                        res = res[k]
-                except KeyError:
-                    logger.error(f"Key {key} not found in {srv.name}")
-                    raise AioFlowKeyError(f"{key} not found in result of {srv.name}")
-                kwargs[f"{srv.name}.{key}"] = res
+        for srv, paths in self._accessors[service._index]:
+            self._extract(kwargs, srv, srv.result, paths)
 
         return kwargs
 
-    async def service_wrapper(self, service_id: int, service_number: int) -> Any:
-        service = self._services[service_id]
+    @staticmethod
+    def _extract(kwargs: Dict, srv: Service, result: Any, paths: List) -> None:
+        for name, path in paths:
+            res = result
+            try:
+                for k in path:
+                    res = res[k]
+            except KeyError:
+                key = ".".join(path)
+                logger.error(f"Key {key} not found in {srv.name}")
+                raise AioFlowKeyError(f"{key} not found in result of {srv.name}")
+            kwargs[name] = res
+
+    async def service_wrapper(self, service_index: int, service_number: int) -> Any:
+        service = self._services[service_index]
+        if service_index in self._restored:
+            self._restored.discard(service_index)
+            # middleware see restored service like any other one
+            await self._call_middleware("service_start", service)
+            await self._call_middleware("service_done", service)
+            await self._emit(service, service.result)
+            return service.result
+
+        timeout = service.timeout
+        remaining = self.remaining
+        if remaining is not None:
+            if not remaining:
+                return await self._skip_service(service, AioFlowDeadlineExceeded(f"Deadline of {self.name} exceeded"))
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
         kwargs = self.build_service_kwargs(service, service_number)
 
-        logger.debug(f"Start [{service.name}] payload with {kwargs}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Start [{service.name}] payload with {kwargs}")
 
         service.status = ServiceStatus.PROCESSING
         service.number = kwargs.pop("__service_number", None)
+        service.kwargs = kwargs
         await self._call_middleware("service_start", service)
         try:
-            result = await asyncio.wait_for(service(**kwargs), timeout=service.timeout)
+            result = await asyncio.wait_for(self._execute(service, self._invoke(service, kwargs)), timeout=timeout)
         except asyncio.TimeoutError as exp:
             logger.error(f"Timeout [{service.name}]")
             service.status = ServiceStatus.FAILED
             await self._call_middleware("service_failed", service, exp)
+            await self._emit(service, exp)
             if not service.allow_failure:
                 raise
+        except asyncio.CancelledError:
+            logger.error(f"Cancelled [{service.name}]")
+            service.status = ServiceStatus.FAILED
+            exp = AioFlowCancelled(f"{service.name} cancelled")
+            await self._call_middleware("service_failed", service, exp)
+            await self._emit(service, exp)
+            raise
         except Exception as exp:
             logger.exception(f"Failed [{service.name}]")
             service.status = ServiceStatus.FAILED
             await self._call_middleware("service_failed", service, exp)
+            await self._emit(service, exp)
             if not service.allow_failure:
                 raise
         else:
-            logger.debug(f"Success [{service.name}] with {result}")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"Success [{service.name}] with {result}")
             service.result = result
             await self._call_middleware("service_done", service)
+            await self._emit(service, result)
             return result
 
-    async def run(self) -> None:
+    async def _skip_service(self, service: Service, exp: Exception) -> None:
+        logger.error(f"Skip [{service.name}]: {exp}")
+        service.status = ServiceStatus.FAILED
+        await self._call_middleware("service_failed", service, exp)
+        await self._emit(service, exp)
+        if not service.allow_failure:
+            raise exp
+
+    async def _emit(self, service: Service, value: Any) -> None:
+        # waits while a consumer of as_completed() lags `buffer` events behind
+        for stream in self._streams:
+            await stream.put((service, value))
+
+    def _invoke(self, service: Service, kwargs: Dict) -> Callable[[], Awaitable]:
+        if self._executor is not None:
+            return lambda: self._executor.submit(service, kwargs)
+        return lambda: service(**kwargs)
+
+    async def _execute(self, service: Service, invoke: Callable[[], Awaitable]) -> Any:
+        """
+        Await invoke() with retries, every failed attempt is reported to service_retry
+        """
+        if self._executor is None:
+            await lifecycle.setup(type(service))
+
+        policy = service.retry
+        attempt_timeout = policy.attempt_timeout if policy else None
+        attempt = 1
+        while True:
+            service.attempt = attempt
+            try:
+                return await self._attempt(service, invoke, attempt_timeout)
+            except Exception as exp:
+                if policy is None or not policy.should_retry(exp, attempt):
+                    raise
+                delay = policy.delay(attempt)
+                logger.warning(f"Retry [{service.name}] after {exp!r} in {delay:.3f}s")
+                await self._call_middleware("service_retry", service, exp, attempt=attempt, delay=delay)
+                # nothing is held by the service while it backs off
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _attempt(self, service: Service, invoke: Callable[[], Awaitable], timeout: float or None) -> Any:
+        loop = asyncio.get_event_loop()
+        breaker = service.circuit_breaker
+        allowed = True
+        if breaker is not None:
+            state = breaker.state
+            allowed = breaker.allow(loop.time())
+
+        # everything after allow() may be cancelled by service timeout, the trial it admitted ends anyway
+        try:
+            if breaker is not None and breaker.state is not state:
+                await self._call_middleware("service_circuit_changed", service, state=breaker.state)
+            if not allowed:
+                raise AioFlowCircuitOpen(f"Circuit of {service.name} is {breaker.state.value}")
+
+            if service.rate_limiter is not None:
+                delay = await service.rate_limiter.acquire()
+                if delay:
+                    await self._call_middleware("service_throttled", service, delay=delay)
+
+            try:
+                result = await self._limited_call(service, invoke, timeout)
+            except (Exception, asyncio.CancelledError):
+                # timeout of service is applied around _execute, here it shows up as cancellation
+                if breaker is not None:
+                    state = breaker.state
+                    breaker.failure(loop.time())
+                    if breaker.state is not state:
+                        await self._call_middleware("service_circuit_changed", service, state=breaker.state)
+                raise
+        finally:
+            if breaker is not None and allowed:
+                breaker.end_trial()
+
+        if breaker is not None:
+            state = breaker.state
+            breaker.success()
+            if breaker.state is not state:
+                await self._call_middleware("service_circuit_changed", service, state=breaker.state)
+        return result
+
+    async def _limited_call(self, service: Service, invoke: Callable[[], Awaitable], timeout: float or None) -> Any:
+        """
+        Call with adaptive permit of service and slot of shared limiter
+
+        The permit is taken first, so a service throttled by its own adaptive limit
+        does not hold a shared slot other services are ready to use.
+        """
+        adaptive = service.adaptive_limiter
+        if adaptive is not None:
+            await adaptive.acquire()
+        if self._limiter is not None:
+            try:
+                await self._limiter.acquire(service.priority)
+            except BaseException:
+                if adaptive is not None:
+                    adaptive.abandon()
+                raise
+
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        failed = True
+        try:
+            result = await self._call(service, invoke, timeout)
+            failed = False
+            return result
+        finally:
+            if self._limiter is not None:
+                self._limiter.release()
+            if adaptive is not None:
+                adaptive.release(loop.time() - start, failed)
+
+    async def _call(self, service: Service, invoke: Callable[[], Awaitable], timeout: float or None) -> Any:
+        def call():
+            return profile_call(service, invoke)
+
+        if service.hedge is not None:
+            return await asyncio.wait_for(hedged_call(service.name, service.hedge, call), timeout=timeout)
+
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        result = await asyncio.wait_for(call(), timeout=timeout)
+        latency(service.name).observe(loop.time() - start)
+        return result
+
+    async def _batch_service_wrapper(self, service_index: int, service_number: int, items: List[BatchItem]) -> None:
+        service = self._services[service_index]
+        name = service.name
+        timeout = service.timeout
+        remaining = self.remaining
+        if remaining is not None:
+            timeout = remaining if timeout is None else min(timeout, remaining)
+
+        batch, batch_kwargs = [], []
+        for item in items:
+            try:
+                kwargs = self._build_item_kwargs(service, item)
+            except (AioFlowBatchSkipped, AioFlowKeyError) as exp:
+                item.errors[name] = exp
+            else:
+                batch.append(item)
+                batch_kwargs.append(kwargs)
+
+        service.status = ServiceStatus.PROCESSING
+        service.number = service_number
+        await self._call_middleware("service_start", service)
+
+        payload_batch = getattr(service, "payload_batch", None)
+        try:
+            if remaining is not None and not remaining:
+                raise AioFlowDeadlineExceeded(f"Deadline of {self.name} exceeded")
+            if not batch:
+                results = []
+            elif payload_batch is not None:
+                results = await asyncio.wait_for(
+                    self._execute(service, lambda: payload_batch(batch_kwargs)),
+                    timeout=timeout,
+                )
+                if len(results) != len(batch):
+                    raise AioFlowRuntimeError(f"{name}.payload_batch returned {len(results)} results for {len(batch)}")
+            else:
+                results = await asyncio.gather(*(
+                    asyncio.wait_for(self._execute(service, self._invoke(service, kwargs)), timeout=timeout)
+                    for kwargs in batch_kwargs
+                ), return_exceptions=True)
+        except Exception as exp:
+            logger.exception(f"Failed [{name}] batch")
+            results = [exp] * len(batch)
+
+        for item, result in zip(batch, results):
+            if isinstance(result, BaseException):
+                item.errors[name] = result
+            else:
+                item.results[name] = result
+
+        errors = [item.errors[name] for item in items if name in item.errors]
+        if errors and len(errors) == len(items):
+            service.status = ServiceStatus.FAILED
+            await self._call_middleware("service_failed", service, errors[0])
+        else:
+            service.result = [item.results.get(name) for item in items]
+            await self._call_middleware("service_done", service)
+
+    def _build_item_kwargs(self, service: Service, item: BatchItem) -> Dict:
+        kwargs = thaw(service.config.get("__kwargs", {}))
+        kwargs.update(item.input)
+        for srv, paths in self._accessors[service._index]:
+            if srv.name in item.errors:
+                raise AioFlowBatchSkipped(f"{srv.name} failed")
+            self._extract(kwargs, srv, item.results[srv.name], paths)
+        return kwargs
+
+    async def run_batch(self, inputs: Iterable[Dict], *, deadline: float = None) -> List[BatchItem]:
+        """
+        Run pipeline over many inputs, every service is scheduled once for the whole batch
+
+        Service with `payload_batch(self, batch: List[Dict]) -> List` is called once with kwargs of
+        every item and returns results in the same order (Exception instance fails one item),
+        other services are called per item. Input of item is added to kwargs of every service.
+        Failure of service for one item only skips its dependents for the same item.
+
+        :param inputs: list of kwargs
+        :param deadline: time budget of pipeline in seconds
+        :return: BatchItem per input, in the same order
+        """
+        items = [BatchItem(dict(item)) for item in inputs]
+        self._prepare(deadline)
         await self._call_middleware("pipeline_start", self)
 
-        for services in self.ready_services():
+        service_number = count(start=1)
+        for wave in self._waves():
             try:
-                await asyncio.gather(*services, )
+                await asyncio.gather(*(
+                    self._batch_service_wrapper(service_index, next(service_number), items)
+                    for service_index in wave
+                ))
             except Exception as exp:
                 await self._call_middleware("pipeline_failed", self, exp)
                 raise
 
         await self._call_middleware("pipeline_done", self)
+        return items
+
+    def _prepare(self, deadline: float or None) -> None:
+        self._deadline = None if deadline is None else asyncio.get_event_loop().time() + deadline
+        concurrency = self.config.get("__concurrency")
+        if self._limiter is None and concurrency:
+            self._limiter = PriorityLimiter(concurrency)
+        self._set_priorities()
+        for service in self._services:
+            service._bind_limits()
+
+    def _set_priorities(self) -> None:
+        """
+        priority = pipeline `__priority` + service `priority`
+
+        With `__priority_auto: true` services without own priority get the
+        length of the longest path (by mean observed duration) from them to the end
+        of pipeline, so the critical path is started first.
+        """
+        pipeline_priority = self.config.get("__priority", 0)
+        critical_path = self._critical_path() if self.config.get("__priority_auto") else None
+        for service in self._services:
+            priority = service.config.get("priority")
+            if priority is None:
+                priority = critical_path[service._index] if critical_path else 0
+            service.priority = pipeline_priority + priority
+
+    def _critical_path(self) -> List[float]:
+        durations = [latency(service.name).mean for service in self._services]
+        known = [duration for duration in durations if duration is not None]
+        default = sum(known) / len(known) if known else 1
+
+        # dependencies are registered before dependents, so indexes are topologically sorted
+        path = [0] * len(self._services)
+        for service_index in reversed(range(len(self._services))):
+            duration = durations[service_index]
+            path[service_index] += default if duration is None else duration
+            for srv in self._depends_on[service_index]:
+                path[srv._index] = max(path[srv._index], path[service_index])
+        return path
+
+    def _fuse_chains(self, dependents: List[List[int]]) -> Dict[int, List[int]]:
+        """
+        Linear chains of services, where every next one depends on the previous only
+        and is its only dependent, keyed by the first service
+
+        Services with `fuse: false` in config are never fused.
+        """
+        def fusible(service_index):
+            return self._services[service_index].config.get("fuse", True)
+
+        chains = {}
+        fused = set()
+        for head in range(len(self._services)):
+            if head in fused or not fusible(head):
+                continue
+            chain = [head]
+            while len(dependents[chain[-1]]) == 1:
+                service_index = dependents[chain[-1]][0]
+                if len(self._depends_on[service_index]) != 1 or not fusible(service_index):
+                    break
+                chain.append(service_index)
+            if len(chain) > 1:
+                chains[head] = chain
+                fused.update(chain)
+        return chains
+
+    async def _run_chain(self, chain: List[int], service_number: Iterator[int]) -> None:
+        """Run fused services one by one in a single task, see _fuse_chains"""
+        for service_index in chain:
+            await self.service_wrapper(service_index, next(service_number))
+
+    async def _schedule(self) -> None:
+        """
+        Start every service as soon as its own dependencies are done,
+        ready services are started in priority order
+        """
+        loop = asyncio.get_event_loop()
+        waiting = [len(depends_on) for depends_on in self._depends_on]
+        dependents = [[] for _ in self._services]
+        for service_index, depends_on in enumerate(self._depends_on):
+            for srv in depends_on:
+                dependents[srv._index].append(service_index)
+
+        service_number = count(start=1)
+        running = {}
+        chains = self._fuse_chains(dependents) if self.config.get("__fuse") else {}
+
+        def start(indexes):
+            for service_index in sorted(indexes, key=lambda i: -self._services[i].priority):
+                chain = chains.get(service_index)
+                if chain is None:
+                    task = loop.create_task(self.service_wrapper(service_index, next(service_number)))
+                else:
+                    task = loop.create_task(self._run_chain(chain, service_number))
+                    service_index = chain[-1]
+                running[task] = service_index
+
+        start(service_index for service_index, count_ in enumerate(waiting) if not count_)
+        try:
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                ready = []
+                for task in done:
+                    service_index = running.pop(task)
+                    # like gather: the first error is raised, running services are not cancelled
+                    task.result()
+                    for dependent in dependents[service_index]:
+                        waiting[dependent] -= 1
+                        if not waiting[dependent]:
+                            ready.append(dependent)
+                start(ready)
+        except asyncio.CancelledError:
+            # running services report their failure before the pipeline does
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.wait(running)
+            for task in running:
+                _retrieve_exception(task)
+            raise
+        except BaseException:
+            for task in running:
+                task.add_done_callback(_retrieve_exception)
+            raise
+
+    async def run(self, *, deadline: float = None) -> None:
+        """
+        Run registered services
+
+        :param deadline: time budget of pipeline in seconds, limits timeouts of services,
+            services not started in time are failed with AioFlowDeadlineExceeded
+        """
+        self._prepare(deadline)
+        await self._call_middleware("pipeline_start", self)
+
+        try:
+            await self._schedule()
+        except asyncio.CancelledError:
+            await self._call_middleware("pipeline_failed", self, AioFlowCancelled(f"{self.name} cancelled"))
+            raise
+        except Exception as exp:
+            await self._call_middleware("pipeline_failed", self, exp)
+            raise
+
+        await self._call_middleware("pipeline_done", self)
+
+    async def as_completed(self, *, deadline: float = None, buffer: int = 100) -> AsyncIterator[Tuple[Service, Any]]:
+        """
+        Run registered services and yield (service, result) as soon as every service finishes
+
+        async for service, result in pipeline.as_completed():
+            ...
+
+        Failed services are yielded with their exception as result and FAILED status,
+        the first failure not allowed is raised after its event, like run() does.
+        Pipeline keeps running in background when iteration stops early.
+
+        :param deadline: time budget of pipeline in seconds, see run()
+        :param buffer: events kept for slow consumer, finished services wait while it is full
+        """
+        stream = _EventStream(buffer)
+        self._streams.append(stream)
+        run = asyncio.ensure_future(self.run(deadline=deadline))
+        run.add_done_callback(lambda _: stream.finish())
+        try:
+            while True:
+                event = await stream.get()
+                if event is None:
+                    break
+                yield event
+            await run
+        finally:
+            stream.close()
+            self._streams.remove(stream)
+            if not run.done():
+                run.add_done_callback(_retrieve_exception)
+
+    async def flush(self) -> None:
+        """Write out events buffered by middleware"""
+        for m in self._middleware:
+            await m.flush()
+
+    def snapshot(self) -> Dict:
+        """
+        Results of done services, enough to resume the run by restore()
+
+        Results are kept as they are, snapshot is as picklable as they are.
+        """
+        return dict(
+            name=self.name,
+            id=self.id,
+            results={
+                service.name: service.result
+                for service in self._services
+                if service.status == ServiceStatus.DONE
+            },
+        )
+
+    def restore(self, snapshot: Dict) -> None:
+        """
+        Take results of services done by snapshot of interrupted run,
+        the next run() does not call them again, middleware get service_done for them
+        """
+        results = snapshot["results"]
+        for service in self._services:
+            if service.name in results:
+                service.result = results[service.name]
+                self._restored.add(service._index)
@@ -0,0 +1,201 @@
+import asyncio
+import logging
+import os
+from enum import Enum
+from typing import Any, Awaitable, Callable, Dict, List
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+# seconds between samples of traced memory while tracemalloc is run by someone else
+MEMORY_SAMPLE_INTERVAL = 0.01
+
+
+class ProfileMode(Enum):
+    CPU = "cpu"
+    MEMORY = "memory"
+
+
+class ServiceProfile:
+    """
+    Profile aggregated across all sampled runs of one service (by name)
+    """
+
+    def __init__(self, name: str, mode: ProfileMode):
+        self.name = name
+        self.mode = mode
+        self.calls = 0
+        self.runs = 0
+        self.peak_max = 0
+        self.peak_total = 0
+        self._stats = None
+
+    @property
+    def stats(self):
+        """pstats.Stats merged from every sampled cpu run"""
+        return self._stats
+
+    @property
+    def peak_mean(self) -> float:
+        return self.peak_total / self.runs if self.runs else 0
+
+    def add_cpu(self, profile) -> None:
+        import pstats
+
+        self.runs += 1
+        if self._stats is None:
+            self._stats = pstats.Stats(profile)
+        else:
+            self._stats.add(profile)
+
+    def add_memory(self, peak: int) -> None:
+        self.runs += 1
+        self.peak_total += peak
+        self.peak_max = max(self.peak_max, peak)
+
+    def summary(self) -> Dict:
+        return dict(
+            name=self.name,
+            mode=self.mode.value,
+            calls=self.calls,
+            runs=self.runs,
+            peak_max=self.peak_max,
+            peak_mean=self.peak_mean,
+        )
+
+
+_profiles = {}
+_active = set()
+
+
+def get_profile(name: str) -> ServiceProfile or None:
+    return _profiles.get(name)
+
+
+def profiles() -> Dict[str, ServiceProfile]:
+    return dict(_profiles)
+
+
+def reset_profiles() -> None:
+    _profiles.clear()
+
+
+def _profile_path(service, profile: ServiceProfile, suffix: str) -> str or None:
+    directory = service.config.get("profile_dir")
+    if not directory:
+        return None
+    os.makedirs(directory, exist_ok=True)
+    return os.path.join(directory, f"{service.name}.{os.getpid()}.{suffix}")
+
+
+def _dump_aggregate(service, profile: ServiceProfile) -> None:
+    every = service.config.get("profile_aggregate")
+    if not every or profile.runs % every:
+        return
+
+    if profile.mode is ProfileMode.CPU:
+        path = _profile_path(service, profile, "aggregate.prof")
+        if path:
+            profile.stats.dump_stats(path)
+    else:
+        path = _profile_path(service, profile, "aggregate.json")
+        if path:
+            import json
+
+            with open(path, "w") as stream:
+                json.dump(profile.summary(), stream)
+    logger.info(f"Profile [{service.name}] aggregated over {profile.runs} runs")
+
+
+async def _profile_cpu(service, profile: ServiceProfile, call: Callable[[], Awaitable]) -> Any:
+    import cProfile
+
+    # cProfile follows the thread, not the task: code of other tasks running
+    # while the payload awaits is accounted too
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        return await call()
+    finally:
+        prof.disable()
+        profile.add_cpu(prof)
+        path = _profile_path(service, profile, f"{profile.runs}.prof")
+        if path:
+            prof.dump_stats(path)
+        _dump_aggregate(service, profile)
+
+
+async def _sample_memory(samples: List[int]) -> None:
+    import tracemalloc
+
+    while True:
+        samples.append(tracemalloc.get_traced_memory()[0])
+        await asyncio.sleep(MEMORY_SAMPLE_INTERVAL)
+
+
+async def _profile_memory(service, profile: ServiceProfile, call: Callable[[], Awaitable]) -> Any:
+    import tracemalloc
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    before, peak_before = tracemalloc.get_traced_memory()
+    # peak of tracing started by someone else is not reset: it is theirs
+    # (and reset_peak needs python 3.9), a lower one is sampled instead
+    samples = []
+    sampler = None if started else asyncio.ensure_future(_sample_memory(samples))
+    try:
+        return await call()
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        if sampler is not None:
+            sampler.cancel()
+            if peak <= peak_before:
+                peak = max(samples + [current])
+        path = _profile_path(service, profile, f"{profile.runs + 1}.snapshot")
+        if path:
+            tracemalloc.take_snapshot().dump(path)
+        if started:
+            tracemalloc.stop()
+        profile.add_memory(max(peak - before, 0))
+        _dump_aggregate(service, profile)
+
+
+async def profile_call(service, call: Callable[[], Awaitable]) -> Any:
+    """
+    Await call() under profiler if service config asks for it
+
+    Service config:
+        profile: cpu | memory
+        profile_rate: part of calls to profile, 1.0 by default
+        profile_dir: directory for per run profiles, nothing is written if empty
+        profile_aggregate: write aggregated profile every N sampled runs
+
+    :param service: service instance
+    :param call: function returning payload awaitable
+    :return: payload result
+    """
+    mode = service.config.get("profile")
+    if not mode:
+        return await call()
+
+    mode = ProfileMode(mode)
+    profile = _profiles.get(service.name)
+    if profile is None or profile.mode is not mode:
+        profile = _profiles[service.name] = ServiceProfile(service.name, mode)
+    profile.calls += 1
+
+    import random
+
+    # cProfile and tracemalloc are process wide, so one sampled call at a time
+    if mode in _active or random.random() >= service.config.get("profile_rate", 1.0):
+        return await call()
+
+    _active.add(mode)
+    try:
+        if mode is ProfileMode.CPU:
+            return await _profile_cpu(service, profile, call)
+        return await _profile_memory(service, profile, call)
+    finally:
+        _active.discard(mode)
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Dict, List, Type
+
+from aioflow.middleware.record_middleware import load_recording
+from aioflow.middlewareabc import MiddlewareABC
+from aioflow.pipeline import Pipeline
+from aioflow.service import Service, ServiceStatus
+
+__author__ = "a.lemets"
+
+
+class AioFlowReplayError(RuntimeError):
+    """Recorded failure of service, or kwargs differ from recorded ones"""
+
+
+class ReplayService(Service):
+    """
+    Stand-in of recorded service: sends recorded messages and returns recorded result
+    after recorded duration multiplied by `time_scale`
+    """
+    __slots__ = ()
+
+    record = None
+    time_scale = 1.0
+    check_kwargs = False
+
+    async def payload(self, **kwargs):
+        record = self.record
+        if self.check_kwargs and record["kwargs"] is not None and kwargs != record["kwargs"]:
+            raise AioFlowReplayError(f"Kwargs of {self.name} differ from recorded")
+
+        elapsed = 0
+        for offset, message in record["messages"]:
+            await asyncio.sleep((offset - elapsed) * self.time_scale)
+            elapsed = offset
+            await self.message(**message)
+        await asyncio.sleep(max(0, (record["duration"] or 0) - elapsed) * self.time_scale)
+
+        if record["status"] == ServiceStatus.FAILED.value:
+            raise AioFlowReplayError(record["error"])
+        return record["result"]
+
+
+def replay_classes(recording: Dict, *, time_scale: float = 1.0, check_kwargs: bool = False) -> List[Type[Service]]:
+    # class name is the recorded service name, so configs and kwargs names stay the same
+    return [
+        type(record["name"], (ReplayService,), {
+            "__slots__": (),
+            "record": record,
+            "time_scale": time_scale,
+            "check_kwargs": check_kwargs,
+        })
+        for record in recording["services"]
+    ]
+
+
+async def build_replay(recording: Dict or str,
+                       *,
+                       time_scale: float = 1.0,
+                       check_kwargs: bool = False,
+                       middleware: List[MiddlewareABC] or MiddlewareABC = None) -> Pipeline:
+    """
+    Pipeline of the same shape and config as recorded one, with ReplayService instead of every service
+
+    :param recording: recording or path to it, see RecordMiddleware
+    :param time_scale: multiplier of recorded durations, 0 runs without waiting
+    :param check_kwargs: fail services which get kwargs different from recorded ones
+    """
+    if isinstance(recording, str):
+        recording = load_recording(recording)
+
+    # service sections are recorded merged with `__global`
+    config = {key: value for key, value in recording["config"].items() if key.startswith("__") and key != "__global"}
+    config.update((record["name"], record["config"]) for record in recording["services"])
+
+    classes = replay_classes(recording, time_scale=time_scale, check_kwargs=check_kwargs)
+    pipeline = await Pipeline.create(recording["name"], config=config, middleware=middleware)
+    for service_cls, record in zip(classes, recording["services"]):
+        depends_on = {classes[index]: keys for index, keys in record["depends_on"].items()}
+        await pipeline.register(service_cls, depends_on=depends_on)
+    return pipeline
+
+
+async def replay(recording: Dict or str, **kwargs) -> Pipeline:
+    """Build replay pipeline and run it, see build_replay"""
+    pipeline = await build_replay(recording, **kwargs)
+    await pipeline.run()
+    return pipeline
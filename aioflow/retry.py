@@ -0,0 +1,87 @@
+import builtins
+import importlib
+from typing import Mapping, Tuple, Type
+
+__author__ = "a.lemets"
+
+
+def resolve_exception(value: str or Type[BaseException]) -> Type[BaseException]:
+    """
+    Resolve exception class from config value
+
+    "ConnectionError" -> builtins.ConnectionError
+    "asyncio.TimeoutError" -> asyncio.TimeoutError
+    """
+    if isinstance(value, type) and issubclass(value, BaseException):
+        return value
+    if not isinstance(value, str):
+        raise ValueError(f"Bad exception type {value!r}")
+
+    module_name, _, name = value.rpartition(".")
+    module = importlib.import_module(module_name) if module_name else builtins
+    exc_cls = getattr(module, name, None)
+    if not isinstance(exc_cls, type) or not issubclass(exc_cls, BaseException):
+        raise ValueError(f"Bad exception type {value!r}")
+    return exc_cls
+
+
+class RetryPolicy:
+    """
+    Retry policy from service config:
+        retries: number of retries after the first attempt
+        backoff: delay before the first retry, doubled for every next one
+        backoff_max: delay limit
+        jitter: part of delay to randomize, 0..1
+        retry_on: list of exceptions to retry, every Exception by default
+        attempt_timeout: timeout of one attempt, `timeout` limits all attempts
+    """
+    __slots__ = ("retries", "backoff", "backoff_max", "jitter", "retry_on", "attempt_timeout")
+
+    def __init__(self,
+                 retries: int,
+                 *,
+                 backoff: float = 0.1,
+                 backoff_max: float = 10,
+                 jitter: float = 0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                 attempt_timeout: float = None):
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.jitter = jitter
+        self.retry_on = retry_on
+        self.attempt_timeout = attempt_timeout
+
+    @classmethod
+    def from_config(cls, config: Mapping) -> "RetryPolicy" or None:
+        retries = config.get("retries", 0)
+        attempt_timeout = config.get("attempt_timeout")
+        if not retries and attempt_timeout is None:
+            return None
+
+        retry_on = config.get("retry_on")
+        if retry_on is not None:
+            if isinstance(retry_on, (str, type)):
+                retry_on = [retry_on]
+            retry_on = tuple(resolve_exception(value) for value in retry_on)
+
+        return cls(
+            retries,
+            backoff=config.get("backoff", 0.1),
+            backoff_max=config.get("backoff_max", 10),
+            jitter=config.get("jitter", 0),
+            retry_on=retry_on or (Exception,),
+            attempt_timeout=attempt_timeout,
+        )
+
+    def should_retry(self, exception: BaseException, attempt: int) -> bool:
+        return attempt <= self.retries and isinstance(exception, self.retry_on)
+
+    def delay(self, attempt: int) -> float:
+        """Delay after failed attempt (starting with 1)"""
+        delay = min(self.backoff * 2 ** (attempt - 1), self.backoff_max)
+        if self.jitter:
+            import random
+
+            delay -= delay * self.jitter * random.random()
+        return delay
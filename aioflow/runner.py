@@ -0,0 +1,130 @@
+import asyncio
+import logging
+import os
+import signal
+from typing import Dict, List, Type
+
+from aioflow import lifecycle
+from aioflow.middleware.record_middleware import dump_recording, load_recording
+from aioflow.pipeline import Pipeline
+from aioflow.service import Service
+
+__author__ = "a.lemets"
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+
+class AioFlowShutdown(RuntimeError):
+    """Pipeline was not admitted or was cancelled because runner is shutting down"""
+
+
+def load_snapshot(path: str) -> Dict:
+    """Snapshot written by Runner shutdown, see Pipeline.restore"""
+    return load_recording(path)
+
+
+class Runner:
+    """
+    Runs pipelines of a process and stops them gracefully
+
+    runner = Runner(grace=30, directory="snapshots")
+    await runner.start(GetSha1, SaveReport)
+    runner.stop_on_signals()
+    await runner.run(pipeline)
+
+    On shutdown new pipelines are not admitted, running ones get `grace` seconds
+    to finish. The rest are cancelled: middleware get service_failed and pipeline_failed
+    with AioFlowCancelled, results of their done services are kept as snapshots
+    (and written to `{directory}/{pipeline name}-{pipeline id}.snapshot`) to resume
+    them by Pipeline.restore. Middleware of every pipeline are flushed
+    and set up services are torn down at the end.
+    """
+
+    def __init__(self, *, grace: float = 30, directory: str = None):
+        """
+
+        :param grace: seconds running pipelines have to finish on shutdown
+        :param directory: where snapshots of cancelled pipelines are written, not written by default
+        """
+        self.grace = grace
+        self.directory = directory
+        self.stopping = False
+        self._pipelines = {}
+        self._cancelled = set()
+        self._shutdown = None
+
+    @property
+    def running(self) -> int:
+        return len(self._pipelines)
+
+    async def start(self, *service_classes: Type[Service]) -> None:
+        """Set up services before accepting pipelines, see lifecycle.warm_up"""
+        await lifecycle.warm_up(*service_classes)
+
+    async def run(self, pipeline: Pipeline, *, deadline: float = None) -> None:
+        """Run pipeline unless runner is shutting down, see Pipeline.run"""
+        if self.stopping:
+            raise AioFlowShutdown(f"{pipeline.name} not admitted, runner is shutting down")
+
+        task = asyncio.ensure_future(pipeline.run(deadline=deadline))
+        self._pipelines[task] = pipeline
+        try:
+            await task
+        except asyncio.CancelledError:
+            if task not in self._cancelled:
+                raise
+            raise AioFlowShutdown(f"{pipeline.name} cancelled by shutdown")
+        finally:
+            del self._pipelines[task]
+            self._cancelled.discard(task)
+
+    async def shutdown(self, grace: float = None) -> List[Dict]:
+        """
+        Stop admission, wait for running pipelines and cancel the ones left
+
+        :param grace: overrides grace of runner
+        :return: snapshots of cancelled pipelines
+        """
+        self.stopping = True
+        if self._shutdown is None:
+            self._shutdown = asyncio.ensure_future(self._drain(self.grace if grace is None else grace))
+        return await asyncio.shield(self._shutdown)
+
+    async def _drain(self, grace: float) -> List[Dict]:
+        pipelines = dict(self._pipelines)
+        pending = ()
+        if pipelines:
+            logger.info(f"Shutdown: waiting {grace}s for {len(pipelines)} pipelines")
+            _, pending = await asyncio.wait(pipelines, timeout=grace)
+
+        snapshots = []
+        if pending:
+            logger.warning(f"Shutdown: cancel {len(pending)} pipelines")
+            for task in pending:
+                self._cancelled.add(task)
+                task.cancel()
+            await asyncio.wait(pending)
+            for task in pending:
+                snapshot = pipelines[task].snapshot()
+                snapshots.append(snapshot)
+                if self.directory is not None:
+                    await self._dump(snapshot)
+
+        # middleware shared by pipelines are flushed once
+        middleware = {id(m): m for pipeline in pipelines.values() for m in pipeline._middleware}
+        for m in middleware.values():
+            await m.flush()
+        await lifecycle.shutdown()
+        return snapshots
+
+    async def _dump(self, snapshot: Dict) -> None:
+        path = os.path.join(self.directory, f"{snapshot['name']}-{snapshot['id']}{SNAPSHOT_SUFFIX}")
+        await asyncio.get_event_loop().run_in_executor(None, dump_recording, path, snapshot)
+
+    def stop_on_signals(self, *signals: signal.Signals) -> None:
+        """Start shutdown on SIGTERM and SIGINT, or on given signals"""
+        loop = asyncio.get_event_loop()
+        for sig in signals or (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, lambda: asyncio.ensure_future(self.shutdown()))
@@ -2,19 +2,32 @@ import abc
 import asyncio
 import logging
 from enum import Enum
-from typing import Dict
+from types import MappingProxyType
+from typing import Any, Dict, Mapping, Tuple
 
-from aioflow.helpers import cached_property
-
-try:
-    import ujson as json
-except ImportError:
-    import json
+from aioflow import lifecycle
+from aioflow.concurrency import adaptive_limiter
+from aioflow.hedging import HedgePolicy
+from aioflow.limits import circuit_breaker, rate_limiter
+from aioflow.retry import RetryPolicy
 
 __author__ = "a.lemets"
 
 logger = logging.getLogger(__name__)
 
+# ujson or json, imported by the first json_result
+_json = None
+
+
+def _json_dumps(obj: Any) -> str:
+    global _json
+    if _json is None:
+        try:
+            import ujson as _json
+        except ImportError:
+            import json as _json
+    return _json.dumps(obj)
+
 
 class AioFlowBadStatus(RuntimeError):
     """Service not finished"""
@@ -27,34 +40,74 @@ class ServiceStatus(Enum):
     FAILED = "failed"
 
 
+_EMPTY_CONFIG = MappingProxyType({})
+
+
 class Service:
+    # subclasses declaring `__slots__ = ()` (like service_deco does) stay without __dict__
+    __slots__ = ("_id", "_index", "_scope", "_pipeline", "_config", "number", "attempt", "kwargs",
+                 "allow_failure", "timeout", "priority", "retry", "hedge", "rate_limiter", "circuit_breaker",
+                 "adaptive_limiter",
+                 "status", "_result")
+
     def __init__(self, pipeline: "Pipeline"):
         self._id = None
+        self._index = None  # position in pipeline, set on registration
+        self._scope = None  # name of sub-pipeline, set when it is flattened into parent
         self._pipeline = pipeline
+        self._config = None
         self.number = None
+        self.kwargs = None  # resolved kwargs of the last run
+        self.attempt = 0
 
         self.allow_failure = self.config.get("allow_failure", False)
         self.timeout = self.config.get("timeout", None)
+        self.priority = self.config.get("priority", 0)
+        self.retry = RetryPolicy.from_config(self.config)
+        self.hedge = HedgePolicy.from_config(self.config)
+        # bound by the pipeline running the service, its name is final only then
+        self.rate_limiter = None
+        self.circuit_breaker = None
+        self.adaptive_limiter = None
 
         # service instance
         self.status = ServiceStatus.PENDING
         self._result = None
-        self._loop = asyncio.get_event_loop()
+
+    def _bind_limits(self) -> None:
+        # process wide state (limits, stats, hedging, profiles, windows) is keyed by name
+        self.rate_limiter = rate_limiter(self.name, self.config)
+        self.circuit_breaker = circuit_breaker(self.name, self.config)
+        self.adaptive_limiter = adaptive_limiter(self.name, self.config)
 
     async def message(self, *args, **kwargs):
         logger.debug(f"Send message [{self.name}]")
         return await self._pipeline._call_middleware("service_message", self, **kwargs)
 
-    @cached_property
-    def config(self):
-        _config = {}
-        _config.update(self._pipeline.config.get("__global", {}))
-        _config.update(self._pipeline.config.get(self.name, {}))
-        return _config
+    @property
+    def config(self) -> Mapping:
+        """
+        Read only view of `__global` config section updated by service section
+
+        Sections are shared by reference if there is nothing to merge.
+        """
+        if self._config is None:
+            global_config = self._pipeline.config.get("__global")
+            service_config = self._pipeline.config.get(self.name)
+            if global_config and service_config:
+                self._config = MappingProxyType({**global_config, **service_config})
+            elif global_config or service_config:
+                self._config = MappingProxyType(global_config or service_config)
+            else:
+                self._config = _EMPTY_CONFIG
+        return self._config
 
     @property
     def name(self) -> str:
-        return type(self).__name__.lower()
+        """Lowercase class name, prefixed by names of sub-pipelines service came from"""
+        if self._scope is None:
+            return type(self).__name__.lower()
+        return f"{self._scope}.{type(self).__name__.lower()}"
 
     def __repr__(self):
         return self.name
@@ -67,9 +120,30 @@ class Service:
     def is_finished(self) -> bool:
         return self.status is ServiceStatus.DONE or self.status is ServiceStatus.FAILED
 
+    @classmethod
+    async def setup(cls) -> Any:
+        """
+        Called once per process before the first run of service class,
+        returned value (connection pool, session, model ...) is shared as `resources`
+        """
+        return None
+
+    @classmethod
+    async def teardown(cls, resources: Any) -> None:
+        """Called on shutdown with resources returned by setup()"""
+
+    @property
+    def resources(self) -> Any:
+        return lifecycle.resources(type(self))
+
+    @property
+    def remaining(self) -> float or None:
+        """Seconds left until pipeline deadline, None if there is no deadline"""
+        return self._pipeline.remaining
+
     @property
     def loop(self):
-        return self._loop
+        return asyncio.get_event_loop()
 
     @property
     def result(self):
@@ -80,13 +154,21 @@ class Service:
 
     @result.setter
     def result(self, value):
-        logger.debug(f"Set service [{self.name}] result {value}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Set service [{self.name}] result {value}")
         self.status = ServiceStatus.DONE
         self._result = value
 
     @property
     def json_result(self):
-        return json.dumps(self.result)
+        return _json_dumps(self.result)
+
+    @property
+    def encoded_result(self) -> Tuple[str, bytes]:
+        """(format, data) of result encoded by codec from config, see aioflow.codecs.decode"""
+        from aioflow.codecs import ResultCodec
+
+        return ResultCodec.from_config(self.config).encode(self.result)
 
     @abc.abstractmethod
     async def payload(self, **kwargs) -> Dict or None:
@@ -102,7 +184,9 @@ def service_deco(_payload=None, *, bind=False, payload_name="payload", base_serv
         if not bind:
             payload = staticmethod(func)
 
+        # bound payload gets `self`, but cannot set attributes not declared in __slots__
         attrs = {
+            '__slots__': (),
             payload_name: payload,
             '__doc__': func.__doc__,
             '__module__': func.__module__,
@@ -0,0 +1,50 @@
+from collections import deque
+from typing import Dict
+
+__author__ = "a.lemets"
+
+
+class LatencyTracker:
+    """
+    Durations of the last `window` successful calls of one service (by name)
+    """
+    __slots__ = ("_samples",)
+
+    def __init__(self, window: int = 100):
+        self._samples = deque(maxlen=window)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def observe(self, duration: float) -> None:
+        self._samples.append(duration)
+
+    @property
+    def mean(self) -> float or None:
+        if not self._samples:
+            return None
+        return sum(self._samples) / len(self._samples)
+
+    def percentile(self, percent: float) -> float or None:
+        if not self._samples:
+            return None
+        samples = sorted(self._samples)
+        return samples[min(int(len(samples) * percent / 100), len(samples) - 1)]
+
+
+_latencies = {}
+
+
+def latency(name: str) -> LatencyTracker:
+    tracker = _latencies.get(name)
+    if tracker is None:
+        tracker = _latencies[name] = LatencyTracker()
+    return tracker
+
+
+def latencies() -> Dict[str, LatencyTracker]:
+    return dict(_latencies)
+
+
+def reset_latencies() -> None:
+    _latencies.clear()
@@ -0,0 +1,303 @@
+import asyncio
+import operator
+from collections import deque
+from math import floor
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Mapping, Tuple
+
+from aioflow.service import Service
+
+__author__ = "a.lemets"
+
+
+class Aggregate:
+    """
+    Incremental aggregate of window values
+
+    :param initial: state of empty window
+    :param add: (state, value) -> state
+    :param merge: (state, state) -> state, needed by session windows only
+    :param result: state -> emitted value
+    """
+    __slots__ = ("initial", "add", "merge", "result")
+
+    def __init__(self,
+                 initial: Callable[[], Any],
+                 add: Callable[[Any, Any], Any],
+                 merge: Callable[[Any, Any], Any] = None,
+                 result: Callable[[Any], Any] = None):
+        self.initial = initial
+        self.add = add
+        self.merge = merge
+        self.result = result or (lambda state: state)
+
+    @classmethod
+    def reducer(cls, func: Callable[[Any, Any], Any]) -> "Aggregate":
+        """Aggregate from reduce function like max or operator.add"""
+        def add(state, value):
+            return value if state is None else func(state, value)
+
+        def merge(state, other):
+            return other if state is None else state if other is None else func(state, other)
+
+        return cls(lambda: None, add, merge)
+
+
+COUNT = Aggregate(lambda: 0, lambda state, value: state + 1, operator.add)
+SUM = Aggregate(lambda: 0, operator.add, operator.add)
+MIN = Aggregate.reducer(min)
+MAX = Aggregate.reducer(max)
+MEAN = Aggregate(
+    lambda: (0, 0),
+    lambda state, value: (state[0] + value, state[1] + 1),
+    lambda state, other: (state[0] + other[0], state[1] + other[1]),
+    lambda state: state[0] / state[1] if state[1] else None,
+)
+
+
+class _Pane:
+    """Aggregate state of one open window"""
+    __slots__ = ("start", "end", "state", "count")
+
+    def __init__(self, start: float, end: float, aggregate: Aggregate):
+        self.start = start
+        self.end = end
+        self.state = aggregate.initial()
+        self.count = 0
+
+    def add(self, value: Any, aggregate: Aggregate) -> None:
+        self.state = aggregate.add(self.state, value)
+        self.count += 1
+
+
+class TumblingWindow:
+    """
+    Fixed windows of `size` seconds, or of `size` records with count=True
+    """
+
+    def __init__(self, size: float, *, count: bool = False):
+        self.size = size
+        self.slide = size
+        self.count = count
+
+    def starts(self, time: float) -> Iterable[float]:
+        yield floor(time / self.size) * self.size
+
+
+class SlidingWindow(TumblingWindow):
+    """
+    Windows of `size` seconds every `slide` seconds, or of last `size` records every `slide` records
+    """
+
+    def __init__(self, size: float, slide: float, *, count: bool = False):
+        super().__init__(size, count=count)
+        self.slide = slide
+
+    def starts(self, time: float) -> Iterable[float]:
+        start = floor(time / self.slide) * self.slide
+        while start > time - self.size:
+            yield start
+            start -= self.slide
+
+
+class SessionWindow:
+    """
+    Windows of records of the same key closer than `gap` seconds to each other
+    """
+    count = False
+
+    def __init__(self, gap: float):
+        self.gap = gap
+
+
+class WindowOperator:
+    """
+    Keyed window state with bounded memory
+
+    Time windows are emitted when the watermark, the latest record time minus
+    `allowed_lateness`, passes their end. Records of already emitted windows are dropped
+    and counted as late. Count windows are emitted as soon as they are full, state of key
+    is dropped then unless sliding windows need its last records.
+    """
+
+    def __init__(self, window: TumblingWindow or SessionWindow, aggregate: Aggregate = COUNT, *,
+                 allowed_lateness: float = 0):
+        if isinstance(window, SessionWindow) and aggregate.merge is None:
+            raise ValueError("Session windows need aggregate with merge")
+        self.window = window
+        self.aggregate = aggregate
+        self.allowed_lateness = allowed_lateness
+        self.watermark = float("-inf")
+        self.late = 0
+        self._keys = {}
+
+    @property
+    def open_windows(self) -> int:
+        if self.window.count:
+            return len(self._keys)
+        return sum(len(panes) for panes in self._keys.values())
+
+    def process(self, records: Iterable[Tuple[Hashable, float, Any]]) -> List[Dict]:
+        """
+        Add (key, time, value) records
+
+        :return: windows closed by these records
+        """
+        if self.window.count:
+            return [window for key, time, value in records for window in self._add_counted(key, time, value)]
+
+        latest = self.watermark + self.allowed_lateness
+        for key, time, value in records:
+            latest = max(latest, time)
+            if isinstance(self.window, SessionWindow):
+                self._add_session(key, time, value)
+            else:
+                self._add_timed(key, time, value)
+        return self.advance(latest - self.allowed_lateness)
+
+    def advance(self, watermark: float) -> List[Dict]:
+        """Move watermark forward and emit windows ending before it"""
+        if watermark <= self.watermark:
+            return []
+        self.watermark = watermark
+        gap = self.window.gap if isinstance(self.window, SessionWindow) else 0
+        emitted = []
+        for key in list(self._keys):
+            panes = self._keys[key]
+            closed = [pane for pane in panes if pane.end + gap <= watermark]
+            if not closed:
+                continue
+            for pane in closed:
+                panes.remove(pane)
+                emitted.append(self._emit(key, pane))
+            if not panes:
+                del self._keys[key]
+        return sorted(emitted, key=lambda window: window["end"])
+
+    def flush(self) -> List[Dict]:
+        """Emit every open window, count windows partly filled, e.g. at the end of stream"""
+        if self.window.count:
+            # keys of sliding windows keep records already emitted, only new ones make a window
+            emitted = [self._emit(key, self._counted(records)) for key, (records, seen) in self._keys.items() if seen[0]]
+        else:
+            emitted = [self._emit(key, pane) for key, panes in self._keys.items() for pane in panes]
+        self._keys.clear()
+        return sorted(emitted, key=lambda window: window["end"])
+
+    def _emit(self, key: Hashable, pane: _Pane) -> Dict:
+        return dict(key=key, start=pane.start, end=pane.end, value=self.aggregate.result(pane.state), count=pane.count)
+
+    def _add_timed(self, key: Hashable, time: float, value: Any) -> None:
+        panes = self._keys.setdefault(key, [])
+        for start in self.window.starts(time):
+            end = start + self.window.size
+            if end <= self.watermark:
+                self.late += 1
+                continue
+            for pane in panes:
+                if pane.start == start:
+                    break
+            else:
+                pane = _Pane(start, end, self.aggregate)
+                panes.append(pane)
+            pane.add(value, self.aggregate)
+        if not panes:
+            del self._keys[key]
+
+    def _add_session(self, key: Hashable, time: float, value: Any) -> None:
+        if time + self.window.gap <= self.watermark:
+            self.late += 1
+            return
+        panes = self._keys.setdefault(key, [])
+        session = _Pane(time, time, self.aggregate)
+        session.add(value, self.aggregate)
+        for pane in [pane for pane in panes if pane.start - self.window.gap < time < pane.end + self.window.gap]:
+            # record bridges sessions, merge them
+            panes.remove(pane)
+            session.start = min(session.start, pane.start)
+            session.end = max(session.end, pane.end)
+            session.state = self.aggregate.merge(pane.state, session.state)
+            session.count += pane.count
+        panes.append(session)
+
+    def _add_counted(self, key: Hashable, time: float, value: Any) -> List[Dict]:
+        # last `size` records of key and number of records since the last emission
+        records, seen = self._keys.setdefault(key, (deque(maxlen=self.window.size), [0]))
+        records.append((time, value))
+        seen[0] += 1
+        if len(records) < self.window.size or seen[0] < self.window.slide:
+            return []
+
+        seen[0] = 0
+        pane = self._counted(records)
+        if self.window.slide >= self.window.size:
+            # next window shares no records with this one
+            del self._keys[key]
+        return [self._emit(key, pane)]
+
+    def _counted(self, records: deque) -> _Pane:
+        pane = _Pane(records[0][0], records[-1][0], self.aggregate)
+        for _, item in records:
+            pane.add(item, self.aggregate)
+        return pane
+
+
+_operators = {}
+
+
+def window_operator(name: str, factory: Callable[[], WindowOperator]) -> WindowOperator:
+    """Process wide window state of services with `name`"""
+    window = _operators.get(name)
+    if window is None:
+        window = _operators[name] = factory()
+    return window
+
+
+def windows() -> Dict[str, Dict]:
+    return {
+        name: dict(open=window.open_windows, watermark=window.watermark, late=window.late)
+        for name, window in _operators.items()
+    }
+
+
+def reset_windows() -> None:
+    _operators.clear()
+
+
+class WindowService(Service):
+    """
+    Service aggregating records of upstream services by windows
+
+    class ClicksPerMinute(WindowService):
+        window = TumblingWindow(60)
+        aggregate = SUM
+
+    await pipeline.register(ClicksPerMinute, depends_on={ParseClicks: "records"})
+
+    Every list given by dependencies is taken as records, mappings with
+    `key_field`, `time_field` and `value_field`. Without `time_field` records
+    get the time they are processed. State is kept between pipeline runs,
+    the result is the list of windows closed by this run.
+    """
+    __slots__ = ()
+
+    window = None
+    aggregate = COUNT
+    allowed_lateness = 0
+    key_field = "key"
+    time_field = "time"
+    value_field = "value"
+
+    def _operator(self) -> WindowOperator:
+        return WindowOperator(self.window, self.aggregate, allowed_lateness=self.allowed_lateness)
+
+    def _records(self, kwargs: Mapping) -> Iterable[Tuple[Hashable, float, Any]]:
+        now = asyncio.get_event_loop().time()
+        for value in kwargs.values():
+            if not isinstance(value, list):
+                continue
+            for record in value:
+                time = record[self.time_field] if self.time_field else now
+                yield record.get(self.key_field), time, record.get(self.value_field)
+
+    async def payload(self, **kwargs) -> List[Dict]:
+        return window_operator(self.name, self._operator).process(self._records(kwargs))
@@ -0,0 +1,71 @@
+"""
+Run framework benchmarks and dump results as json
+
+    python -m benchmarks --output bench.json
+    python -m benchmarks --suite scheduler --sizes 10 100 1000 10000
+    python -m benchmarks.compare old.json new.json
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from benchmarks import bench_codecs, bench_fusion, bench_import, bench_kwargs, bench_memory, bench_middleware, bench_scheduler, bench_state
+
+__author__ = "a.lemets"
+
+SUITES = ("scheduler", "middleware", "kwargs", "memory", "codecs", "state", "fusion", "import")
+
+
+def git_revision() -> str or None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks")
+    parser.add_argument("--suite", choices=SUITES, nargs="*", default=list(SUITES))
+    parser.add_argument("--sizes", type=int, nargs="*", default=[10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", default="-", help="json file, - for stdout")
+    args = parser.parse_args(argv)
+
+    results = []
+    if "scheduler" in args.suite:
+        results += bench_scheduler.run(args.sizes, args.repeat)
+    if "middleware" in args.suite:
+        results += bench_middleware.run([0, 1, 5], args.repeat)
+    if "kwargs" in args.suite:
+        results += bench_kwargs.run([10, 1000, 100000], args.repeat)
+    if "memory" in args.suite:
+        results += bench_memory.run(args.sizes)
+    if "codecs" in args.suite:
+        results += bench_codecs.run(args.sizes, args.repeat)
+    if "state" in args.suite:
+        results += bench_state.run(args.sizes, args.repeat)
+    if "fusion" in args.suite:
+        results += bench_fusion.run([10, 100], args.repeat)
+    if "import" in args.suite:
+        results += bench_import.run(args.repeat)
+
+    report = dict(
+        revision=git_revision(),
+        created=time.time(),
+        python=platform.python_version(),
+        platform=platform.platform(),
+        results=results,
+    )
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as stream:
+            json.dump(report, stream, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
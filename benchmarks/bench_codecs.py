@@ -0,0 +1,43 @@
+from typing import Dict, List
+
+from aioflow.codecs import AioFlowCodecError, ResultCodec
+from benchmarks.utils import measure, record
+
+__author__ = "a.lemets"
+
+CODECS = ("json", "orjson", "msgpack", "pickle")
+COMPRESSIONS = (None, "zlib", "zstd", "lz4")
+
+
+def sample_result(size: int) -> Dict:
+    """Typical service result: records with strings and numbers"""
+    return {
+        "items": [
+            {"id": i, "name": f"item-{i}", "score": i / 7, "tags": ["a", "b", "c"], "active": bool(i % 2)}
+            for i in range(size)
+        ],
+        "total": size,
+    }
+
+
+def run(sizes: List[int], repeat: int, calls: int = 100) -> List[Dict]:
+    results = []
+    for size in sizes:
+        result = sample_result(size)
+        for codec_name in CODECS:
+            for compression in COMPRESSIONS:
+                try:
+                    codec = ResultCodec(codec_name, compression=compression, threshold=0)
+                except AioFlowCodecError:
+                    continue
+                result_format, data = codec.encode(result)
+                params = dict(size=size, codec=codec_name, compression=compression)
+                results.append(record(
+                    "codecs",
+                    result_format,
+                    params,
+                    encode=measure(lambda: codec.encode(result), repeat=repeat, number=calls),
+                    decode=measure(lambda: codec.decode(result_format, data), repeat=repeat, number=calls),
+                    stored_bytes=len(data),
+                ))
+    return results
@@ -0,0 +1,29 @@
+from typing import Dict, List
+
+from benchmarks.dags import build_pipeline, chain
+from benchmarks.utils import measure_async, record
+
+__author__ = "a.lemets"
+
+
+def run(lengths: List[int], repeat: int, pipelines: int = 100) -> List[Dict]:
+    results = []
+    for length in lengths:
+        edges = chain(length)
+        for fuse in (False, True):
+            async def run_pipelines():
+                for _ in range(pipelines):
+                    pipeline = await build_pipeline(edges, config={"__fuse": fuse})
+                    await pipeline.run()
+
+            async def register_pipelines():
+                for _ in range(pipelines):
+                    await build_pipeline(edges, config={"__fuse": fuse})
+
+            run_time = measure_async(run_pipelines, repeat=repeat) - measure_async(register_pipelines, repeat=repeat)
+            results.append(record(
+                "fusion", "fused" if fuse else "unfused", dict(length=length, pipelines=pipelines),
+                run=run_time,
+                per_service=run_time / pipelines / length,
+            ))
+    return results
@@ -0,0 +1,50 @@
+"""
+Import time of aioflow measured by `python -X importtime` in fresh interpreters
+"""
+import re
+import subprocess
+import sys
+from typing import Dict, List
+
+from benchmarks.utils import record
+
+__author__ = "a.lemets"
+
+# modules which must be imported only when used
+LAZY_MODULES = ("yaml", "uuid", "json", "ujson", "pickle", "random", "aioredis", "aioflow.codecs")
+# own import time of aioflow modules, dependencies like asyncio are not counted
+BUDGET_MS = 50
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def import_times(module: str = "aioflow") -> Dict[str, tuple]:
+    """{module: (self us, cumulative us)} of everything imported by `import module`"""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        stderr=subprocess.PIPE,
+        check=True,
+    ).stderr.decode()
+    times = {}
+    for match in _LINE.finditer(output):
+        self_us, cumulative_us, _, name = match.groups()
+        times[name] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def own_time_ms(times: Dict[str, tuple], package: str = "aioflow") -> float:
+    return sum(self_us for name, (self_us, _) in times.items() if name.split(".")[0] == package) / 1000
+
+
+def run(repeat: int) -> List[Dict]:
+    runs = [import_times() for _ in range(repeat)]
+    best = min(runs, key=own_time_ms)
+    top = sorted(best.items(), key=lambda item: -item[1][0])[:10]
+    return [record(
+        "import", "aioflow", dict(repeat=repeat),
+        total_ms=min(times["aioflow"][1] for times in runs) / 1000,
+        own_ms=own_time_ms(best),
+        budget_ms=BUDGET_MS,
+        lazy_imported=[name for name in LAZY_MODULES if name in best],
+        slowest=[dict(module=name, self_ms=self_us / 1000) for name, (self_us, _) in top],
+    )]
@@ -0,0 +1,59 @@
+from typing import Dict, List
+
+from aioflow import Pipeline
+from benchmarks.dags import service_classes
+from benchmarks.utils import measure, record
+
+__author__ = "a.lemets"
+
+
+def nested_result(width: int, depth: int) -> Dict:
+    result = {f"key{i}": "x" * 64 for i in range(width)}
+    node = result
+    for level in range(depth):
+        node["nested"] = {f"key{i}": i for i in range(width)}
+        node = node["nested"]
+    return result
+
+
+def legacy_build_service_kwargs(pipeline: Pipeline, service, service_number: int) -> Dict:
+    """build_service_kwargs before key paths were compiled at registration"""
+    kwargs = {"__service_number": service_number}
+    kwargs.update(service.config.get("__kwargs", {}))
+    for srv in pipeline._depends_on[service._index]:
+        for key in pipeline._depends_on[service._index][srv]:
+            res = srv.result
+            for k in key.split("."):
+                res = res[k]
+            kwargs[f"{srv.name}.{key}"] = res
+    return kwargs
+
+
+def run(widths: List[int], repeat: int, calls: int = 1000, depth: int = 5) -> List[Dict]:
+    import asyncio
+
+    results = []
+    for width in widths:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        parents = 4
+        classes = service_classes(parents + 1)
+        pipeline = Pipeline("benchmark")
+        for cls in classes[:parents]:
+            loop.run_until_complete(pipeline.register(cls))
+        for service in pipeline.services:
+            service.result = nested_result(width, depth)
+
+        deep_key = ".".join(["nested"] * depth + ["key0"])
+        keys = ["key0", "nested.key1", deep_key]
+        loop.run_until_complete(pipeline.register(classes[-1], depends_on={cls: keys for cls in classes[:parents]}))
+        service = list(pipeline.services)[-1]
+
+        params = dict(width=width, depth=depth, parents=parents, keys=len(keys))
+        seconds = measure(lambda: pipeline.build_service_kwargs(service, 1), repeat=repeat, number=calls)
+        legacy = measure(lambda: legacy_build_service_kwargs(pipeline, service, 1), repeat=repeat, number=calls)
+        results.append(record("kwargs", "build_service_kwargs", params, per_call=seconds))
+        results.append(record("kwargs", "legacy_build_service_kwargs", params, per_call=legacy))
+        asyncio.set_event_loop(None)
+        loop.close()
+    return results
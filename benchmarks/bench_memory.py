@@ -0,0 +1,74 @@
+import asyncio
+from typing import Dict, List
+
+from aioflow import Pipeline, ServiceStatus
+from aioflow.helpers import cached_property
+from benchmarks.dags import SHAPES, NoopService, build_pipeline
+from benchmarks.utils import measure_memory, record
+
+__author__ = "a.lemets"
+
+
+class LegacyService:
+    """Service runtime state before __slots__: __dict__, config copy and loop"""
+
+    def __init__(self, pipeline):
+        self._id = None
+        self._pipeline = pipeline
+        self.number = None
+        self.allow_failure = self.config.get("allow_failure", False)
+        self.timeout = self.config.get("timeout", None)
+        self.status = ServiceStatus.PENDING
+        self._result = None
+        self._loop = asyncio.get_event_loop()
+
+    @cached_property
+    def config(self):
+        _config = {}
+        _config.update(self._pipeline.config.get("__global", {}))
+        _config.update(self._pipeline.config.get("noopservice", {}))
+        return _config
+
+    @property
+    def id(self):
+        return self._id or f"{type(self).__name__}__{id(self)}"
+
+
+def run_services(count: int) -> List[Dict]:
+    """Memory of `count` bare service instances, legacy layout vs slotted one"""
+    config = {"__global": {"timeout": 10}}
+    results = []
+    for cls in (LegacyService, NoopService):
+        async def create():
+            pipeline = Pipeline("benchmark", config=config)
+            if cls is LegacyService:
+                # legacy pipeline kept {service.id: service} dicts
+                services = [cls(pipeline) for _ in range(count)]
+                return {service.id: service for service in services}, {service.id: {} for service in services}
+            return [cls(pipeline) for _ in range(count)], [{} for _ in range(count)]
+
+        retained, peak = measure_memory(create)
+        results.append(record("memory", cls.__name__, dict(services=count), retained=retained, peak=peak,
+                              per_service=retained / count))
+    return results
+
+
+def run(sizes: List[int]) -> List[Dict]:
+    results = []
+    for shape, edges_factory in SHAPES.items():
+        for size in sizes:
+            edges = edges_factory(size)
+
+            async def run_pipeline():
+                pipeline = await build_pipeline(edges)
+                await pipeline.run()
+                return pipeline
+
+            retained, peak = measure_memory(run_pipeline)
+            results.append(record(
+                "memory", shape, dict(size=size),
+                retained=retained,
+                peak=peak,
+                per_service=retained / size,
+            ))
+    return results + run_services(max(sizes) * 10)
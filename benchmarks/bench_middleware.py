@@ -0,0 +1,35 @@
+from typing import Dict, List
+
+from aioflow import MiddlewareABC, Pipeline
+from benchmarks.dags import NoopService
+from benchmarks.utils import measure_async, record
+
+__author__ = "a.lemets"
+
+
+class NoopMiddleware(MiddlewareABC):
+    ...
+
+
+class FilteredMiddleware(MiddlewareABC):
+    hooks = (type("Unused", (NoopService,), {}),)
+
+
+def run(counts: List[int], repeat: int, calls: int = 10000) -> List[Dict]:
+    results = []
+    for middleware_cls in (NoopMiddleware, FilteredMiddleware):
+        for count in counts:
+            pipeline = Pipeline("benchmark", middleware=[middleware_cls() for _ in range(count)])
+
+            async def call():
+                service = NoopService(pipeline)
+                for _ in range(calls):
+                    await pipeline._call_middleware("service_start", service)
+
+            seconds = measure_async(call, repeat=repeat)
+            results.append(record(
+                "middleware", middleware_cls.__name__, dict(middleware=count, calls=calls),
+                seconds=seconds,
+                per_call=seconds / calls,
+            ))
+    return results
@@ -0,0 +1,30 @@
+from typing import Dict, List
+
+from benchmarks.dags import SHAPES, build_pipeline
+from benchmarks.utils import measure_async, record
+
+__author__ = "a.lemets"
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    for shape, edges_factory in SHAPES.items():
+        for size in sizes:
+            edges = edges_factory(size)
+
+            async def register():
+                return await build_pipeline(edges)
+
+            async def run_pipeline():
+                pipeline = await build_pipeline(edges)
+                await pipeline.run()
+
+            register_time = measure_async(register, repeat=repeat)
+            total_time = measure_async(run_pipeline, repeat=repeat)
+            results.append(record(
+                "scheduler", shape, dict(size=size),
+                register=register_time,
+                run=total_time - register_time,
+                per_service=(total_time - register_time) / size,
+            ))
+    return results
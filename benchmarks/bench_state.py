@@ -0,0 +1,46 @@
+import os
+import tempfile
+from typing import Dict, List
+
+from benchmarks.dags import build_pipeline, fan_out
+from benchmarks.utils import measure_async, record
+
+__author__ = "a.lemets"
+
+# round trip of redis on the same host
+REDIS_LATENCY = 0.0001
+# create, start and done of every service
+HOOKS_PER_SERVICE = 3
+
+
+def middleware_factories(directory: str) -> Dict:
+    from aioflow.middleware.sqlite_middleware import SqliteMiddleware
+
+    from aioflow.middleware.redis_meddleware import RedisMiddleware
+    from benchmarks.fake_redis import FakeRedis
+
+    return {
+        "sqlite": lambda: SqliteMiddleware(os.path.join(directory, "state.db"), events=False),
+        "redis": lambda: RedisMiddleware(FakeRedis(REDIS_LATENCY), events=False),
+    }
+
+
+def run(sizes: List[int], repeat: int) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for name, factory in middleware_factories(directory).items():
+            for size in sizes:
+                async def run_pipeline():
+                    middleware = factory()
+                    pipeline = await build_pipeline(fan_out(size), middleware=middleware)
+                    await pipeline.run()
+                    if hasattr(middleware, "close"):
+                        await middleware.close()
+
+                seconds = measure_async(run_pipeline, repeat=repeat)
+                results.append(record(
+                    "state", name, dict(size=size),
+                    seconds=seconds,
+                    hooks_per_second=size * HOOKS_PER_SERVICE / seconds,
+                ))
+    return results
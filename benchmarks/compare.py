@@ -0,0 +1,56 @@
+"""
+Compare two benchmark reports
+
+    python -m benchmarks.compare old.json new.json --threshold 0.1
+"""
+import argparse
+import json
+import sys
+from typing import Dict, Iterator, Tuple
+
+__author__ = "a.lemets"
+
+# lower is better for every metric we record
+METRICS = ("register", "run", "per_service", "per_call", "seconds", "retained", "peak")
+
+
+def _key(result: Dict) -> Tuple:
+    return result["suite"], result["name"], tuple(sorted(result["params"].items()))
+
+
+def compare(old: Dict, new: Dict) -> Iterator[Tuple[Tuple, str, float, float, float]]:
+    old_results = {_key(result): result for result in old["results"]}
+    for result in new["results"]:
+        base = old_results.get(_key(result))
+        if base is None:
+            continue
+        for metric in METRICS:
+            if metric in result and base.get(metric):
+                yield _key(result), metric, base[metric], result[metric], result[metric] / base[metric] - 1
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.compare")
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown treated as regression")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as stream:
+        old = json.load(stream)
+    with open(args.new) as stream:
+        new = json.load(stream)
+
+    regressions = 0
+    for (suite, name, params), metric, before, after, delta in compare(old, new):
+        mark = ""
+        if delta > args.threshold:
+            mark = " REGRESSION"
+            regressions += 1
+        params = ",".join(f"{k}={v}" for k, v in params)
+        print(f"{suite:<10} {name:<24} {params:<36} {metric:<12} {before:>12.6g} {after:>12.6g} {delta:+8.1%}{mark}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,58 @@
+import random
+from typing import Dict, List, Type
+
+from aioflow import Pipeline, Service
+
+__author__ = "a.lemets"
+
+
+class NoopService(Service):
+    __slots__ = ()
+
+    async def payload(self, **kwargs):
+        return {"value": 1}
+
+
+def service_classes(size: int) -> List[Type[Service]]:
+    # services are matched by class in depends_on, so every node needs its own
+    return [type(f"Noop{i}", (NoopService,), {"__slots__": ()}) for i in range(size)]
+
+
+def chain(size: int) -> Dict[int, List[int]]:
+    return {i: [i - 1] if i else [] for i in range(size)}
+
+
+def fan_out(size: int) -> Dict[int, List[int]]:
+    return {i: [0] if i else [] for i in range(size)}
+
+
+def diamond(size: int) -> Dict[int, List[int]]:
+    # root -> size - 2 parallel nodes -> sink
+    edges = fan_out(size - 1)
+    edges[size - 1] = list(range(1, size - 1))
+    return edges
+
+
+def random_dag(size: int, max_parents: int = 3, seed: int = 42) -> Dict[int, List[int]]:
+    rnd = random.Random(seed)
+    return {i: rnd.sample(range(i), min(i, rnd.randint(0, max_parents))) for i in range(size)}
+
+
+SHAPES = {
+    "chain": chain,
+    "fan_out": fan_out,
+    "diamond": diamond,
+    "random": random_dag,
+}
+
+
+async def build_pipeline(edges: Dict[int, List[int]], **kwargs) -> Pipeline:
+    """
+    Build pipeline from {node: [parent, ...]}, parents always have smaller index
+    """
+    classes = service_classes(len(edges))
+    pipeline = await Pipeline.create("benchmark", **kwargs)
+    for node in sorted(edges):
+        depends_on = {classes[parent]: "value" for parent in edges[node]}
+        await pipeline.register(classes[node], depends_on=depends_on)
+    return pipeline
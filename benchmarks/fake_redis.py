@@ -0,0 +1,275 @@
+import asyncio
+import time
+
+from aioflow.middleware.redis_meddleware import _EXPIRE, _QUERY, _SET_STATE
+
+__author__ = "a.lemets"
+
+
+def to_bytes(value):
+    return value if isinstance(value, bytes) else str(value).encode()
+
+
+def to_str(value):
+    return value.decode() if isinstance(value, bytes) else str(value)
+
+
+def entry_id(index):
+    """Id of entry `index` (from 0) of stream, ids of entries are "1-0", "2-0", ..."""
+    return f"{index + 1}-0".encode()
+
+
+def entry_index(_id):
+    return int(to_str(_id).split("-")[0]) - 1
+
+
+class FakeTransaction:
+    def __init__(self, redis):
+        self.redis = redis
+        self.commands = []
+
+    def xadd(self, stream, fields, max_len=None, exact_len=False):
+        self.commands.append(lambda: self.redis.streams.setdefault(stream, []).append(fields))
+
+    def hgetall(self, key):
+        future = asyncio.get_event_loop().create_future()
+        self.commands.append(lambda: future.set_result(
+            {to_bytes(field): value for field, value in self.redis.hashes.get(key, {}).items()}
+        ))
+        return future
+
+    async def execute(self):
+        await self.redis.round_trip()
+        for command in self.commands:
+            command()
+
+
+class FakeRedis:
+    """
+    Local stand-in of redis for RedisMiddleware and EventConsumer: keys live in dicts,
+    scripts run as python, every round trip takes `latency` seconds
+    """
+
+    def __init__(self, latency: float = 0):
+        self.latency = latency
+        self.hashes = {}
+        self.zsets = {}
+        self.sets = {}
+        self.streams = {}
+        # (stream, group): {"last": index of last delivered entry, "pending": {id: [consumer, delivered, count]}}
+        self.groups = {}
+        self.ttls = {}
+        self.round_trips = 0
+        self.scripts = {
+            _SET_STATE: self._set_state,
+            _EXPIRE: self._expire,
+            _QUERY: self._query,
+        }
+
+    async def round_trip(self):
+        self.round_trips += 1
+        await asyncio.sleep(self.latency)
+
+    async def exists(self, key):
+        await self.round_trip()
+        return key in self.hashes
+
+    async def hmget(self, key, *fields):
+        await self.round_trip()
+        values = self.hashes.get(key, {})
+        return [values.get(field) for field in fields]
+
+    def pipeline(self):
+        return FakeTransaction(self)
+
+    async def script_load(self, script):
+        return script
+
+    async def evalsha(self, sha, keys, args):
+        await self.round_trip()
+        return self.scripts[sha](keys, args)
+
+    async def execute(self, command, *args):
+        await self.round_trip()
+        command = [to_str(command).upper()] + [to_str(arg) for arg in args]
+        if command[:2] != ["XGROUP", "CREATE"]:
+            raise NotImplementedError(command)
+        stream, group, latest_id = command[2:5]
+        if (stream, group) in self.groups:
+            raise Exception("BUSYGROUP Consumer Group name already exists")
+        entries = self.streams.setdefault(stream, [])
+        last = len(entries) - 1 if latest_id == "$" else entry_index(latest_id)
+        self.groups[stream, group] = {"last": last, "pending": {}}
+        return b"OK"
+
+    async def xread_group(self, group, consumer, streams, timeout=0, count=None, latest_ids=None):
+        await self.round_trip()
+        messages = []
+        for stream, latest_id in zip(streams, latest_ids):
+            entries, state = self.streams[stream], self.groups[stream, group]
+            if latest_id == ">":
+                indexes = range(state["last"] + 1, len(entries))[:count]
+                for index in indexes:
+                    state["pending"][entry_id(index)] = [consumer, time.monotonic(), 1]
+                    state["last"] = index
+            else:
+                after = entry_index(latest_id)
+                indexes = sorted(
+                    entry_index(_id) for _id, (owner, _, _) in state["pending"].items()
+                    if owner == consumer and entry_index(_id) > after
+                )[:count]
+            messages += [
+                (stream.encode(), entry_id(index), {to_bytes(key): to_bytes(value) for key, value in entries[index].items()})
+                for index in indexes
+            ]
+        if not messages and timeout:
+            await asyncio.sleep(timeout / 1000)
+        return messages
+
+    async def xack(self, stream, group, *ids):
+        await self.round_trip()
+        pending = self.groups[stream, group]["pending"]
+        return sum(pending.pop(to_bytes(_id), None) is not None for _id in ids)
+
+    async def xpending(self, stream, group, start=None, stop=None, count=None, consumer=None):
+        await self.round_trip()
+        now = time.monotonic()
+        low = 0 if to_str(start) == "-" else entry_index(start)
+        return [
+            [_id, owner.encode(), int((now - delivered) * 1000), deliveries]
+            for _id, (owner, delivered, deliveries) in sorted(
+                self.groups[stream, group]["pending"].items(), key=lambda item: entry_index(item[0])
+            )
+            if entry_index(_id) >= low
+        ][:count]
+
+    async def xclaim(self, stream, group, consumer, min_idle_time, _id, *ids):
+        await self.round_trip()
+        now = time.monotonic()
+        pending = self.groups[stream, group]["pending"]
+        claimed = []
+        for _id in (_id, *ids):
+            entry = pending.get(to_bytes(_id))
+            if entry is not None and (now - entry[1]) * 1000 >= min_idle_time:
+                pending[to_bytes(_id)] = [consumer, now, entry[2] + 1]
+                claimed.append((to_bytes(_id), self.streams[stream][entry_index(_id)]))
+        return claimed
+
+    def _set_state(self, keys, args):
+        prefix, _id, now, *fields = args
+        state = self.hashes.setdefault(keys[0], {})
+        old = state.get("status")
+        state.update((field, to_bytes(value)) for field, value in zip(fields[::2], fields[1::2]))
+        new = state["status"].decode()
+        if old is not None and old.decode() != new:
+            self.zsets[prefix + old.decode()].pop(_id)
+        self.zsets.setdefault(prefix + new, {})[_id] = now
+        if len(keys) > 1:
+            self.zsets.setdefault(keys[1], {})[_id] = now
+        if len(keys) > 2:
+            self.sets.setdefault(keys[2], set()).add(_id)
+
+    def _expire(self, keys, args):
+        ttl, service_prefix, now, pipeline_id, limit, count = args
+        self.ttls[keys[0]] = ttl
+        self.zsets.setdefault(keys[2], {})[pipeline_id] = now + ttl
+        for _id in self.sets.get(keys[1], ()):
+            self.ttls[service_prefix + _id] = ttl
+            self.zsets.setdefault(keys[3], {})[_id] = now + ttl
+        self.ttls[keys[1]] = ttl
+        for expiry, indexes in ((keys[2], keys[4:4 + count]), (keys[3], keys[4 + count:])):
+            scores = self.zsets[expiry]
+            for _id in sorted((_id for _id in scores if scores[_id] <= now), key=scores.get)[:limit]:
+                for index in indexes:
+                    self.zsets.get(index, {}).pop(_id, None)
+                del scores[_id]
+
+    def _query(self, keys, args):
+        prefix, offset, limit = args
+        if keys[0] in self.sets:
+            ids = list(self.sets[keys[0]])
+        else:
+            index = self.zsets.get(keys[0], {})
+            ids = sorted(index, key=index.get, reverse=True)[offset:offset + limit]
+        reply = []
+        for _id in ids:
+            state = self.hashes.get(prefix + _id)
+            if state:
+                reply += [_id.encode(), [item for field, value in state.items() for item in (field.encode(), value)]]
+        return reply
+
+
+class LuaRedis(FakeRedis):
+    """
+    FakeRedis running the real scripts of RedisMiddleware in lua (needs `lupa`),
+    redis.call of scripts works on the same dicts
+    """
+
+    def __init__(self, latency: float = 0):
+        from lupa import lua51
+
+        super().__init__(latency)
+        self.lua = lua51.LuaRuntime(encoding=None)
+        self.lua_type = lua51.lua_type
+        self.lua.globals().redis = self.lua.table_from({b"call": self._call})
+        self.commands = {
+            b"HGET": lambda key, field: self.hashes.get(key, {}).get(field),
+            b"HMSET": self._hmset,
+            b"HGETALL": lambda key: [
+                item for field, value in self.hashes.get(key, {}).items() for item in (field.encode(), value)
+            ],
+            b"ZADD": self._zadd,
+            b"ZREM": self._zrem,
+            b"ZRANGEBYSCORE": self._zrangebyscore,
+            b"ZREVRANGE": self._zrevrange,
+            b"SADD": lambda key, *members: self.sets.setdefault(key, set()).update(members),
+            b"SREM": lambda key, *members: self.sets.get(key, set()).difference_update(members),
+            b"SMEMBERS": lambda key: [member.encode() for member in self.sets.get(key, ())],
+            b"EXPIRE": lambda key, ttl: self.ttls.__setitem__(key, int(ttl)),
+            b"TYPE": lambda key: self.lua.table_from({b"ok": b"set" if key in self.sets else b"zset"}),
+        }
+
+    async def evalsha(self, sha, keys, args):
+        await self.round_trip()
+        lua_globals = self.lua.globals()
+        lua_globals.KEYS = self.lua.table_from([to_bytes(key) for key in keys])
+        # redis passes every argument to scripts as string
+        lua_globals.ARGV = self.lua.table_from([to_bytes(arg) for arg in args])
+        return self._reply(self.lua.execute(sha.encode()))
+
+    def _call(self, command, *args):
+        # keys and members are kept as str, binary values are restored by surrogateescape
+        reply = self.commands[to_bytes(command).upper()](*(
+            value.decode(errors="surrogateescape") if isinstance(value, bytes) else value for value in args
+        ))
+        return self.lua.table_from(reply) if isinstance(reply, list) else reply
+
+    def _reply(self, value):
+        if self.lua_type(value) == "table":
+            return [self._reply(item) for item in value.values()]
+        return value
+
+    def _hmset(self, key, *pairs):
+        self.hashes.setdefault(key, {}).update(
+            (field, value.encode(errors="surrogateescape") if isinstance(value, str) else to_bytes(value))
+            for field, value in zip(pairs[::2], pairs[1::2])
+        )
+
+    def _zadd(self, key, score, member):
+        self.zsets.setdefault(key, {})[member] = float(score)
+
+    def _zrem(self, key, *members):
+        for member in members:
+            self.zsets.get(key, {}).pop(member, None)
+
+    def _zrangebyscore(self, key, low, high, _limit, offset, count):
+        scores = self.zsets.get(key, {})
+        low, high = float(low), float(high)
+        ids = sorted((_id for _id, score in scores.items() if low <= score <= high), key=scores.get)
+        return [_id.encode() for _id in ids[int(offset):int(offset) + int(count)]]
+
+    def _zrevrange(self, key, start, stop):
+        scores = self.zsets.get(key, {})
+        start, stop = int(start), int(stop)
+        ids = sorted(scores, key=scores.get, reverse=True)
+        return [_id.encode() for _id in ids[start:None if stop == -1 else stop + 1]]
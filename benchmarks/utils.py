@@ -0,0 +1,57 @@
+import asyncio
+import gc
+import time
+import tracemalloc
+from typing import Awaitable, Callable, Dict, Tuple
+
+__author__ = "a.lemets"
+
+
+def measure(func: Callable, *, repeat: int = 5, number: int = 1) -> float:
+    """Best of repeat, seconds per call"""
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, time.perf_counter() - start)
+    return best / number
+
+
+def measure_async(factory: Callable[[], Awaitable], *, repeat: int = 5) -> float:
+    """Best of repeat, seconds per awaited factory()"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            gc.collect()
+            start = time.perf_counter()
+            loop.run_until_complete(factory())
+            best = min(best, time.perf_counter() - start)
+        return best
+    finally:
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def measure_memory(factory: Callable[[], Awaitable]) -> Tuple[int, int]:
+    """(retained, peak) bytes allocated while awaiting factory()"""
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = loop.run_until_complete(factory())
+        retained, peak = tracemalloc.get_traced_memory()
+        del result
+        return retained, peak
+    finally:
+        tracemalloc.stop()
+        asyncio.set_event_loop(None)
+        loop.close()
+
+
+def record(suite: str, name: str, params: Dict, **values) -> Dict:
+    return dict(suite=suite, name=name, params=params, **values)
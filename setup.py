@@ -12,7 +12,7 @@ setup(
     description="A simple workflow implementation using asyncio.",
     author="Andrey Lemets",
     author_email="a.a.lemets@gmail.com",
-    packages=find_packages(),
+    packages=find_packages(exclude=("benchmarks", "benchmarks.*")),
     include_package_data=True,
     license="MIT License",
     install_requires=[
@@ -23,9 +23,16 @@ setup(
             "pytest==4.2.0",
             "pytest-cov==2.6.1",
             "pytest-asyncio==0.10.0",
+            "lupa==2.0",
         ],
         "aioredis": [
             "aioredis==1.2.0",
         ],
+        "codecs": [
+            "orjson==3.9.7",
+            "msgpack==1.0.5",
+            "zstandard==0.21.0",
+            "lz4==4.3.2",
+        ],
     }
 )
@@ -0,0 +1,87 @@
+import pytest
+
+from aioflow import Service, ServiceStatus
+from aioflow.batch import AioFlowBatchSkipped, BatchItem
+from aioflow.middlewareabc import MiddlewareABC
+from aioflow.pipeline import Pipeline
+
+__author__ = "a.lemets"
+
+
+class Square(Service):
+    calls = 0
+
+    async def payload_batch(self, batch):
+        self.__class__.calls += 1
+        return [{"value": kwargs["x"] ** 2} if kwargs["x"] >= 0 else ValueError(kwargs["x"]) for kwargs in batch]
+
+    async def payload(self, **kwargs):
+        raise AssertionError("payload_batch must be used")
+
+
+class Increment(Service):
+    calls = 0
+
+    async def payload(self, **kwargs):
+        self.__class__.calls += 1
+        if kwargs["square.value"] == 4:
+            raise ZeroDivisionError
+        return kwargs["square.value"] + 1
+
+
+class Echo(Service):
+    async def payload(self, **kwargs):
+        return kwargs["x"]
+
+
+def test_batch_item():
+    item = BatchItem({"x": 1})
+    item.results["a"] = 1
+    assert item.result("a") == 1
+    assert not item.failed
+
+    item.errors["b"] = ValueError()
+    assert item.failed
+    with pytest.raises(ValueError):
+        item.result("b")
+
+
+@pytest.mark.asyncio
+async def test_run_batch():
+    class TestMiddleware(MiddlewareABC):
+        done = []
+
+        async def service_done(self, service, **kwargs):
+            self.done.append((service.name, service.result))
+
+    Square.calls = Increment.calls = 0
+    pipeline = await Pipeline.create("test", middleware=TestMiddleware())
+    await pipeline.register(Square)
+    await pipeline.register(Increment, depends_on={Square: "value"})
+    await pipeline.register(Echo)
+
+    items = await pipeline.run_batch([{"x": 1}, {"x": -1}, {"x": 2}, {"x": 3}])
+
+    assert Square.calls == 1
+    assert Increment.calls == 3
+    assert [item.results.get("increment") for item in items] == [2, None, None, 10]
+    assert [item.results["echo"] for item in items] == [1, -1, 2, 3]
+    assert isinstance(items[1].errors["square"], ValueError)
+    assert isinstance(items[1].errors["increment"], AioFlowBatchSkipped)
+    assert isinstance(items[2].errors["increment"], ZeroDivisionError)
+    assert not items[0].failed
+    assert ("increment", [2, None, None, 10]) in TestMiddleware.done
+
+
+@pytest.mark.asyncio
+async def test_run_batch_service_failed():
+    class BadBatch(Service):
+        async def payload_batch(self, batch):
+            return []
+
+    pipeline = Pipeline("test")
+    await pipeline.register(BadBatch)
+    items = await pipeline.run_batch([{}, {}])
+
+    assert all(item.failed for item in items)
+    assert list(pipeline.services)[0].status is ServiceStatus.FAILED
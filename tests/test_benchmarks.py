@@ -0,0 +1,13 @@
+import json
+
+from benchmarks.__main__ import SUITES, main
+
+__author__ = "a.lemets"
+
+
+def test_benchmark_suites_run(tmp_path):
+    output = tmp_path / "bench.json"
+    assert main(["--sizes", "2", "--repeat", "1", "--output", str(output)]) == 0
+
+    report = json.loads(output.read_text())
+    assert {result["suite"] for result in report["results"]} == set(SUITES)
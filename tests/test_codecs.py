@@ -0,0 +1,74 @@
+import pytest
+
+from aioflow import Service
+from aioflow.codecs import AioFlowCodecError, Codec, ResultCodec, decode, get_codec, register_codec
+from aioflow.pipeline import Pipeline
+
+__author__ = "a.lemets"
+
+
+class BytesService(Service):
+    async def payload(self, **kwargs):
+        return {"blob": b"x" * 4096}
+
+
+@pytest.mark.parametrize("codec", ["json", "pickle", "orjson", "msgpack"])
+def test_codec_roundtrip(codec):
+    try:
+        result_codec = ResultCodec(codec)
+    except AioFlowCodecError:
+        pytest.skip(f"{codec} is not installed")
+
+    result = {"a": [1, 2.5, "3"], "b": None}
+    result_format, data = result_codec.encode(result)
+    assert result_format == codec
+    assert result_codec.decode(result_format, data) == result
+
+
+def test_codec_compression_threshold():
+    codec = ResultCodec("json", compression="zlib", threshold=100)
+    assert codec.encode({"a": 1}) == ("json", b'{"a": 1}')
+
+    result = {"a": "x" * 1000}
+    result_format, data = codec.encode(result)
+    assert result_format == "json+zlib"
+    assert len(data) < 100
+    assert decode(result_format, data) == result
+
+
+def test_codec_unknown():
+    with pytest.raises(AioFlowCodecError):
+        get_codec("yaml")
+    with pytest.raises(AioFlowCodecError):
+        ResultCodec(compression="brotli")
+
+
+def test_register_codec():
+    register_codec("repr", Codec("repr", lambda obj: repr(obj).encode(), lambda data: eval(data)))
+    assert decode(*ResultCodec("repr").encode({"a": (1, 2)})) == {"a": (1, 2)}
+
+
+@pytest.mark.asyncio
+async def test_service_encoded_result():
+    config = {"__global": {"codec": "pickle", "compression": "zlib"}}
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(BytesService)
+    await pipeline.run()
+
+    service = list(pipeline.services)[0]
+    result_format, data = service.encoded_result
+    assert result_format == "pickle+zlib"
+    assert len(data) < 4096
+    assert ResultCodec.from_config(service.config).decode(result_format, data) == {"blob": b"x" * 4096}
+
+
+def test_decode_only_allowed_format():
+    result_format, data = ResultCodec("pickle").encode({"a": 1})
+    with pytest.raises(AioFlowCodecError):
+        decode(result_format, data)
+    with pytest.raises(AioFlowCodecError):
+        ResultCodec("json").decode(result_format, data)
+    with pytest.raises(AioFlowCodecError):
+        ResultCodec("json").decode("json+zlib", b"")
+    assert decode(result_format, data, allow_pickle=True) == {"a": 1}
+    assert ResultCodec("json", compression="zlib").decode("json", b'{"a": 1}') == {"a": 1}
@@ -0,0 +1,200 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service
+from aioflow.concurrency import AdaptiveLimiter, PriorityLimiter, adaptive_limits, reset_adaptive_limits
+from aioflow.pipeline import Pipeline
+from aioflow.stats import latency, reset_latencies
+
+__author__ = "a.lemets"
+
+
+class OrderedService(Service):
+    order = []
+
+    async def payload(self, **kwargs):
+        self.order.append(self.name)
+        await asyncio.sleep(0)
+
+
+def make_services(*names):
+    return [type(name, (OrderedService,), {}) for name in names]
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    OrderedService.order = []
+    reset_latencies()
+    reset_adaptive_limits()
+    yield
+    reset_latencies()
+    reset_adaptive_limits()
+
+
+@pytest.mark.asyncio
+async def test_priority_limiter():
+    limiter = PriorityLimiter(1)
+    order = []
+
+    async def worker(name, priority):
+        async with limiter.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await limiter.acquire()
+    tasks = [asyncio.ensure_future(worker(name, priority)) for name, priority in [("a", 1), ("b", 5), ("c", 3)]]
+    await asyncio.sleep(0)
+    assert limiter.waiting == 3
+    limiter.release()
+    await asyncio.gather(*tasks)
+
+    assert order == ["b", "c", "a"]
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_priority_limiter_cancelled_waiter():
+    limiter = PriorityLimiter(1)
+    await limiter.acquire()
+    task = asyncio.ensure_future(limiter.acquire(10))
+    await asyncio.sleep(0)
+    task.cancel()
+    await asyncio.sleep(0)
+
+    limiter.release()
+    assert limiter.active == 0
+    assert limiter.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_service_priority():
+    low, high, middle = make_services("Low", "High", "Middle")
+    config = {"__concurrency": 1, "high": {"priority": 5}, "middle": {"priority": 3}}
+    pipeline = Pipeline("test", config=config)
+    for service_cls in (low, high, middle):
+        await pipeline.register(service_cls)
+    await pipeline.run()
+
+    assert OrderedService.order == ["high", "middle", "low"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_critical_path_priority():
+    short, long1, long2, long3 = make_services("Short", "Long1", "Long2", "Long3")
+    for name in ("short", "long1", "long2", "long3"):
+        latency(name).observe(1)
+
+    pipeline = Pipeline("test", config={"__concurrency": 1, "__priority_auto": True})
+    await pipeline.register(short)
+    await pipeline.register(long1)
+    await pipeline.register(long2, depends_on={long1: []})
+    await pipeline.register(long3, depends_on={long2: []})
+    await pipeline.run()
+
+    assert [service.priority for service in pipeline.services] == [1, 3, 2, 1]
+    assert OrderedService.order[0] == "long1"
+
+
+@pytest.mark.asyncio
+async def test_pipeline_starts_service_when_dependencies_done():
+    class Slow(Service):
+        async def payload(self, **kwargs):
+            await asyncio.sleep(0.05)
+            OrderedService.order.append("slow")
+
+    fast, after_fast = make_services("Fast", "AfterFast")
+    pipeline = Pipeline("test")
+    await pipeline.register(Slow)
+    await pipeline.register(fast)
+    await pipeline.register(after_fast, depends_on={fast: []})
+    await pipeline.run()
+
+    assert OrderedService.order == ["fast", "afterfast", "slow"]
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_aimd():
+    limiter = AdaptiveLimiter(initial=2, maximum=3)
+    for _ in range(10):
+        await limiter.acquire()
+        limiter.release(0.1, False, now=0)
+    assert limiter.limit == 3
+    assert limiter.baseline == 0.1
+
+    await limiter.acquire()
+    limiter.release(1, False, now=10)
+    assert limiter.limit == 1.5
+
+    # one decrease per observed latency
+    await limiter.acquire()
+    limiter.release(1, True, now=10.5)
+    assert limiter.limit == 1.5
+    await limiter.acquire()
+    limiter.release(1, True, now=11)
+    assert limiter.limit == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_limiter_waiters():
+    limiter = AdaptiveLimiter(initial=1)
+    await limiter.acquire()
+    task = asyncio.ensure_future(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.summary()["waiting"] == 1
+
+    limiter.release(0.1, False)
+    await task
+    assert limiter.active == 1
+    limiter.release(0.1, False)
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_adaptive_concurrency():
+    class Limited(Service):
+        running = 0
+        peak = 0
+
+        async def payload(self, **kwargs):
+            Limited.running += 1
+            Limited.peak = max(Limited.peak, Limited.running)
+            await asyncio.sleep(0.01)
+            Limited.running -= 1
+
+    config = {"limited": {"adaptive_concurrency": True, "concurrency_initial": 1, "concurrency_max": 1}}
+    pipelines = [Pipeline("test", config=config) for _ in range(3)]
+    for pipeline in pipelines:
+        await pipeline.register(Limited)
+    await asyncio.gather(*(pipeline.run() for pipeline in pipelines))
+
+    assert Limited.peak == 1
+    assert adaptive_limits()["limited"]["active"] == 0
+    assert adaptive_limits()["limited"]["limit"] == 1
+
+
+@pytest.mark.asyncio
+async def test_adaptive_waiter_does_not_hold_shared_slot():
+    finished = []
+
+    class Throttled(Service):
+        async def payload(self, **kwargs):
+            await asyncio.sleep(0.05)
+            finished.append("throttled")
+
+    class Quick(Service):
+        async def payload(self, **kwargs):
+            finished.append("quick")
+
+    config = {"throttled": {"adaptive_concurrency": True, "concurrency_initial": 1, "concurrency_max": 1}}
+    limiter = PriorityLimiter(2)
+    pipelines = []
+    for service_cls in (Throttled, Throttled, Quick):
+        pipeline = Pipeline("test", config=config, limiter=limiter)
+        await pipeline.register(service_cls)
+        pipelines.append(pipeline)
+    await asyncio.gather(*(pipeline.run() for pipeline in pipelines))
+
+    # the second Throttled waits for its adaptive permit without taking the free slot
+    assert finished == ["quick", "throttled", "throttled"]
+    assert limiter.active == 0
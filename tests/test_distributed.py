@@ -0,0 +1,132 @@
+import asyncio
+import os
+
+import pytest
+
+from aioflow import Service, ServiceStatus
+from aioflow.broker.memory_broker import MemoryBroker
+from aioflow.distributed import RemoteExecutor, Worker, AioFlowRemoteError, pack, unpack
+from aioflow.middlewareabc import MiddlewareABC
+from aioflow.pipeline import Pipeline
+
+__author__ = "a.lemets"
+
+
+class RemotePid(Service):
+    async def payload(self, **kwargs):
+        await self.message(progress=50)
+        return {"pid": os.getpid(), "blob": b"x" * 1024, "number": self.number}
+
+
+class RemoteLength(Service):
+    async def payload(self, **kwargs):
+        return len(kwargs["remotepid.blob"])
+
+
+class RemoteRaise(Service):
+    async def payload(self, **kwargs):
+        raise ZeroDivisionError
+
+
+class RemoteUnpicklable(Service):
+    async def payload(self, **kwargs):
+        class Local(Exception):
+            ...
+
+        raise Local
+
+
+class RemoteConfig(Service):
+    async def payload(self, **kwargs):
+        return self.config.get("value")
+
+
+class RunningWorker:
+    async def __aenter__(self):
+        broker = MemoryBroker()
+        self.worker = Worker(broker, [RemotePid, RemoteLength, RemoteRaise, RemoteUnpicklable, RemoteConfig], poll_timeout=0.01)
+        self.task = asyncio.get_event_loop().create_task(self.worker.run())
+        return broker
+
+    async def __aexit__(self, *exc_info):
+        self.worker.stop()
+        await self.task
+
+
+@pytest.mark.asyncio
+async def test_pack_blob_by_reference():
+    broker = MemoryBroker()
+    small = await pack(broker, {"a": 1}, 100)
+    large = await pack(broker, b"x" * 1000, 100)
+
+    assert len(broker._blobs) == 1
+    assert len(large) < len(await pack(broker, b"x" * 1000, None))
+    assert await unpack(broker, small) == {"a": 1}
+    assert await unpack(broker, large) == b"x" * 1000
+    assert not broker._blobs
+
+
+@pytest.mark.asyncio
+async def test_remote_pipeline():
+    class TestMiddleware(MiddlewareABC):
+        messages = []
+
+        async def service_message(self, service, **kwargs):
+            self.messages.append((service.name, kwargs))
+
+    async with RunningWorker() as broker:
+        executor = RemoteExecutor(broker, blob_threshold=512, poll_timeout=0.01)
+        pipeline = await Pipeline.create("test", middleware=TestMiddleware(), executor=executor)
+        await pipeline.register(RemotePid)
+        await pipeline.register(RemoteLength, depends_on={RemotePid: "blob"})
+        await pipeline.run()
+
+    pid, length = pipeline.services
+    assert pid.result["number"] == 1
+    assert length.result == 1024
+    assert TestMiddleware.messages == [("remotepid", {"progress": 50})]
+    assert not broker._blobs
+
+
+@pytest.mark.asyncio
+async def test_remote_sub_pipeline():
+    async with RunningWorker() as broker:
+        executor = RemoteExecutor(broker, poll_timeout=0.01)
+        sub = Pipeline("sub", config={"remoteconfig": {"value": 42}})
+        await sub.register(RemoteConfig)
+        pipeline = Pipeline("test", executor=executor)
+        await pipeline.register(sub)
+        await pipeline.run()
+
+    [service] = pipeline.services
+    assert service.name == "sub.remoteconfig"
+    assert service.result == 42
+
+
+@pytest.mark.asyncio
+async def test_remote_exception():
+    async with RunningWorker() as broker:
+        executor = RemoteExecutor(broker, poll_timeout=0.01)
+        pipeline = Pipeline("test", executor=executor)
+        await pipeline.register(RemoteRaise)
+        with pytest.raises(ZeroDivisionError):
+            await pipeline.run()
+        assert list(pipeline.services)[0].status is ServiceStatus.FAILED
+
+        pipeline = Pipeline("test", executor=executor)
+        await pipeline.register(RemoteUnpicklable)
+        with pytest.raises(AioFlowRemoteError):
+            await pipeline.run()
+
+
+@pytest.mark.asyncio
+async def test_remote_unknown_service():
+    class NotOnWorker(Service):
+        async def payload(self, **kwargs):
+            ...
+
+    async with RunningWorker() as broker:
+        pipeline = Pipeline("test", executor=RemoteExecutor(broker, poll_timeout=0.01))
+        await pipeline.register(NotOnWorker)
+        with pytest.raises(AioFlowRemoteError):
+            await pipeline.run()
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service
+from aioflow.hedging import HedgePolicy, hedged_call, hedge_stats, reset_hedge_stats
+from aioflow.pipeline import Pipeline
+from aioflow.stats import latency, reset_latencies, LatencyTracker
+
+__author__ = "a.lemets"
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    reset_latencies()
+    reset_hedge_stats()
+    yield
+    reset_latencies()
+    reset_hedge_stats()
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker(window=10)
+    assert tracker.percentile(50) is None
+    for duration in range(20):
+        tracker.observe(duration)
+
+    assert len(tracker) == 10
+    assert tracker.mean == 14.5
+    assert tracker.percentile(50) == 15
+    assert tracker.percentile(100) == 19
+
+
+def test_hedge_policy_from_config():
+    assert HedgePolicy.from_config({}) is None
+    policy = HedgePolicy.from_config({"hedge": True, "hedge_percentile": 99})
+    assert policy.percentile == 99
+    assert policy.min_samples == 20
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_wins():
+    for _ in range(10):
+        latency("straggler").observe(0.01)
+
+    delays = [1, 0]
+    cancelled = []
+
+    async def call():
+        delay = delays.pop(0)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            cancelled.append(delay)
+            raise
+        return delay
+
+    policy = HedgePolicy(min_samples=10, max_ratio=1)
+    assert await hedged_call("straggler", policy, call) == 0
+    await asyncio.sleep(0)
+
+    stats = hedge_stats("straggler")
+    assert stats.summary() == {"calls": 1, "hedged": 1, "hedge_wins": 1, "primary_wins": 0}
+    assert cancelled == [1]
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_limited():
+    for _ in range(10):
+        latency("straggler").observe(0.01)
+
+    async def call():
+        await asyncio.sleep(0.05)
+        return 42
+
+    policy = HedgePolicy(min_samples=10, max_ratio=0)
+    assert await hedged_call("straggler", policy, call) == 42
+    assert hedge_stats("straggler").hedged == 0
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_primary_failed():
+    async def call():
+        raise ZeroDivisionError
+
+    with pytest.raises(ZeroDivisionError):
+        await hedged_call("failed", HedgePolicy(), call)
+
+
+@pytest.mark.asyncio
+async def test_pipeline_observes_latency():
+    class FastService(Service):
+        async def payload(self, **kwargs):
+            return 1
+
+    pipeline = Pipeline("test", config={"fastservice": {"hedge": True}})
+    await pipeline.register(FastService)
+    await pipeline.run()
+
+    assert len(latency("fastservice")) == 1
+    assert hedge_stats("fastservice").calls == 1
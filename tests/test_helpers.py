@@ -4,14 +4,13 @@ from unittest import mock
 import pytest
 import yaml
 
-from aioflow.helpers import try_call, load_config, merge_dict
+from aioflow.helpers import try_call, load_config, merge_dict, clear_config_cache
 
 __author__ = "a.lemets"
 
 
 def test_try_call_not_callable():
-    loop = asyncio.get_event_loop()
-    result = loop.run_until_complete(try_call([], *[], **{}))
+    result = asyncio.run(try_call([], *[], **{}))
     assert result is None
 
 
@@ -21,8 +20,7 @@ def test_try_call_sync_function():
         assert var2 == "yoyo"
         return "enot"
 
-    loop = asyncio.get_event_loop()
-    result = loop.run_until_complete(try_call(sync_func, 42, var2="yoyo"))
+    result = asyncio.run(try_call(sync_func, 42, var2="yoyo"))
     assert result == "enot"
 
 
@@ -32,8 +30,7 @@ def test_try_call_async_function():
         assert var2 == "yoyo"
         return "enot"
 
-    loop = asyncio.get_event_loop()
-    result = loop.run_until_complete(try_call(async_func, 42, var2="yoyo"))
+    result = asyncio.run(try_call(async_func, 42, var2="yoyo"))
     assert result == "enot"
 
 
@@ -82,3 +79,20 @@ def test_merge_dict_recursive():
 
     assert dct1 == {"a": {"b": 1, "c": 3}, "c": {"d": 4}}
     assert dct2 == {"a": {"c": 3}, "c": {"d": 4}}
+
+
+def test_load_config_cached(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("service:\n    timeout: 42\n")
+    clear_config_cache()
+
+    shared = load_config(str(path), copy=False)
+    assert load_config(str(path), copy=False) is shared
+    copied = load_config(str(path))
+    assert copied == shared
+    assert copied is not shared
+
+    path.write_text("service:\n    timeout: 23\n    allow_failure: true\n")
+    reloaded = load_config(str(path), copy=False)
+    assert reloaded is not shared
+    assert reloaded == {"service": {"timeout": 23, "allow_failure": True}}
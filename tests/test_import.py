@@ -0,0 +1,14 @@
+from benchmarks.bench_import import BUDGET_MS, LAZY_MODULES, import_times, own_time_ms
+
+__author__ = "a.lemets"
+
+
+def test_import_is_lazy():
+    times = import_times()
+    assert "aioflow" in times
+    assert [name for name in LAZY_MODULES if name in times] == []
+
+
+def test_import_time_budget():
+    # best of few runs, the first one may compile bytecode
+    assert min(own_time_ms(import_times()) for _ in range(3)) < BUDGET_MS
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service, lifecycle
+from aioflow.broker.memory_broker import MemoryBroker
+from aioflow.distributed import RemoteExecutor, Worker
+from aioflow.pipeline import Pipeline
+
+__author__ = "a.lemets"
+
+
+class PooledService(Service):
+    setups = 0
+    teardowns = []
+
+    @classmethod
+    async def setup(cls):
+        cls.setups += 1
+        await asyncio.sleep(0.01)
+        return {"pool": cls.setups}
+
+    @classmethod
+    async def teardown(cls, resources):
+        cls.teardowns.append(resources)
+
+    async def payload(self, **kwargs):
+        return self.resources["pool"]
+
+
+class FailedSetupService(Service):
+    @classmethod
+    async def setup(cls):
+        raise ConnectionError
+
+    async def payload(self, **kwargs):
+        ...
+
+
+@pytest.fixture(autouse=True)
+def clean_lifecycle():
+    PooledService.setups = 0
+    PooledService.teardowns = []
+    yield
+    lifecycle._resources.clear()
+
+
+@pytest.mark.asyncio
+async def test_setup_once_per_process():
+    pipelines = []
+    for _ in range(3):
+        pipeline = Pipeline("test")
+        await pipeline.register(PooledService)
+        pipelines.append(pipeline)
+    await asyncio.gather(*(pipeline.run() for pipeline in pipelines))
+
+    assert PooledService.setups == 1
+    assert [list(pipeline.services)[0].result for pipeline in pipelines] == [1, 1, 1]
+
+    await lifecycle.shutdown()
+    assert PooledService.teardowns == [{"pool": 1}]
+    assert list(pipelines[0].services)[0].resources is None
+
+
+@pytest.mark.asyncio
+async def test_failed_setup():
+    pipeline = Pipeline("test")
+    await pipeline.register(FailedSetupService)
+    with pytest.raises(ConnectionError):
+        await pipeline.run()
+
+    assert FailedSetupService not in lifecycle._resources
+    assert FailedSetupService not in lifecycle._setups
+
+
+@pytest.mark.asyncio
+async def test_worker_warm_up():
+    broker = MemoryBroker()
+    worker = Worker(broker, [PooledService], poll_timeout=0.01)
+    task = asyncio.get_event_loop().create_task(worker.run())
+    await asyncio.sleep(0.05)
+    assert PooledService.setups == 1
+
+    pipeline = Pipeline("test", executor=RemoteExecutor(broker, poll_timeout=0.01))
+    await pipeline.register(PooledService)
+    await pipeline.run()
+    assert list(pipeline.services)[0].result == 1
+
+    worker.stop()
+    await task
+    assert PooledService.teardowns == [{"pool": 1}]
@@ -0,0 +1,163 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service
+from aioflow.limits import TokenBucket, CircuitBreaker, CircuitState, AioFlowCircuitOpen, circuit_breaker, reset_limits, limits
+from aioflow.middlewareabc import MiddlewareABC
+from aioflow.pipeline import Pipeline
+
+__author__ = "a.lemets"
+
+
+class LimitedService(Service):
+    async def payload(self, **kwargs):
+        return 1
+
+
+class BrokenService(Service):
+    calls = 0
+
+    async def payload(self, **kwargs):
+        self.__class__.calls += 1
+        raise ConnectionError
+
+
+@pytest.fixture(autouse=True)
+def clean_limits():
+    reset_limits()
+    yield
+    reset_limits()
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=10, burst=2)
+    assert bucket.reserve(0) == 0
+    assert bucket.reserve(0) == 0
+    assert bucket.reserve(0) == pytest.approx(0.1)
+    assert bucket.reserve(0) == pytest.approx(0.2)
+    assert bucket.reserve(1) == 0  # refilled up to burst
+
+
+def test_circuit_breaker():
+    breaker = CircuitBreaker(failures=2, cooldown=10)
+    assert breaker.allow(0)
+    breaker.failure(0)
+    assert breaker.state is CircuitState.CLOSED
+    breaker.failure(1)
+    assert breaker.state is CircuitState.OPEN
+    assert not breaker.allow(5)
+
+    assert breaker.allow(11)
+    assert breaker.state is CircuitState.HALF_OPEN
+    assert not breaker.allow(11)  # only one trial call
+    breaker.failure(12)
+    assert breaker.state is CircuitState.OPEN
+
+    assert breaker.allow(22)
+    breaker.success()
+    assert breaker.state is CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_rate_limit_shared_between_pipelines():
+    class TestMiddleware(MiddlewareABC):
+        delays = []
+
+        async def service_throttled(self, service, **kwargs):
+            self.delays.append(kwargs["delay"])
+
+    config = {"limitedservice": {"rate_limit": 100, "rate_burst": 1}}
+    for _ in range(3):
+        pipeline = Pipeline("test", config=config, middleware=TestMiddleware())
+        await pipeline.register(LimitedService)
+        await pipeline.run()
+
+    assert len(TestMiddleware.delays) == 2
+    assert all(0 < delay <= 0.01 for delay in TestMiddleware.delays)
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_fails_fast():
+    class TestMiddleware(MiddlewareABC):
+        states = []
+
+        async def service_circuit_changed(self, service, **kwargs):
+            self.states.append(kwargs["state"])
+
+    config = {"brokenservice": {"breaker_failures": 2, "breaker_cooldown": 60}}
+    for exception in (ConnectionError, ConnectionError, AioFlowCircuitOpen):
+        pipeline = Pipeline("test", config=config, middleware=TestMiddleware())
+        await pipeline.register(BrokenService)
+        with pytest.raises(exception):
+            await pipeline.run()
+
+    assert BrokenService.calls == 2
+    assert TestMiddleware.states == [CircuitState.OPEN]
+    assert limits() == {"brokenservice": {"tokens": None, "circuit": "open"}}
+
+
+class HangingService(Service):
+    async def payload(self, **kwargs):
+        await asyncio.sleep(1)
+
+
+@pytest.mark.asyncio
+async def test_timeouts_open_circuit_breaker():
+    config = {"hangingservice": {"timeout": 0.01, "breaker_failures": 2, "breaker_cooldown": 60}}
+    for exception in (asyncio.TimeoutError, asyncio.TimeoutError, AioFlowCircuitOpen):
+        pipeline = Pipeline("test", config=config)
+        await pipeline.register(HangingService)
+        with pytest.raises(exception):
+            await pipeline.run()
+
+    assert limits()["hangingservice"]["circuit"] == "open"
+
+
+@pytest.mark.asyncio
+async def test_timed_out_trial_does_not_wedge_circuit_breaker():
+    config = {"hangingservice": {"timeout": 0.01, "breaker_failures": 1, "breaker_cooldown": 0}}
+    for _ in range(3):
+        pipeline = Pipeline("test", config=config)
+        await pipeline.register(HangingService)
+        # every call is a half-open trial after zero cooldown and times out, none is rejected
+        with pytest.raises(asyncio.TimeoutError):
+            await pipeline.run()
+
+    breaker = circuit_breaker("hangingservice", config["hangingservice"])
+    assert breaker.state is CircuitState.OPEN
+    assert breaker.allow(asyncio.get_event_loop().time())
+
+
+class RecoveringService(Service):
+    healthy = False
+
+    async def payload(self, **kwargs):
+        if not self.healthy:
+            raise ConnectionError
+        return 1
+
+
+@pytest.mark.asyncio
+async def test_throttled_trial_does_not_wedge_circuit_breaker():
+    config = {"recoveringservice": {
+        "breaker_failures": 1, "breaker_cooldown": 0, "rate_limit": 5, "rate_burst": 1, "timeout": 0.1,
+    }}
+    RecoveringService.healthy = False
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(RecoveringService)
+    with pytest.raises(ConnectionError):
+        await pipeline.run()
+
+    # half-open trial waits 0.2s for a token and times out before calling the service
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(RecoveringService)
+    with pytest.raises(asyncio.TimeoutError):
+        await pipeline.run()
+
+    RecoveringService.healthy = True
+    await asyncio.sleep(0.5)
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(RecoveringService)
+    await pipeline.run()
+    assert limits()["recoveringservice"]["circuit"] == "closed"
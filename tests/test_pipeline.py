@@ -5,8 +5,9 @@ from uuid import UUID
 import pytest
 
 from aioflow import Service, ServiceStatus
+from aioflow.limits import limits, reset_limits
 from aioflow.middlewareabc import MiddlewareABC
-from aioflow.pipeline import Pipeline, AioFlowRuntimeError, AioFlowKeyError
+from aioflow.pipeline import Pipeline, AioFlowRuntimeError, AioFlowKeyError, AioFlowDeadlineExceeded
 
 __author__ = "a.lemets"
 
@@ -40,8 +41,9 @@ async def test_register_service():
     service = ServiceForTests(pipeline)
     pipeline._register_service(service)
 
-    assert pipeline._services == {service.id: service}
-    assert pipeline._depends_on == {service.id: {}}
+    assert pipeline._services == [service]
+    assert pipeline._depends_on == [{}]
+    assert service._index == 0
 
 
 @pytest.mark.asyncio
@@ -52,8 +54,8 @@ async def test_register_service_with_depends_on():
     second_service = ServiceForTests(pipeline)
     pipeline._register_service(second_service, depends_on={ServiceForTests: "sha1"})
 
-    assert pipeline._services == {first_service.id: first_service, second_service.id: second_service}
-    assert pipeline._depends_on == {first_service.id: {}, second_service.id: {first_service: ["sha1"]}}
+    assert pipeline._services == [first_service, second_service]
+    assert pipeline._depends_on == [{}, {first_service: ["sha1"]}]
     assert list(pipeline.services) == [first_service, second_service]
 
 
@@ -93,6 +95,22 @@ def test_pipeline_update_config():
     assert pipeline.config == {"a": {"c": 11, "d": {"a": 1}}, "b": {"d": 23}, "c": 1}
 
 
+@pytest.mark.asyncio
+@pytest.mark.parametrize("config", [
+    {"servicefortests": {"timeout": 1}},
+    {"__global": {"allow_failure": True}, "servicefortests": {"timeout": 1}},
+])
+async def test_pipeline_update_config_after_register(config):
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(ServiceForTests)
+    pipeline.update_config({"servicefortests": {"timeout": 99}})
+
+    service = list(pipeline.services)[0]
+    assert service.config["timeout"] == service.timeout == 1
+    assert config["servicefortests"] == {"timeout": 1}
+    assert pipeline.config["servicefortests"]["timeout"] == 99
+
+
 @pytest.mark.asyncio
 async def test_pipeline_build_service_kwargs_without_dependence():
     config = {
@@ -414,3 +432,266 @@ async def test_pipeline_middleware_specific_service():
     await pipeline.register(MessageService)
     await pipeline.register(ServiceForTests)
     assert TestMiddleware._service_create == 1
+
+
+@pytest.mark.asyncio
+async def test_register_service_with_bad_key():
+    class Service1(ServiceForTests):
+        ...
+
+    pipeline = Pipeline("test")
+    await pipeline.register(ServiceForTests)
+    with pytest.raises(AioFlowRuntimeError):
+        await pipeline.register(Service1, depends_on={ServiceForTests: "a..b"})
+    with pytest.raises(AioFlowRuntimeError):
+        await pipeline.register(Service1, depends_on={ServiceForTests: [42]})
+
+
+def test_pipeline_yaml_config_copy_on_write(tmp_path):
+    path = tmp_path / "config.yaml"
+    path.write_text("a:\n    c: 23\nb: 42\n")
+
+    pipeline1 = Pipeline("test", config=str(path))
+    pipeline2 = Pipeline("test", config=str(path))
+    # parsed config is shared, but only as read only view
+    assert pipeline1._config is pipeline2._config
+    with pytest.raises(TypeError):
+        pipeline1.config["b"] = 1
+    assert pipeline2.config["b"] == 42
+
+    pipeline1.update_config({"a": {"c": 11}})
+    assert pipeline1.config == {"a": {"c": 11}, "b": 42}
+    assert pipeline2.config == {"a": {"c": 23}, "b": 42}
+
+    assert not pipeline2.reload_config()
+    path.write_text("a:\n    c: 1\nb: 42\n")
+    assert pipeline2.reload_config()
+    assert pipeline2.config == {"a": {"c": 1}, "b": 42}
+
+
+@pytest.mark.asyncio
+async def test_pipeline_yaml_config_nested_sections_read_only(tmp_path):
+    class KwargsService(Service):
+        async def payload(self, **kwargs):
+            kwargs["hosts"].append("changed")
+            return kwargs["hosts"]
+
+    path = tmp_path / "config.yaml"
+    path.write_text("kwargsservice:\n    __kwargs:\n        hosts: [a]\n")
+
+    pipeline = Pipeline("test", config=str(path))
+    await pipeline.register(KwargsService)
+    service = list(pipeline.services)[0]
+    with pytest.raises(TypeError):
+        pipeline.config["kwargsservice"]["__kwargs"]["hosts"] = []
+    with pytest.raises(TypeError):
+        service.config["__kwargs"]["hosts"] = []
+    await pipeline.run()
+    assert service.result == ["a", "changed"]
+
+    later = Pipeline("test", config=str(path))
+    await later.register(KwargsService)
+    await later.run()
+    assert list(later.services)[0].result == ["a", "changed"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_deadline():
+    class SlowService(Service):
+        async def payload(self, **kwargs):
+            assert 0 < self.remaining <= 0.1
+            await asyncio.sleep(0.06)
+
+    class SkippedService(Service):
+        async def payload(self, **kwargs):
+            raise AssertionError("must be skipped")
+
+    class TestMiddleware(MiddlewareABC):
+        failed = []
+
+        async def service_failed(self, service, exception, **kwargs):
+            self.failed.append((service.name, type(exception)))
+
+    class SlowService2(SlowService):
+        ...
+
+    config = {"__global": {"timeout": 60}, "slowservice2": {"allow_failure": True}}
+    pipeline = await Pipeline.create("test", config=config, middleware=TestMiddleware())
+    await pipeline.register(SlowService)
+    await pipeline.register(SlowService2, depends_on={SlowService: []})
+    await pipeline.register(SkippedService, depends_on={SlowService2: []})
+
+    with pytest.raises(AioFlowDeadlineExceeded):
+        await pipeline.run(deadline=0.1)
+
+    assert TestMiddleware.failed == [
+        ("slowservice2", asyncio.TimeoutError),
+        ("skippedservice", AioFlowDeadlineExceeded),
+    ]
+    assert pipeline.remaining == 0
+
+
+@pytest.mark.asyncio
+async def test_pipeline_as_completed():
+    class FastService(Service):
+        async def payload(self, **kwargs):
+            return "fast"
+
+    class SlowBranch(Service):
+        async def payload(self, **kwargs):
+            await asyncio.sleep(0.05)
+            return "slow"
+
+    config = {"serviceraise": {"allow_failure": True}}
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(SlowBranch)
+    await pipeline.register(FastService)
+    await pipeline.register(ServiceRaise)
+
+    events = []
+    async for service, result in pipeline.as_completed(buffer=1):
+        events.append((service.name, service.status, result))
+        if service.name == "fastservice":
+            assert SlowBranch in [type(srv) for srv in pipeline.services if srv.status is ServiceStatus.PROCESSING]
+
+    fast, failed = sorted(events[:2], key=lambda event: event[0])
+    assert fast == ("fastservice", ServiceStatus.DONE, "fast")
+    assert failed[:2] == ("serviceraise", ServiceStatus.FAILED)
+    assert isinstance(failed[2], ZeroDivisionError)
+    assert events[2] == ("slowbranch", ServiceStatus.DONE, "slow")
+
+
+@pytest.mark.asyncio
+async def test_pipeline_as_completed_raises():
+    pipeline = Pipeline("test")
+    await pipeline.register(ServiceRaise)
+
+    events = []
+    with pytest.raises(ZeroDivisionError):
+        async for service, result in pipeline.as_completed():
+            events.append(service.name)
+    assert events == ["serviceraise"]
+    assert not pipeline._streams
+
+
+@pytest.mark.asyncio
+async def test_pipeline_fuse_chains():
+    class Parse(Service):
+        async def payload(self, **kwargs):
+            return {"value": 1}
+
+    class Validate(Parse):
+        async def payload(self, **kwargs):
+            return {"value": kwargs["parse.value"] + 1}
+
+    class Normalize(Parse):
+        async def payload(self, **kwargs):
+            return {"value": kwargs["validate.value"] + 1}
+
+    class Enrich(Parse):
+        ...
+
+    class Report(Parse):
+        ...
+
+    class TestMiddleware(MiddlewareABC):
+        done = []
+
+        async def service_done(self, service, **kwargs):
+            self.done.append(service.name)
+
+    config = {"__fuse": True, "report": {"fuse": False}}
+    pipeline = await Pipeline.create("test", config=config, middleware=TestMiddleware())
+    await pipeline.register(Parse)
+    await pipeline.register(Validate, depends_on={Parse: "value"})
+    await pipeline.register(Normalize, depends_on={Validate: "value"})
+    await pipeline.register(Enrich, depends_on={Normalize: []})
+    await pipeline.register(Report, depends_on={Normalize: []})
+
+    dependents = [[1], [2], [3, 4], [], []]
+    assert pipeline._fuse_chains(dependents) == {0: [0, 1, 2]}
+    await pipeline.run()
+
+    assert TestMiddleware.done[:3] == ["parse", "validate", "normalize"]
+    assert sorted(TestMiddleware.done[3:]) == ["enrich", "report"]
+    assert pipeline.services[2].result == {"value": 3}
+    assert [service.number for service in pipeline.services][:3] == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_register_sub_pipeline():
+    class Source(Service):
+        async def payload(self, **kwargs):
+            return {"value": 1}
+
+    class Fast(Service):
+        async def payload(self, **kwargs):
+            return {"value": kwargs["source.value"] + 1}
+
+    class Slow(Service):
+        async def payload(self, **kwargs):
+            await asyncio.sleep(0.05)
+            return {"value": kwargs["source.value"] + 2}
+
+    class AfterFast(Service):
+        async def payload(self, **kwargs):
+            return {"value": kwargs["fast.value"] * 10}
+
+    class Report(Service):
+        async def payload(self, **kwargs):
+            return kwargs
+
+    class TestMiddleware(MiddlewareABC):
+        events = []
+
+        async def service_create(self, service, **kwargs):
+            self.events.append(("create", service.name))
+
+        async def service_done(self, service, **kwargs):
+            self.events.append(("done", service.name))
+
+    sub = Pipeline("sub", config={"slow": {"timeout": 1}})
+    await sub.register(Fast)
+    await sub.register(Slow)
+    await sub.register(AfterFast, depends_on={Fast: "value"})
+
+    pipeline = await Pipeline.create("test", middleware=TestMiddleware())
+    await pipeline.register(Source)
+    await pipeline.register(sub, depends_on={Source: "value"})
+    await pipeline.register(Report, depends_on={AfterFast: "value", Slow: "value"})
+    await pipeline.run()
+
+    assert not list(sub.services)
+    assert [service.name for service in pipeline.services] == [
+        "source", "sub.fast", "sub.slow", "sub.afterfast", "report",
+    ]
+    assert pipeline.services[2].timeout == 1
+    assert pipeline.services[4].result == {"sub.afterfast.value": 20, "sub.slow.value": 3}
+    assert ("create", "sub.slow") in TestMiddleware.events
+    done = [name for event, name in TestMiddleware.events if event == "done"]
+    assert done.index("sub.afterfast") < done.index("sub.slow")
+
+
+@pytest.mark.asyncio
+async def test_sub_pipeline_limits_keyed_by_scoped_name():
+    class Limited(Service):
+        async def payload(self, **kwargs):
+            return 1
+
+    reset_limits()
+    sub = Pipeline("sub", config={"limited": {"breaker_failures": 3}})
+    await sub.register(Limited)
+    pipeline = Pipeline("test")
+    await pipeline.register(sub)
+    await pipeline.run()
+
+    assert list(limits()) == ["sub.limited"]
+    reset_limits()
+
+
+@pytest.mark.asyncio
+async def test_sub_pipeline_with_middleware():
+    sub = await Pipeline.create("sub", middleware=MiddlewareABC())
+    pipeline = Pipeline("test")
+    with pytest.raises(AioFlowRuntimeError):
+        await pipeline.register(sub)
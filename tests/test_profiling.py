@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tracemalloc
+
+import pytest
+
+from aioflow import Service
+from aioflow.pipeline import Pipeline
+from aioflow.profiling import get_profile, reset_profiles, ProfileMode
+
+__author__ = "a.lemets"
+
+
+class ProfiledService(Service):
+    async def payload(self, **kwargs):
+        return [i for i in range(10000)]
+
+
+class AllocatingService(Service):
+    async def payload(self, **kwargs):
+        blob = bytearray(2 ** 21)
+        await asyncio.sleep(0.05)
+        return len(blob)
+
+
+@pytest.fixture(autouse=True)
+def clean_profiles():
+    reset_profiles()
+    yield
+    reset_profiles()
+
+
+@pytest.mark.asyncio
+async def test_profile_disabled():
+    pipeline = Pipeline("test")
+    await pipeline.register(ProfiledService)
+    await pipeline.run()
+
+    assert get_profile("profiledservice") is None
+
+
+@pytest.mark.asyncio
+async def test_profile_cpu(tmp_path):
+    config = {"profiledservice": {"profile": "cpu", "profile_dir": str(tmp_path), "profile_aggregate": 2}}
+    for _ in range(2):
+        pipeline = Pipeline("test", config=config)
+        await pipeline.register(ProfiledService)
+        await pipeline.run()
+
+    profile = get_profile("profiledservice")
+    assert profile.mode is ProfileMode.CPU
+    assert profile.calls == 2
+    assert profile.runs == 2
+    assert profile.stats.total_calls > 0
+
+    files = sorted(os.listdir(tmp_path))
+    assert len(files) == 3
+    assert any(name.endswith(".aggregate.prof") for name in files)
+
+
+@pytest.mark.asyncio
+async def test_profile_memory():
+    config = {"profiledservice": {"profile": "memory"}}
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(ProfiledService)
+    await pipeline.run()
+
+    profile = get_profile("profiledservice")
+    assert profile.mode is ProfileMode.MEMORY
+    assert profile.runs == 1
+    assert profile.peak_max > 0
+    assert profile.summary()["peak_mean"] == profile.peak_max
+
+
+@pytest.mark.asyncio
+async def test_profile_memory_keeps_peak_of_running_trace():
+    tracemalloc.start()
+    try:
+        blob = bytearray(2 ** 24)
+        del blob
+        _, peak = tracemalloc.get_traced_memory()
+        pipeline = Pipeline("test", config={"allocatingservice": {"profile": "memory"}})
+        await pipeline.register(AllocatingService)
+        await pipeline.run()
+
+        assert tracemalloc.is_tracing()
+        assert tracemalloc.get_traced_memory()[1] >= peak >= 2 ** 24
+    finally:
+        tracemalloc.stop()
+
+    profile = get_profile("allocatingservice")
+    assert 2 ** 21 <= profile.peak_max < 2 ** 23
+
+
+@pytest.mark.asyncio
+async def test_profile_sampling_rate():
+    config = {"profiledservice": {"profile": "cpu", "profile_rate": 0}}
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(ProfiledService)
+    await pipeline.run()
+
+    profile = get_profile("profiledservice")
+    assert profile.calls == 1
+    assert profile.runs == 0
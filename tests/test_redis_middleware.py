@@ -0,0 +1,123 @@
+import datetime
+import json
+
+import pytest
+
+from aioflow import Service, ServiceStatus
+from aioflow.codecs import AioFlowCodecError
+from aioflow.middleware.redis_meddleware import RedisMiddleware
+from aioflow.pipeline import Pipeline, PipelineStatus
+from benchmarks.fake_redis import FakeRedis, LuaRedis
+
+__author__ = "a.lemets"
+
+
+@pytest.fixture(params=["python", "lua"])
+def redis(request):
+    """
+    FakeRedis with scripts emulated in python and the one running the real lua scripts
+    """
+    if request.param == "python":
+        return FakeRedis()
+    pytest.importorskip("lupa")
+    return LuaRedis()
+
+
+class MessageService(Service):
+    async def payload(self, **kwargs):
+        await self.message(progress=50)
+        return {"blob": b"x"}
+
+
+@pytest.mark.asyncio
+async def test_redis_middleware_events(redis):
+    middleware = RedisMiddleware(redis, flush_size=1000)
+    pipeline = await Pipeline.create("test", config={"__global": {"codec": "pickle"}}, middleware=middleware)
+    await pipeline.register(MessageService)
+    await pipeline.run()
+
+    events = redis.streams["aioflow:events:test"]
+    assert [event["event"] for event in events] == [
+        "pipeline_create", "service_create", "pipeline_start", "service_start",
+        "service_message", "service_done", "pipeline_done",
+    ]
+    assert json.loads(events[4]["message"]) == {"progress": 50}
+    assert {event["pipeline_id"] for event in events} == {pipeline.id}
+
+    service = list(pipeline.services)[0]
+    assert await middleware.service_result(service.id, service.config) == {"blob": b"x"}
+    # stored pickle is not decoded by reader with default json config
+    with pytest.raises(AioFlowCodecError):
+        await middleware.service_result(service.id)
+
+
+@pytest.mark.asyncio
+async def test_redis_middleware_indexes(redis):
+    middleware = RedisMiddleware(redis, events=False, done_ttl=3600)
+    pipelines = []
+    for _ in range(3):
+        pipeline = await Pipeline.create("test", config={"__global": {"codec": "pickle"}}, middleware=middleware)
+        await pipeline.register(MessageService)
+        pipelines.append(pipeline)
+    await pipelines[0].run()
+
+    done = await middleware.query_pipelines(PipelineStatus.DONE)
+    assert [state["id"] for state in done] == [pipelines[0].id]
+    pending = await middleware.query_pipelines(PipelineStatus.PENDING)
+    assert [state["id"] for state in pending] == [pipelines[2].id, pipelines[1].id]
+    assert len(await middleware.query_pipelines(limit=2)) == 2
+    assert len(await middleware.query_services(ServiceStatus.DONE)) == 1
+
+    services = await middleware.pipeline_services(pipelines[0].id)
+    assert [(state["name"], state["status"]) for state in services] == [("messageservice", "done")]
+    assert redis.ttls[f"pipeline:{pipelines[0].id}"] == 3600
+    assert redis.ttls[f"service:{services[0]['id']}"] == 3600
+
+    states = await middleware.pipeline_states([pipeline.id for pipeline in pipelines] + ["unknown"])
+    assert [state and state["status"] for state in states] == ["done", "pending", "pending", None]
+
+
+@pytest.mark.asyncio
+async def test_redis_middleware_sweeps_expired_states_from_indexes(redis):
+    day = 86400
+    middleware = RedisMiddleware(redis, events=False, done_ttl=day)
+    now = datetime.datetime.utcnow().timestamp()
+    # done a day ago, its state and state of its service are expired already
+    redis.zsets["pipelines:created"] = {"old": now - day}
+    redis.zsets["pipelines:status:done"] = {"old": now - day}
+    redis.zsets["pipelines:expiry"] = {"old": now - 1}
+    redis.zsets["services:created"] = {"old-service": now - day}
+    redis.zsets["services:status:done"] = {"old-service": now - day}
+    redis.zsets["services:expiry"] = {"old-service": now - 1}
+
+    pipeline = await Pipeline.create("test", config={"__global": {"codec": "pickle"}}, middleware=middleware)
+    await pipeline.register(MessageService)
+    await pipeline.run()
+    service_id = list(pipeline.services)[0].id
+
+    for kind, _id in (("pipelines", pipeline.id), ("services", service_id)):
+        assert set(redis.zsets[f"{kind}:created"]) == {_id}
+        assert set(redis.zsets[f"{kind}:status:done"]) == {_id}
+        assert set(redis.zsets[f"{kind}:expiry"]) == {_id}
+        assert redis.zsets[f"{kind}:expiry"][_id] >= now + day
+
+
+@pytest.mark.asyncio
+async def test_redis_middleware_sweeps_indexes_by_status_ttl(redis):
+    day = 86400
+    middleware = RedisMiddleware(redis, events=False, done_ttl=day, failed_ttl=7 * day)
+    now = datetime.datetime.utcnow().timestamp()
+    # failed two days ago, its state is kept for a week
+    redis.hashes["pipeline:old"] = {"status": b"failed"}
+    redis.zsets["pipelines:status:failed"] = {"old": now - 2 * day, "ancient": now - 8 * day}
+    redis.zsets["pipelines:created"] = {"old": now - 2 * day, "ancient": now - 8 * day}
+    redis.zsets["pipelines:expiry"] = {"old": now + 5 * day, "ancient": now - day}
+
+    pipeline = await Pipeline.create("test", config={"__global": {"codec": "pickle"}}, middleware=middleware)
+    await pipeline.register(MessageService)
+    await pipeline.run()
+
+    failed = await middleware.query_pipelines(PipelineStatus.FAILED)
+    assert [state["id"] for state in failed] == ["old"]
+    assert set(redis.zsets["pipelines:status:failed"]) == {"old"}
+    assert set(redis.zsets["pipelines:created"]) == {"old", pipeline.id}
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service
+from aioflow.middleware.redis_meddleware import RedisMiddleware
+from aioflow.middleware.redis_streams import EventConsumer
+from aioflow.pipeline import Pipeline
+from benchmarks.fake_redis import FakeRedis
+
+__author__ = "a.lemets"
+
+STREAM = "aioflow:events:test"
+EVENTS = ["pipeline_create", "service_create", "pipeline_start", "service_start", "service_done", "pipeline_done"]
+
+
+class EmptyService(Service):
+    async def payload(self, **kwargs):
+        return {}
+
+
+async def run_pipeline(redis):
+    pipeline = await Pipeline.create("test", middleware=RedisMiddleware(redis, flush_size=1))
+    await pipeline.register(EmptyService)
+    await pipeline.run()
+
+
+async def consume(consumer, limit):
+    events = []
+
+    async def _consume():
+        async for stream, event_id, event in consumer:
+            assert stream == STREAM
+            events.append(event["event"])
+            if len(events) == limit:
+                consumer.stop()
+
+    await asyncio.wait_for(_consume(), 1)
+    return events
+
+
+@pytest.mark.asyncio
+async def test_event_consumer_acknowledges_events():
+    redis = FakeRedis()
+    await run_pipeline(redis)
+
+    consumer = EventConsumer(redis, ["test"], group="watchers", consumer="a", latest_id="0", block=10)
+    assert await consume(consumer, len(EVENTS)) == EVENTS
+    assert redis.groups[STREAM, "watchers"]["pending"] == {}
+
+    # existing group keeps its position
+    assert await EventConsumer(redis, ["test"], group="watchers", consumer="a", block=10).read() == []
+    await run_pipeline(redis)
+    assert await consume(consumer, len(EVENTS)) == EVENTS
+
+
+@pytest.mark.asyncio
+async def test_event_consumer_delivers_own_pending_events_first():
+    redis = FakeRedis()
+    await run_pipeline(redis)
+    crashed = EventConsumer(redis, ["test"], group="watchers", consumer="a", latest_id="0", count=4, block=10)
+    await crashed.create_groups()
+    assert len(await crashed.read()) == 4
+    assert len(await crashed.read()) == 2
+
+    consumer = EventConsumer(redis, ["test"], group="watchers", consumer="a", count=4, block=10)
+    assert await consume(consumer, len(EVENTS)) == EVENTS
+
+
+@pytest.mark.asyncio
+async def test_event_consumer_claims_idle_events():
+    redis = FakeRedis()
+    await run_pipeline(redis)
+    crashed = EventConsumer(redis, ["test"], group="watchers", consumer="a", latest_id="0", count=2, block=10)
+    await crashed.create_groups()
+    await crashed.read()
+    await crashed.read()
+
+    busy = EventConsumer(redis, ["test"], group="watchers", consumer="b", count=2, block=10)
+    # events of "a" are not idle for claim_idle yet
+    assert await consume(busy, 2) == EVENTS[4:]
+    assert {owner for owner, _, _ in redis.groups[STREAM, "watchers"]["pending"].values()} == {"a"}
+
+    consumer = EventConsumer(redis, ["test"], group="watchers", consumer="b", count=2, block=10, claim_idle=0)
+    assert await consume(consumer, 4) == EVENTS[:4]
+    assert redis.groups[STREAM, "watchers"]["pending"] == {}
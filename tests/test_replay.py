@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+from aioflow import Service, ServiceStatus
+from aioflow.middleware.record_middleware import RECORDING_SUFFIX, RecordMiddleware, load_recording
+from aioflow.pipeline import Pipeline
+from aioflow.replay import AioFlowReplayError, build_replay, replay
+
+__author__ = "a.lemets"
+
+
+class Source(Service):
+    async def payload(self, **kwargs):
+        await self.message(progress=50)
+        return {"value": self.config.get("value", 1)}
+
+
+class Double(Service):
+    async def payload(self, **kwargs):
+        return {"value": kwargs["source.value"] * 2}
+
+
+class Broken(Service):
+    async def payload(self, **kwargs):
+        raise ZeroDivisionError
+
+
+class Messages(RecordMiddleware):
+    def __init__(self):
+        super().__init__("")
+        self.messages = []
+
+    async def service_message(self, service, **kwargs):
+        self.messages.append((service.name, kwargs))
+
+    async def pipeline_done(self, pipeline, **kwargs):
+        pass
+
+
+async def record(tmp_path, config=None):
+    pipeline = await Pipeline.create("recorded", config=config, middleware=RecordMiddleware(str(tmp_path)))
+    await pipeline.register(Source)
+    await pipeline.register(Double, depends_on={Source: ["value"]})
+    await pipeline.run()
+    [path] = [os.path.join(tmp_path, name) for name in os.listdir(tmp_path)]
+    return pipeline, path
+
+
+@pytest.mark.asyncio
+async def test_record(tmp_path):
+    pipeline, path = await record(tmp_path, {"source": {"value": 3}})
+    assert path.endswith(f"recorded-{pipeline.id}{RECORDING_SUFFIX}")
+
+    recording = load_recording(path)
+    assert recording["status"] == "done"
+    source, double = recording["services"]
+    assert source["config"]["value"] == 3
+    assert source["messages"][0][1] == {"progress": 50}
+    assert double["depends_on"] == {0: ["value"]}
+    assert double["kwargs"]["source.value"] == 3
+    assert double["result"] == {"value": 6}
+    assert double["duration"] >= 0
+
+
+@pytest.mark.asyncio
+async def test_replay(tmp_path):
+    _, path = await record(tmp_path, {"source": {"value": 3}})
+    messages = Messages()
+    pipeline = await replay(path, time_scale=0, check_kwargs=True, middleware=messages)
+    source, double = pipeline.services
+    assert [service.name for service in pipeline.services] == ["source", "double"]
+    assert source.config["value"] == 3
+    assert double.result == {"value": 6}
+    assert messages.messages == [("source", {"progress": 50})]
+
+
+@pytest.mark.asyncio
+async def test_replay_failure(tmp_path):
+    pipeline = await Pipeline.create("recorded", middleware=RecordMiddleware(str(tmp_path)))
+    await pipeline.register(Broken)
+    with pytest.raises(ZeroDivisionError):
+        await pipeline.run()
+
+    [name] = os.listdir(tmp_path)
+    recording = load_recording(os.path.join(tmp_path, name))
+    assert recording["status"] == "failed"
+    assert recording["services"][0]["error"] == "ZeroDivisionError()"
+
+    replayed = await build_replay(recording, time_scale=0)
+    with pytest.raises(AioFlowReplayError):
+        await replayed.run()
+    assert next(iter(replayed.services)).status == ServiceStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_replay_check_kwargs(tmp_path):
+    _, path = await record(tmp_path)
+    recording = load_recording(path)
+    recording["services"][1]["kwargs"]["source.value"] = 100
+    with pytest.raises(AioFlowReplayError):
+        await replay(recording, time_scale=0, check_kwargs=True)
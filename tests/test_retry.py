@@ -0,0 +1,97 @@
+import asyncio
+
+import pytest
+
+from aioflow import Service, ServiceStatus
+from aioflow.middlewareabc import MiddlewareABC
+from aioflow.pipeline import Pipeline
+from aioflow.retry import RetryPolicy, resolve_exception
+
+__author__ = "a.lemets"
+
+
+class FlakyService(Service):
+    failures = 0
+
+    async def payload(self, **kwargs):
+        if self.attempt <= self.failures:
+            raise ConnectionError
+        return {"attempt": self.attempt}
+
+
+class SlowFirstAttemptService(Service):
+    async def payload(self, **kwargs):
+        if self.attempt == 1:
+            await asyncio.sleep(1)
+        return self.attempt
+
+
+def test_resolve_exception():
+    assert resolve_exception("ConnectionError") is ConnectionError
+    assert resolve_exception("asyncio.TimeoutError") is asyncio.TimeoutError
+    assert resolve_exception(KeyError) is KeyError
+    with pytest.raises(ValueError):
+        resolve_exception("json.dumps")
+
+
+def test_retry_policy_from_config():
+    assert RetryPolicy.from_config({}) is None
+
+    policy = RetryPolicy.from_config({"retries": 3, "backoff": 1, "backoff_max": 3, "retry_on": "KeyError"})
+    assert policy.retry_on == (KeyError,)
+    assert [policy.delay(attempt) for attempt in (1, 2, 3)] == [1, 2, 3]
+    assert policy.should_retry(KeyError(), 3)
+    assert not policy.should_retry(KeyError(), 4)
+    assert not policy.should_retry(ValueError(), 1)
+
+
+def test_retry_policy_jitter():
+    policy = RetryPolicy(1, backoff=1, jitter=0.5)
+    assert all(0.5 <= policy.delay(1) <= 1 for _ in range(100))
+
+
+@pytest.mark.asyncio
+async def test_service_retry():
+    class TestMiddleware(MiddlewareABC):
+        attempts = []
+
+        async def service_retry(self, service, exception, **kwargs):
+            assert isinstance(exception, ConnectionError)
+            self.attempts.append(kwargs["attempt"])
+
+    FlakyService.failures = 2
+    pipeline = await Pipeline.create(
+        "test",
+        config={"flakyservice": {"retries": 2, "backoff": 0.01}},
+        middleware=TestMiddleware(),
+    )
+    await pipeline.register(FlakyService)
+    await pipeline.run()
+
+    service = list(pipeline.services)[0]
+    assert service.status is ServiceStatus.DONE
+    assert service.result == {"attempt": 3}
+    assert TestMiddleware.attempts == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_service_retry_exhausted():
+    FlakyService.failures = 2
+    pipeline = Pipeline("test", config={"flakyservice": {"retries": 1, "backoff": 0.01}})
+    await pipeline.register(FlakyService)
+    with pytest.raises(ConnectionError):
+        await pipeline.run()
+
+    service = list(pipeline.services)[0]
+    assert service.status is ServiceStatus.FAILED
+    assert service.attempt == 2
+
+
+@pytest.mark.asyncio
+async def test_service_retry_attempt_timeout():
+    config = {"slowfirstattemptservice": {"retries": 1, "backoff": 0, "attempt_timeout": 0.05, "timeout": 0.5}}
+    pipeline = Pipeline("test", config=config)
+    await pipeline.register(SlowFirstAttemptService)
+    await pipeline.run()
+
+    assert list(pipeline.services)[0].result == 2
@@ -0,0 +1,155 @@
+import asyncio
+import os
+
+import pytest
+
+from aioflow import MiddlewareABC, Service, ServiceStatus, lifecycle
+from aioflow.middleware.record_middleware import RecordMiddleware, load_recording
+from aioflow.pipeline import AioFlowCancelled, Pipeline
+from aioflow.runner import AioFlowShutdown, Runner, load_snapshot
+
+__author__ = "a.lemets"
+
+
+class Fast(Service):
+    async def payload(self, **kwargs):
+        return {"value": 1}
+
+
+class Slow(Service):
+    calls = 0
+
+    async def payload(self, **kwargs):
+        type(self).calls += 1
+        await asyncio.sleep(self.config.get("sleep", 10))
+        return {"value": kwargs["fast.value"] + 1}
+
+
+class Pooled(Service):
+    teardowns = []
+
+    @classmethod
+    async def setup(cls):
+        return {"pool": 1}
+
+    @classmethod
+    async def teardown(cls, resources):
+        cls.teardowns.append(resources)
+
+    async def payload(self, **kwargs):
+        return self.resources["pool"]
+
+
+class Events(MiddlewareABC):
+    def __init__(self):
+        self.events = []
+        self.flushed = 0
+
+    async def service_done(self, service, **kwargs):
+        self.events.append(("service_done", service.name))
+
+    async def service_failed(self, service, exception, **kwargs):
+        self.events.append(("service_failed", service.name, type(exception)))
+
+    async def pipeline_failed(self, pipeline, exception, **kwargs):
+        self.events.append(("pipeline_failed", type(exception)))
+
+    async def pipeline_done(self, pipeline, **kwargs):
+        self.events.append(("pipeline_done",))
+
+    async def flush(self):
+        self.flushed += 1
+
+
+async def build(config=None, middleware=None):
+    pipeline = await Pipeline.create("test", config=config, middleware=middleware)
+    await pipeline.register(Fast)
+    await pipeline.register(Slow, depends_on={Fast: "value"})
+    return pipeline
+
+
+@pytest.mark.asyncio
+async def test_shutdown_waits_for_grace():
+    events = Events()
+    runner = Runner(grace=1)
+    pipeline = await build({"slow": {"sleep": 0.01}}, events)
+    run = asyncio.ensure_future(runner.run(pipeline))
+    await asyncio.sleep(0)
+
+    assert await runner.shutdown() == []
+    await run
+    assert events.events[-1] == ("pipeline_done",)
+    assert events.flushed == 1
+    assert runner.running == 0
+
+    with pytest.raises(AioFlowShutdown):
+        await runner.run(await build())
+
+
+@pytest.mark.asyncio
+async def test_shutdown_cancels_and_resumes(tmp_path):
+    events = Events()
+    runner = Runner(grace=0.01, directory=str(tmp_path))
+    pipeline = await build(middleware=events)
+    run = asyncio.ensure_future(runner.run(pipeline))
+    await asyncio.sleep(0.001)
+
+    [snapshot] = await runner.shutdown()
+    with pytest.raises(AioFlowShutdown):
+        await run
+    assert events.events == [
+        ("service_done", "fast"),
+        ("service_failed", "slow", AioFlowCancelled),
+        ("pipeline_failed", AioFlowCancelled),
+    ]
+    assert events.flushed == 1
+    assert snapshot["results"] == {"fast": {"value": 1}}
+    [name] = os.listdir(tmp_path)
+    assert load_snapshot(os.path.join(tmp_path, name)) == snapshot
+
+    Slow.calls = 0
+    resumed = await build({"slow": {"sleep": 0}})
+    resumed.restore(snapshot)
+    await resumed.run()
+    fast, slow = resumed.services
+    assert fast.status == ServiceStatus.DONE
+    assert slow.result == {"value": 2}
+    assert Slow.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_cancelled_run_fails_services():
+    events = Events()
+    pipeline = await build(middleware=events)
+    with pytest.raises(asyncio.TimeoutError):
+        await asyncio.wait_for(pipeline.run(), 0.01)
+    assert events.events[-1] == ("pipeline_failed", AioFlowCancelled)
+    assert list(pipeline.services)[1].status == ServiceStatus.FAILED
+
+
+@pytest.mark.asyncio
+async def test_restore_with_record_middleware(tmp_path):
+    pipeline = await build({"slow": {"sleep": 0}}, RecordMiddleware(str(tmp_path)))
+    pipeline.restore({"name": "test", "id": "old", "results": {"fast": {"value": 1}}})
+    await pipeline.run()
+
+    [name] = os.listdir(tmp_path)
+    fast, slow = load_recording(os.path.join(tmp_path, name))["services"]
+    assert fast["status"] == ServiceStatus.DONE.value
+    assert fast["result"] == {"value": 1}
+    assert slow["result"] == {"value": 2}
+
+
+@pytest.mark.asyncio
+async def test_runner_sets_up_and_tears_down_services():
+    Pooled.teardowns = []
+    runner = Runner(grace=0)
+    await runner.start(Pooled)
+    assert lifecycle.resources(Pooled) == {"pool": 1}
+
+    pipeline = await Pipeline.create("test")
+    await pipeline.register(Pooled)
+    await runner.run(pipeline)
+    await runner.shutdown()
+    assert Pooled.teardowns == [{"pool": 1}]
+    assert lifecycle.resources(Pooled) is None
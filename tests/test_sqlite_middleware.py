@@ -0,0 +1,80 @@
+import json
+
+import pytest
+
+from aioflow import Service
+from aioflow.codecs import AioFlowCodecError
+from aioflow.middleware.sqlite_middleware import SqliteMiddleware
+from aioflow.pipeline import Pipeline, PipelineStatus
+
+__author__ = "a.lemets"
+
+
+class SmallResult(Service):
+    async def payload(self, **kwargs):
+        await self.message(progress=100)
+        return {"value": 1}
+
+
+class LargeResult(Service):
+    async def payload(self, **kwargs):
+        return {"value": "x" * 2048}
+
+
+class FailingService(Service):
+    async def payload(self, **kwargs):
+        raise ZeroDivisionError
+
+
+@pytest.mark.asyncio
+async def test_sqlite_middleware(tmp_path):
+    middleware = SqliteMiddleware(str(tmp_path / "state.db"), blob_threshold=1024)
+    pipeline = await Pipeline.create("test", middleware=middleware)
+    await pipeline.register(SmallResult)
+    await pipeline.register(LargeResult, depends_on={SmallResult: []})
+    await pipeline.run()
+
+    failed = await Pipeline.create("test", middleware=middleware)
+    await failed.register(FailingService)
+    with pytest.raises(ZeroDivisionError):
+        await failed.run()
+
+    (done,) = await middleware.query_pipelines(PipelineStatus.DONE)
+    assert done["id"] == pipeline.id
+    assert done["start"] <= done["end"]
+    assert [state["id"] for state in await middleware.query_pipelines()] == [failed.id, pipeline.id]
+
+    services = await middleware.pipeline_services(pipeline.id)
+    assert [(state["name"], state["status"]) for state in services] == [("smallresult", "done"), ("largeresult", "done")]
+    small, large = pipeline.services
+    assert await middleware.service_result(small.id) == {"value": 1}
+    assert await middleware.service_result(large.id) == {"value": "x" * 2048}
+    assert await middleware.service_result(list(failed.services)[0].id) is None
+
+    # result tampered into pickle is not unpickled by reader with json config
+    await middleware._run(middleware._commit, [(
+        "UPDATE services SET result_format = ? WHERE id = ?", ("pickle", small.id),
+    )])
+    with pytest.raises(AioFlowCodecError):
+        await middleware.service_result(small.id)
+
+    events = await middleware.pipeline_events(pipeline.id)
+    assert [event["event"] for event in events][-1] == "pipeline_done"
+    (message,) = [event for event in events if event["event"] == "service_message"]
+    assert json.loads(message["data"]) == {"progress": 100}
+    await middleware.close()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_middleware_batches_writes(tmp_path):
+    middleware = SqliteMiddleware(str(tmp_path / "state.db"), flush_size=1000, flush_interval=60)
+    commits = []
+    commit = middleware._commit
+    middleware._commit = lambda writes: commits.append(len(writes)) or commit(writes)
+
+    for _ in range(10):
+        await Pipeline.create("test", middleware=middleware)
+    assert not commits
+    assert len(await middleware.query_pipelines()) == 10
+    assert commits == [20]
+    await middleware.close()
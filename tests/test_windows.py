@@ -0,0 +1,117 @@
+import pytest
+
+from aioflow import Service
+from aioflow.pipeline import Pipeline
+from aioflow.windows import (
+    COUNT, MAX, MEAN, SUM, Aggregate, SessionWindow, SlidingWindow, TumblingWindow, WindowOperator, WindowService,
+    reset_windows, windows,
+)
+
+__author__ = "a.lemets"
+
+
+@pytest.fixture(autouse=True)
+def clean():
+    reset_windows()
+    yield
+    reset_windows()
+
+
+def summary(emitted):
+    return [(window["key"], window["start"], window["end"], window["value"]) for window in emitted]
+
+
+def test_tumbling_window():
+    window = WindowOperator(TumblingWindow(10), SUM)
+    assert window.process([("a", 1, 1), ("b", 2, 5), ("a", 9, 2)]) == []
+    assert summary(window.process([("a", 12, 3)])) == [("a", 0, 10, 3), ("b", 0, 10, 5)]
+    assert window.open_windows == 1
+
+    # window [0, 10) was emitted already
+    assert window.process([("a", 5, 100)]) == []
+    assert window.late == 1
+    assert summary(window.flush()) == [("a", 10, 20, 3)]
+
+
+def test_tumbling_window_allowed_lateness():
+    window = WindowOperator(TumblingWindow(10), COUNT, allowed_lateness=5)
+    assert window.process([("a", 1, None), ("a", 12, None)]) == []
+    assert window.process([("a", 8, None)]) == []
+    assert summary(window.process([("a", 15, None)])) == [("a", 0, 10, 2)]
+
+
+def test_sliding_window():
+    window = WindowOperator(SlidingWindow(10, 5), MAX)
+    assert summary(window.process([("a", 1, 1), ("a", 6, 7), ("a", 11, 3)])) == [("a", -5, 5, 1), ("a", 0, 10, 7)]
+    assert summary(window.flush()) == [("a", 5, 15, 7), ("a", 10, 20, 3)]
+
+
+def test_session_window():
+    window = WindowOperator(SessionWindow(5), MEAN)
+    assert window.process([("a", 1, 1), ("a", 4, 3), ("b", 4, 10)]) == []
+    assert summary(window.process([("a", 20, 5)])) == [("a", 1, 4, 2), ("b", 4, 4, 10)]
+
+    # record between sessions merges them
+    assert window.process([("a", 28, 1), ("a", 24, 3)]) == []
+    assert summary(window.flush()) == [("a", 20, 28, 3)]
+
+
+def test_session_window_needs_merge():
+    with pytest.raises(ValueError):
+        WindowOperator(SessionWindow(5), Aggregate(lambda: 0, lambda state, value: state))
+
+
+def test_count_windows():
+    tumbling = WindowOperator(TumblingWindow(2, count=True), SUM)
+    assert summary(tumbling.process([("a", t, t) for t in range(5)])) == [("a", 0, 1, 1), ("a", 2, 3, 5)]
+
+    sliding = WindowOperator(SlidingWindow(3, 1, count=True), SUM)
+    assert [window["value"] for window in sliding.process([("a", t, t) for t in range(5)])] == [3, 6, 9]
+
+
+def test_count_windows_state():
+    tumbling = WindowOperator(TumblingWindow(2, count=True), SUM)
+    tumbling.process([(key, 0, 1) for key in range(100) for _ in range(2)])
+    assert tumbling.open_windows == 0
+
+    tumbling.process([("a", 1, 1), ("a", 2, 1), ("a", 3, 5), ("b", 4, 2)])
+    assert summary(tumbling.flush()) == [("a", 3, 3, 5), ("b", 4, 4, 2)]
+    assert tumbling.open_windows == 0
+
+    sliding = WindowOperator(SlidingWindow(3, 2, count=True), SUM)
+    sliding.process([("a", t, t) for t in range(4)])
+    assert summary(sliding.flush()) == [("a", 1, 3, 6)]
+    assert sliding.flush() == []
+
+
+def test_reducer():
+    window = WindowOperator(TumblingWindow(10), Aggregate.reducer(lambda a, b: f"{a},{b}"))
+    window.process([("a", 1, "x"), ("a", 2, "y")])
+    assert window.flush()[0]["value"] == "x,y"
+
+
+@pytest.mark.asyncio
+async def test_window_service():
+    class Clicks(Service):
+        batch = []
+
+        async def payload(self, **kwargs):
+            return {"records": self.batch}
+
+    class ClicksPer10(WindowService):
+        window = TumblingWindow(10)
+        aggregate = SUM
+        value_field = "clicks"
+
+    emitted = []
+    for batch in ([{"key": "a", "time": 1, "clicks": 2}], [{"key": "a", "time": 11, "clicks": 3}]):
+        Clicks.batch = batch
+        pipeline = Pipeline("test")
+        await pipeline.register(Clicks)
+        await pipeline.register(ClicksPer10, depends_on={Clicks: "records"})
+        await pipeline.run()
+        emitted.append(pipeline.services[1].result)
+
+    assert emitted[0] == []
+    assert emitted[1] == [dict(key="a", start=0, end=10, value=2, count=1)]
+    assert windows()["clicksper10"]["open"] == 1